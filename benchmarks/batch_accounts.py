@@ -0,0 +1,141 @@
+# -*- coding:utf-8 -*-
+"""
+多账户基准测试: 同一段行情上 M 个 StockAccount 逐个调用 bar_execute 与
+一个 BatchStockAccount(M) 一次调用的耗时比较
+
+每天每个账户随机买入一部分标的各 ROUND_LOT 股, 第二天全部卖出, 订单都能成交,
+两种方式使用相同的订单和行情, 统计每天(一个bar)的平均耗时和加速比
+
+用法(在repo根目录):
+    python3 -m benchmarks.batch_accounts
+    python3 -m benchmarks.batch_accounts --n-accounts 10,100,1000 \
+        --n-codes 10 --validation none
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import numpy as np
+from tenvs.accounts.batch_stock_account import BatchStockAccount
+from tenvs.accounts.const import ROUND_LOT
+from tenvs.accounts.stock_account import StockAccount
+
+# 每个标的的初始资金, 保证买入订单都有足够的资金
+INVESTMENT_PER_CODE = 1e5
+
+
+def split_list(value, type_=int):
+    return [type_(v) for v in value.split(",") if v != ""]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--n-accounts", type=split_list, default=[100])
+    parser.add_argument("--n-codes", type=split_list, default=[10, 100])
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--validation", default="full",
+                        choices=["full", "sampled", "none"])
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="重复次数, 取最短的耗时")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None,
+                        help="结果(JSON)文件, 默认只输出到 stderr")
+    return parser.parse_args(argv)
+
+
+def make_bars(n_codes, days, rng):
+    """
+    与 StockAccount 的 bar 格式相同, 最后一项为 MONEY
+    NOTE(wen): 价格为 1/8 的整数倍, day_init 中 caps / pre_day_close 得到的
+        持仓量没有舍入误差, 第二天可以全部卖出
+    """
+    returns = rng.normal(0, 0.02, (days + 1, n_codes))
+    closes = np.ones((days + 1, n_codes + 1))
+    closes[:, :-1] = np.round(80 * np.exp(np.cumsum(returns, axis=0))) / 8
+    return [{"pre_day_close": closes[day], "pre_bar_closes": closes[day],
+             "closes": closes[day + 1], "opens": closes[day]}
+            for day in range(days)]
+
+
+def make_orders(n_accounts, n_codes, days, rng):
+    """
+    shape: (days, n_accounts, n_codes + 1), 第 0, 2, 4... 天买入, 下一天卖出
+    """
+    orders = np.zeros((days, n_accounts, n_codes + 1))
+    for day in range(0, days - 1, 2):
+        buys = (rng.random((n_accounts, n_codes)) < 0.5) * ROUND_LOT
+        orders[day, :, :-1] = buys
+        orders[day + 1, :, :-1] = -buys
+    return orders
+
+
+def time_accounts(codes, bars, orders, validation):
+    investment = INVESTMENT_PER_CODE * len(codes)
+    accounts = [StockAccount(investment, list(codes), validation=validation)
+                for _ in range(orders.shape[1])]
+    begin = time.perf_counter()
+    for day, bar in enumerate(bars):
+        for i, account in enumerate(accounts):
+            account.bar_execute(orders[day, i], bar)
+    return time.perf_counter() - begin, accounts
+
+
+def time_batch(codes, bars, orders, validation):
+    batch = BatchStockAccount(
+        orders.shape[1], INVESTMENT_PER_CODE * len(codes), codes,
+        validation=validation)
+    begin = time.perf_counter()
+    for day, bar in enumerate(bars):
+        batch.bar_execute(orders[day], bar)
+    return time.perf_counter() - begin, batch
+
+
+def run_case(n_accounts, n_codes, args):
+    rng = np.random.default_rng(args.seed)
+    codes = ["%06d.SZ" % i for i in range(1, n_codes + 1)]
+    bars = make_bars(n_codes, args.days, rng)
+    orders = make_orders(n_accounts, n_codes, args.days, rng)
+    loop_s, batch_s = [], []
+    for _ in range(max(args.repeat, 1)):
+        elapsed, accounts = time_accounts(codes, bars, orders,
+                                          args.validation)
+        loop_s.append(elapsed)
+        elapsed, batch = time_batch(codes, bars, orders, args.validation)
+        batch_s.append(elapsed)
+    # 两种方式的结果相同
+    assert np.array_equal([a.total_assets for a in accounts],
+                          batch.total_assets)
+    loop, batch = min(loop_s), min(batch_s)
+    return {"n_accounts": n_accounts, "n_codes": n_codes,
+            "days": args.days, "validation": args.validation,
+            "loop_bar_ms": loop / args.days * 1e3,
+            "batch_bar_ms": batch / args.days * 1e3,
+            "speedup": loop / batch}
+
+
+def run(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    results = []
+    for n_accounts in args.n_accounts:
+        for n_codes in args.n_codes:
+            result = run_case(n_accounts, n_codes, args)
+            results.append(result)
+            print("M=%-5d n_codes=%-5d loop %8.3f ms/bar, batch %8.3f ms/bar"
+                  ", %6.1fx" % (n_accounts, n_codes, result["loop_bar_ms"],
+                                result["batch_bar_ms"], result["speedup"]),
+                  file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding:utf-8 -*-
+"""
+比较两次 env_throughput 的结果, 列出各组合 steps/s, reset 耗时和峰值内存的变化
+steps/s 下降超过 --threshold 的组合视为性能回退, 存在回退时返回码为1
+
+用法(在repo根目录):
+    python3 -m benchmarks.compare before.json after.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+KEY_FIELDS = ["scenario", "n_codes", "look_back_days", "reward_fn"]
+
+
+def load_results(path):
+    with open(path) as f:
+        report = json.load(f)
+    return {tuple(r[key] for key in KEY_FIELDS): r
+            for r in report["results"]}
+
+
+def ratio(new, old):
+    if new is None or old is None or old == 0:
+        return None
+    return new / old
+
+
+def compare(before, after, threshold=0.1):
+    """
+    返回 (rows, regressions), rows 为 before 和 after 中都有的组合
+    """
+    rows, regressions = [], []
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        row = {"key": key}
+        for field in ["steps_per_s", "reset_ms", "peak_rss_mb"]:
+            row[field] = (old.get(field), new.get(field),
+                          ratio(new.get(field), old.get(field)))
+        rows.append(row)
+        speedup = row["steps_per_s"][2]
+        if speedup is not None and speedup < 1 - threshold:
+            regressions.append(key)
+    return rows, regressions
+
+
+def format_value(value, fmt="%.1f"):
+    return "-" if value is None else fmt % value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="steps/s 下降超过该比例时视为回退")
+    args = parser.parse_args(argv)
+    before, after = load_results(args.before), load_results(args.after)
+    rows, regressions = compare(before, after, args.threshold)
+    print("%-9s %7s %6s %-30s %21s %8s %17s %8s %15s" % (
+        "scenario", "n_codes", "days", "reward_fn", "steps/s", "x",
+        "reset_ms", "x", "peak_rss_mb"))
+    for row in rows:
+        steps, reset, rss = (row["steps_per_s"], row["reset_ms"],
+                             row["peak_rss_mb"])
+        mark = " <" if row["key"] in regressions else ""
+        print("%-9s %7d %6d %-30s %10s>%10s %8s %8s>%8s %8s %7s>%7s%s" % (
+            row["key"] + (
+                format_value(steps[0]), format_value(steps[1]),
+                format_value(steps[2], "%.2f"),
+                format_value(reset[0], "%.2f"),
+                format_value(reset[1], "%.2f"),
+                format_value(reset[2], "%.2f"),
+                format_value(rss[0], "%.0f"), format_value(rss[1], "%.0f"),
+                mark)))
+    missing = set(before) ^ set(after)
+    if len(missing) > 0:
+        print("%d cases only in one of the results" % len(missing))
+    if len(regressions) > 0:
+        print("%d regressions (steps/s < %.0f%%)" % (
+            len(regressions), (1 - args.threshold) * 100))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
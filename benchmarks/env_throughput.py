@@ -0,0 +1,214 @@
+# -*- coding:utf-8 -*-
+"""
+环境吞吐量基准测试, 使用 SyntheticMarket, 不需要 tushare token 和网络
+
+对 scenario x n_codes x look_back_days x reward_fn 的每个组合统计:
+    market_build_s: 在空目录中构建 Market(生成并缓存数据)的耗时
+    market_load_s: 从缓存构建 Market 的耗时
+    reset_ms: reset 的平均耗时
+    steps_per_s, step_p50_ms, step_p99_ms: step 的吞吐量和耗时分位数
+    peak_rss_mb: 运行该组合的进程的峰值内存
+每个组合在单独的进程中运行(spawn), 进程通过 Market.attach 加载数据,
+峰值内存互不影响
+
+用法(在repo根目录):
+    python3 -m benchmarks.env_throughput --output before.json
+    python3 -m benchmarks.env_throughput --n-codes 1,10 --look-back-days 10 \
+        --output after.json
+    python3 -m benchmarks.compare before.json after.json
+"""
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from tenvs.data.synthetic import SyntheticMarket
+from tenvs.market import Market
+from tenvs.scenario import make_env
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+USED_INFOS = ["equities_hfq_info", "indexs_info"]
+INVESTMENT = 100000.0
+
+
+def split_list(value, type_=str):
+    return [type_(v) for v in value.split(",") if v != ""]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scenarios", type=split_list,
+                        default=["simple", "average", "multi_vol"])
+    parser.add_argument("--n-codes", type=lambda v: split_list(v, int),
+                        default=[1, 10, 100, 1000, 3000])
+    parser.add_argument("--look-back-days",
+                        type=lambda v: split_list(v, int),
+                        default=[10, 60, 250])
+    parser.add_argument("--reward-fns", type=split_list,
+                        default=["simple", "daily_return_add_price_bound"])
+    parser.add_argument("--steps", type=int, default=500,
+                        help="每个组合计时的 step 次数")
+    parser.add_argument("--resets", type=int, default=5,
+                        help="每个组合计时的 reset 次数")
+    parser.add_argument("--start", default="20150101")
+    parser.add_argument("--end", default="20200101")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None,
+                        help="合成数据和共享Market的目录, 默认使用临时目录")
+    parser.add_argument("--output", default=None,
+                        help="结果(JSON)文件, 默认输出到 stdout")
+    return parser.parse_args(argv)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux: KB, macOS: bytes
+    if sys.platform == "darwin":
+        return rss / 1024.0 / 1024.0
+    return rss / 1024.0
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_codes(n):
+    return ["%06d.SZ" % i for i in range(1, n + 1)]
+
+
+def build_market(n_codes, args, data_dir):
+    """
+    返回 (market, 在空目录中的构建耗时, 从缓存的构建耗时)
+    """
+    kwargs = dict(seed=args.seed, codes=make_codes(n_codes),
+                  start=args.start, end=args.end, data_dir=data_dir,
+                  cache=True)
+    begin = time.perf_counter()
+    SyntheticMarket(**kwargs)
+    build = time.perf_counter() - begin
+    begin = time.perf_counter()
+    market = SyntheticMarket(**kwargs)
+    load = time.perf_counter() - begin
+    return market, build, load
+
+
+def run_case(shared_dir, scenario, look_back_days, reward_fn, steps, resets,
+             seed):
+    """
+    在子进程中运行: 加载共享的 Market, 统计 reset 和 step 的耗时
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    random.seed(seed)
+    np.random.seed(seed)
+    market = Market.attach(shared_dir)
+    env = make_env(scenario, market, INVESTMENT, look_back_days, USED_INFOS,
+                   reward_fn, False)
+    reset_times = []
+    for _ in range(max(resets, 1)):
+        begin = time.perf_counter()
+        env.reset()
+        reset_times.append(time.perf_counter() - begin)
+    actions = [env.get_random_action() for _ in range(steps)]
+    step_times = np.zeros(steps)
+    for i, action in enumerate(actions):
+        begin = time.perf_counter()
+        _, _, done, _, _ = env.step(action)
+        step_times[i] = time.perf_counter() - begin
+        if done:
+            env.reset()
+    total = step_times.sum()
+    return {
+        "reset_ms": float(np.mean(reset_times) * 1e3),
+        "steps": steps,
+        "steps_per_s": float(steps / total) if total > 0 else None,
+        "step_p50_ms": float(np.percentile(step_times, 50) * 1e3),
+        "step_p99_ms": float(np.percentile(step_times, 99) * 1e3),
+        "peak_rss_mb": peak_rss_mb()}
+
+
+def run(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    remove_data_dir = args.data_dir is None
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="tenvs_bench_")
+    ctx = mp.get_context("spawn")
+    results = []
+    try:
+        for n_codes in args.n_codes:
+            market_dir = os.path.join(data_dir, "market_%d" % n_codes)
+            shared_dir = os.path.join(data_dir, "shared_%d" % n_codes)
+            shutil.rmtree(market_dir, ignore_errors=True)
+            market, build, load = build_market(n_codes, args, market_dir)
+            market.dump_shared(shared_dir)
+            del market
+            for scenario in args.scenarios:
+                for look_back_days in args.look_back_days:
+                    for reward_fn in args.reward_fns:
+                        with ctx.Pool(1) as pool:
+                            result = pool.apply(run_case, (
+                                shared_dir, scenario, look_back_days,
+                                reward_fn, args.steps, args.resets,
+                                args.seed))
+                        result.update({
+                            "scenario": scenario, "n_codes": n_codes,
+                            "look_back_days": look_back_days,
+                            "reward_fn": reward_fn,
+                            "market_build_s": build,
+                            "market_load_s": load})
+                        results.append(result)
+                        print("%-9s n_codes=%-5d look_back_days=%-4d "
+                              "%-30s %10.1f steps/s" % (
+                                  scenario, n_codes, look_back_days,
+                                  reward_fn, result["steps_per_s"] or 0),
+                              file=sys.stderr)
+            shutil.rmtree(shared_dir, ignore_errors=True)
+    finally:
+        if remove_data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    meta = {
+        "git_revision": git_revision(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items()
+                 if key not in ("output", "data_dir")}}
+    return {"meta": meta, "results": results}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run(args)
+    content = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is None:
+        print(content)
+    else:
+        with open(args.output, "w") as f:
+            f.write(content + "\n")
+
+
+if __name__ == "__main__":
+    main()
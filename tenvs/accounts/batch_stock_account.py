@@ -0,0 +1,284 @@
+import numpy as np
+from tenvs.accounts.const import MONEY, MONEY_PRICE
+from tenvs.accounts.fee_schedule import FeeSchedule
+from tenvs.accounts.fill_models import get_fill_model
+from tenvs.accounts.validation import AccountValidationError, Validator
+from tenvs.common.logger import logger
+
+
+class BatchStockAccount:
+    '''
+    M 个相互独立的股票账户, 使用相同的行情(bar)撮合, 逻辑与 StockAccount 相同
+    NOTE(liuwen):
+        StockAccount 中 shape: (n,) 的属性在这里为 shape: (M, n) 的矩阵,
+        标量属性(total_assets, day_pnl, ...)为 shape: (M,) 的数组,
+        第 i 行即第 i 个账户, 与单独使用 StockAccount 的结果相同
+        prices 对所有账户相同, shape: (n,)
+        所有数组预先分配, 每个bar原地更新, 调用方需要保存时自行 copy
+    适用于同一段行情上评估大量参数组合(策略)
+    n_accounts: 账户数 M
+    investment: 初始资金, 标量或 shape: (M,) 的数组
+    fill_model: 撮合方式, 见 fill_models.py, 成交价 shape: (n,) 或 (M, n)
+    validation: 检查级别, 见 StockAccount, AccountValidationError.indices 为
+        不满足条件的账户下标或 (账户, 标的) 下标
+    '''
+
+    def __init__(self, n_accounts, investment=1e5, codes=['000001.SZ'],
+                 fee_schedule=None, fill_model='bar_open_price',
+                 validation='full', sample_every=100):
+        # 空仓, 也认为是一只股票
+        self.codes = list(codes) + [MONEY]
+        self.m = n_accounts
+        # 跟踪股票数
+        self.n = len(self.codes)
+        logger.info(f'accounts: {self.m}, codes: {self.codes}, {self.n}')
+        if fee_schedule is None:
+            fee_schedule = FeeSchedule.uniform(self.n)
+        if len(fee_schedule.buy_rates) != self.n:
+            raise ValueError(f'fee_schedule has {len(fee_schedule.buy_rates)} '
+                             f'rates, expected {self.n}')
+        self.fee_schedule = fee_schedule
+        self.fill_model = get_fill_model(fill_model)
+        self.validator = Validator(validation, sample_every)
+        # 当前bar是否检查
+        self.checking = validation != 'none'
+        self.day, self.bar_id = None, None
+        shape = (self.m, self.n)
+        self.investment = np.zeros((self.m), float)
+        self.investment[:] = investment
+        # 当前总资产
+        self.total_assets = self.investment.copy()
+        # 前一天总资产
+        self.pre_day_total_assets = self.investment.copy()
+        # 资金余额
+        self.balance = self.investment.copy()
+        # 可用金额
+        self.available = self.investment.copy()
+        # 股票市值
+        self.caps = np.zeros(shape, float)
+        self.caps[:, -1] = self.investment
+        # 资金变化
+        self.bar_cash_changes = np.zeros(shape, float)
+        # 持仓量
+        self.volumes = np.zeros(shape, float)
+        self.volumes[:, -1] = self.investment
+        # 冻结量
+        self.frozen_volumes = np.zeros(shape, float)
+        # 可卖出股数
+        self.sellable_volumes = np.zeros(shape, float)
+        # 当前价格, 所有账户相同
+        self.prices = np.zeros((self.n), float)
+        self.prices[-1] = MONEY_PRICE
+        # 持仓权重
+        self.weights = np.zeros(shape, float)
+        self.weights[:, -1] = 1.0
+        self.bar_pnl = np.zeros((self.m), float)
+        self.bar_pnls = np.zeros(shape, float)
+        # 当日盈亏
+        self.day_pnl = np.zeros((self.m), float)
+        self.day_pnls = np.zeros(shape, float)
+        # 累计盈亏
+        self.pnl = np.zeros((self.m), float)
+        self.pnls = np.zeros(shape, float)
+        # 日收益率
+        self.day_return = np.zeros((self.m), float)
+        self.day_returns = np.zeros(shape, float)
+        # 净值
+        self.value = np.ones((self.m), float)
+        self.contributions = np.zeros(shape, float)
+        # 当日交易费
+        self.day_fee = np.zeros((self.m), float)
+        self.day_fees = np.zeros(shape, float)
+        self.day_cash_changes = np.zeros(shape, float)
+        # 累计交易费
+        self.fee = np.zeros((self.m), float)
+        # 临时数组
+        self.order_volumes = np.zeros(shape, float)
+        self.pre_bar_caps = np.zeros(shape, float)
+        self.pre_bar_total_assets = np.zeros((self.m), float)
+        self.total_cash_change = np.zeros((self.m), float)
+        self.bar_fees = np.zeros(shape, float)
+        self.buffer = np.zeros(shape, float)
+        self.mask = np.zeros(shape, bool)
+
+    def fail(self, check, message, ok=None):
+        if ok is None:
+            return AccountValidationError(check, message, self.day,
+                                          self.bar_id)
+        return AccountValidationError.from_mask(check, message, ok, self.day,
+                                                self.bar_id)
+
+    def day_init(self, pre_day_closes: np.array):
+        '''
+        每天交易前需要调用
+        pre_day_closes.shape = (self.n,)
+        '''
+        if self.checking and pre_day_closes[-1] != MONEY_PRICE:
+            raise self.fail('prices', 'pre_day_close of MONEY must be '
+                            f'{MONEY_PRICE}, got {pre_day_closes[-1]}')
+        np.copyto(self.pre_day_total_assets, self.total_assets)
+        # 如果有拆分股票，则按市值不变进行调整
+        np.divide(self.caps, pre_day_closes, out=self.volumes)
+        self.day_pnl.fill(0.0)
+        self.day_pnls.fill(0.0)
+        self.day_return.fill(0.0)
+        self.day_returns.fill(0.0)
+        np.copyto(self.available, self.balance)
+        np.copyto(self.sellable_volumes, self.volumes)
+        self.frozen_volumes.fill(0.0)
+        self.day_cash_changes.fill(0.0)
+        self.day_fees.fill(0.0)
+        self.day_fee.fill(0.0)
+        self.bar_cash_changes.fill(0.0)
+
+    def update_fees(self, cash_changes):
+        # NOTE(liuwen): MONEY不需要缴费(费率为0)
+        fees = self.fee_schedule.fees(cash_changes, out=self.bar_fees)
+        self.day_fees += fees
+        np.sum(self.day_fees, axis=1, out=self.day_fee)
+        self.fee += self.day_fee
+
+    def check_buy_orders(self, volumes: np.array, prices: np.array):
+        # fill sell orders by 0, 不包含最后一列(MONEY项)
+        filled_volumes = np.maximum(volumes, 0.0, out=self.buffer[:, :-1])
+        np.multiply(filled_volumes, prices, out=filled_volumes)
+        # 每个标的的买入费率和最低佣金
+        self.fee_schedule.buy_cash(filled_volumes, out=filled_volumes)
+        expected_buy_cash = np.sum(filled_volumes, axis=1)
+        if not np.all(self.available > expected_buy_cash):
+            raise self.fail('buy_orders', 'available <= required',
+                            self.available > expected_buy_cash)
+
+    def check_sell_orders(self, volumes: np.array):
+        remains = np.add(volumes[:, :-1], self.sellable_volumes[:, :-1],
+                         out=self.buffer[:, :-1])
+        if not np.all(np.greater_equal(remains, 0, out=self.mask[:, :-1])):
+            raise self.fail('sell_orders', 'sell volumes exceed sellable '
+                            'volumes', remains >= 0)
+
+    def check_money_volume(self, volumes: np.array):
+        remains = volumes[:, -1] + self.available
+        if not np.all(remains > 0):
+            raise self.fail('money_volume', 'available + money volume <= 0',
+                            remains > 0)
+
+    def check_pnl(self):
+        # 总盈亏与各标的盈亏之和一致
+        pnl = np.around(np.sum(self.bar_pnls, axis=1), 6)
+        ok = np.around(self.bar_pnl, 6) == pnl
+        if not np.all(ok):
+            raise self.fail('pnl', 'bar_pnl != sum of bar_pnls', ok)
+
+    def check_money(self):
+        # MONEY 的持仓量与可用金额一致
+        ok = self.volumes[:, -1] == self.available
+        if not np.all(ok):
+            raise self.fail('money', 'money volume != available', ok)
+
+    def bar_settlement(self, closes):
+        """
+        bar结束时，根据bar.closes进行结算, 计算pnls
+        NOTE(liuwen): prices[-1] == MONEY_PRICE
+        """
+        if self.checking and closes[-1] != MONEY_PRICE:
+            raise self.fail('prices', f'close of MONEY must be {MONEY_PRICE}'
+                            f', got {closes[-1]}')
+        np.copyto(self.prices, closes)
+        np.copyto(self.pre_bar_caps, self.caps)
+        np.multiply(self.volumes, self.prices, out=self.caps)
+        np.around(self.caps, 6, out=self.caps)
+        np.copyto(self.pre_bar_total_assets, self.total_assets)
+        if self.checking and not np.all(self.pre_bar_total_assets > 0):
+            raise self.fail('total_assets', 'total assets <= 0',
+                            self.pre_bar_total_assets > 0)
+        np.sum(self.caps, axis=1, out=self.total_assets)
+        # pnl
+        np.subtract(self.total_assets, self.pre_bar_total_assets,
+                    out=self.bar_pnl)
+        np.around(self.bar_pnl, 6, out=self.bar_pnl)
+        np.add(self.caps, self.bar_cash_changes, out=self.bar_pnls)
+        np.subtract(self.bar_pnls, self.pre_bar_caps, out=self.bar_pnls)
+        np.around(self.bar_pnls, 6, out=self.bar_pnls)
+        # MONEY pnl为0
+        self.bar_pnls[:, -1] = 0
+        if self.checking:
+            self.check_pnl()
+        self.day_pnl += self.bar_pnl
+        self.day_pnls += self.bar_pnls
+        self.pnl += self.bar_pnl
+        self.pnls += self.bar_pnls
+        # return rate
+        np.divide(self.day_pnl, self.pre_day_total_assets,
+                  out=self.day_return)
+        np.divide(self.day_pnls, self.pre_day_total_assets[:, None],
+                  out=self.day_returns)
+        np.divide(self.pnl, self.investment, out=self.value)
+        self.value += 1.0
+        np.around(self.value, 8, out=self.value)
+        np.divide(self.pnls, self.investment[:, None],
+                  out=self.contributions)
+        np.around(self.contributions, 8, out=self.contributions)
+        # 权重
+        np.divide(self.caps, self.total_assets[:, None], out=self.weights)
+
+    def day_log(self, day):
+        logger.info(f'day={day}, day_pnl={self.day_pnl}')
+        logger.info(f'day={day}, available={self.available}')
+
+    def bar_execute(self, volumes: np.array, bar: dict,
+                    bar_id=0, day_log=False, day='20210101',
+                    limit_prices=None):
+        '''
+        volumes.shape: (M, self.n), 包含了MONEY, 第 i 行为第 i 个账户的订单
+        bar: 所有账户相同, 见 StockAccount.bar_execute
+        limit_prices: 订单限价, shape: (M, self.n), 只有 bar_high_low_price 使用
+        '''
+        self.day, self.bar_id = day, bar_id
+        if np.shape(volumes) != (self.m, self.n):
+            raise self.fail('volumes', f'expected shape {(self.m, self.n)}, '
+                            f'got {np.shape(volumes)}')
+        self.checking = self.validator.should_check()
+        np.copyto(self.order_volumes, volumes)
+        volumes = self.order_volumes
+        if bar_id == 0:
+            self.day_init(bar['pre_day_close'])
+        prices, fills = self.fill_model(volumes, bar, limit_prices)
+        if fills is not None:
+            np.logical_not(fills, out=self.mask)
+            np.copyto(volumes, 0.0, where=self.mask)
+        if self.checking:
+            self.check_money_volume(volumes)
+            self.check_buy_orders(volumes[:, :-1], prices[..., :-1])
+            self.check_sell_orders(volumes)
+
+        # volume > 0: 买进, cash_changes < 0
+        # volume < 0: 卖出, cash_changes > 0
+        np.negative(volumes, out=self.bar_cash_changes)
+        np.multiply(self.bar_cash_changes, prices, out=self.bar_cash_changes)
+        self.update_fees(self.bar_cash_changes)
+        self.bar_cash_changes -= self.day_fees
+
+        # 金额变化量
+        total_cash_change = self.total_cash_change
+        np.sum(self.bar_cash_changes[:, :-1], axis=1, out=total_cash_change)
+        np.around(total_cash_change, 6, out=total_cash_change)
+        # MONEY
+        self.bar_cash_changes[:, -1] = total_cash_change
+        self.day_cash_changes += self.bar_cash_changes
+        self.balance += total_cash_change
+        np.around(self.balance, 6, out=self.balance)
+        self.available += total_cash_change
+        np.around(self.available, 6, out=self.available)
+        volumes[:, -1] = total_cash_change
+        self.volumes += volumes
+        np.around(self.volumes, 6, out=self.volumes)
+        # 可卖， 减去卖出的部分
+        self.sellable_volumes += np.minimum(volumes, 0.0, out=self.buffer)
+        np.around(self.sellable_volumes, 6, out=self.sellable_volumes)
+        # 冻结, 加上买进的部分
+        self.frozen_volumes += np.maximum(volumes, 0.0, out=self.buffer)
+        if self.checking:
+            self.check_money()
+        self.bar_settlement(bar['closes'])
+        if day_log:
+            self.day_log(day)
@@ -0,0 +1,54 @@
+import sys
+
+import numpy as np
+import pytest
+from tenvs.accounts.batch_stock_account import BatchStockAccount
+from tenvs.accounts.const import MONEY
+from tenvs.accounts.stock_account import StockAccount
+from tenvs.accounts.stock_account_test import mock_bars
+
+
+class TestBatchStockAccount:
+
+    def test_basic(self):
+        account = BatchStockAccount(3, [1e5, 2e5, 3e5],
+                                    ['000001.SZ', '000002.SZ'])
+        assert account.codes == ['000001.SZ', '000002.SZ', MONEY]
+        assert account.caps.tolist() == [[0, 0, 1e5], [0, 0, 2e5],
+                                         [0, 0, 3e5]]
+        assert account.total_assets.tolist() == [1e5, 2e5, 3e5]
+        assert account.value.tolist() == [1.0, 1.0, 1.0]
+        assert account.weights[:, -1].tolist() == [1.0, 1.0, 1.0]
+        with pytest.raises(AssertionError):
+            account.bar_execute(np.zeros((2, 3)), mock_bars(1)['0'])
+
+    def test_same_as_stock_account(self):
+        bars = mock_bars(10)
+        orders = [
+            [[500, 500, 0], [6000, 500, 0], [-5000, 500, 0], [0, -1000, 0]],
+            [[1000, 0, 0], [0, 0, 0], [-500, 2000, 0], [-400, -1000, 0]],
+            [[0, 0, 0], [100, 100, 0], [0, 0, 0], [-100, 0, 0]],
+        ]
+        investments = [1e5, 5e4, 1e4]
+        codes = ['000001.SZ', '000002.SZ']
+        batch = BatchStockAccount(3, investments, codes)
+        accounts = [StockAccount(investment, list(codes))
+                    for investment in investments]
+        for day in range(4):
+            volumes = np.array([order[day] for order in orders])
+            batch.bar_execute(volumes, bars[str(day)], day=str(day))
+            for i, account in enumerate(accounts):
+                account.bar_execute(volumes[i], bars[str(day)], day=str(day))
+                for name in StockAccount.STATE_ARRAYS + [
+                        'total_assets', 'pre_day_total_assets', 'balance',
+                        'available', 'bar_pnl', 'day_pnl', 'pnl',
+                        'day_return', 'value', 'day_fee', 'fee']:
+                    if name == 'prices':
+                        continue
+                    assert np.array_equal(getattr(account, name),
+                                          getattr(batch, name)[i]), name
+            assert np.array_equal(accounts[0].prices, batch.prices)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
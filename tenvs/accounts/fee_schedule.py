@@ -0,0 +1,159 @@
+import numpy as np
+from tenvs.accounts.const import (MIN_COMMISSION, MONEY,
+                                  STK_BUY_COMMISSION_RATE,
+                                  STK_SELL_COMMISSION_RATE)
+
+# 通配符, 匹配任意交易所/板块/资产类别
+ANY = '*'
+# 默认费率表: (交易所, 板块, 资产类别) => (买入费率, 卖出费率, 单笔最低佣金)
+# NOTE(liuwen): 基金不收印花税, 卖出与买入费率相同
+DEFAULT_FEE_TABLE = {
+    (ANY, ANY, 'stock'): (STK_BUY_COMMISSION_RATE, STK_SELL_COMMISSION_RATE,
+                          MIN_COMMISSION),
+    (ANY, ANY, 'fund'): (STK_BUY_COMMISSION_RATE, STK_BUY_COMMISSION_RATE,
+                         MIN_COMMISSION),
+    (ANY, ANY, 'bond'): (STK_BUY_COMMISSION_RATE, STK_BUY_COMMISSION_RATE,
+                         MIN_COMMISSION),
+    (ANY, ANY, 'money'): (0.0, 0.0, 0.0),
+}
+
+# 代码前缀 => (板块, 资产类别)
+BOARDS = {
+    'SH': [('688', 'star', 'stock'), ('60', 'main', 'stock'),
+           ('5', 'fund', 'fund'), ('1', 'bond', 'bond')],
+    'SZ': [('30', 'chinext', 'stock'), ('00', 'main', 'stock'),
+           ('15', 'fund', 'fund'), ('16', 'fund', 'fund'),
+           ('18', 'fund', 'fund'), ('1', 'bond', 'bond')],
+    'BJ': [('', 'bse', 'stock')],
+}
+
+
+def classify(code):
+    '''
+    返回 code 的 (交易所, 板块, 资产类别), 如:
+        600000.SH: (SH, main, stock), 688001.SH: (SH, star, stock)
+        300001.SZ: (SZ, chinext, stock), 510300.SH: (SH, fund, fund)
+    无法识别的代码视为 (交易所, main, stock)
+    '''
+    if code == MONEY:
+        return (MONEY, MONEY, 'money')
+    symbol, _, exchange = code.partition('.')
+    for prefix, board, asset_class in BOARDS.get(exchange, []):
+        if symbol.startswith(prefix):
+            return (exchange, board, asset_class)
+    return (exchange, 'main', 'stock')
+
+
+def lookup(table, key):
+    '''
+    返回 table 中与 key 匹配(ANY匹配任意值)且最具体(ANY最少)的费率
+    '''
+    best, best_score = None, -1
+    for pattern, rates in table.items():
+        if all(p == ANY or p == k for p, k in zip(pattern, key)):
+            score = sum(p != ANY for p in pattern)
+            if score > best_score:
+                best, best_score = rates, score
+    if best is None:
+        raise KeyError(f'no fee rates for {key}')
+    return best
+
+
+class FeeSchedule:
+    '''
+    每个标的的费率, shape: (n,) 的数组, 与 StockAccount.codes 的顺序相同
+    buy_rates: 买入费率, sell_rates: 卖出费率, min_commissions: 单笔最低佣金
+    交易费为 max(成交金额 * 费率, 最低佣金)
+    legacy_buy_fee: 为True时与原来的计算方式一致, 买入只收取最低佣金,
+        见 fees 和 uniform
+    '''
+
+    def __init__(self, buy_rates, sell_rates, min_commissions,
+                 legacy_buy_fee=False):
+        self.buy_rates = np.asarray(buy_rates, dtype=float)
+        self.sell_rates = np.asarray(sell_rates, dtype=float)
+        self.min_commissions = np.asarray(min_commissions, dtype=float)
+        self.legacy_buy_fee = legacy_buy_fee
+        # legacy_buy_fee 时买入需要的资金为 成交金额 * (1 + 买入费率)
+        self.buy_factors = self.buy_rates + 1.0
+        self._buffers = None
+
+    @classmethod
+    def uniform(cls, n):
+        '''
+        与原来的计算方式一致: 所有股票使用相同的费率, 最后一项(MONEY)不收费,
+        买入只收取最低佣金(legacy_buy_fee)
+        '''
+        buy_rates = np.full(n, STK_BUY_COMMISSION_RATE)
+        sell_rates = np.full(n, STK_SELL_COMMISSION_RATE)
+        min_commissions = np.full(n, MIN_COMMISSION)
+        buy_rates[-1] = sell_rates[-1] = min_commissions[-1] = 0.0
+        return cls(buy_rates, sell_rates, min_commissions,
+                   legacy_buy_fee=True)
+
+    @classmethod
+    def from_codes(cls, codes, table=None):
+        '''
+        按 (交易所, 板块, 资产类别) 从费率表 table(默认 DEFAULT_FEE_TABLE) 中
+        查找每个标的的费率, codes 最后一项不是 MONEY 时自动加上
+        '''
+        table = DEFAULT_FEE_TABLE if table is None else table
+        codes = list(codes)
+        if len(codes) == 0 or codes[-1] != MONEY:
+            codes.append(MONEY)
+        rates = np.array([lookup(table, classify(code)) for code in codes],
+                         dtype=float)
+        return cls(rates[:, 0], rates[:, 1], rates[:, 2])
+
+    def fees(self, cash_changes, out=None):
+        '''
+        cash_changes > 0: 卖出, < 0: 买入, 返回每个标的的交易费, 保留6位小数
+        out: 与 cash_changes 相同 shape 的数组, 结果写入 out, 计算过程不分配新数组
+        NOTE(liuwen): legacy_buy_fee 时与原来的逐个计算一致, 买入时
+            cash_changes 为负数, cash_changes * rate 总是小于最低佣金,
+            即买入只收取最低佣金; 否则按成交金额 abs(cash_changes) 计算
+        '''
+        if out is None:
+            rates = np.where(cash_changes > 0, self.sell_rates,
+                             self.buy_rates)
+            amounts = cash_changes if self.legacy_buy_fee else \
+                np.abs(cash_changes)
+            fees = np.where(cash_changes != 0,
+                            np.maximum(amounts * rates,
+                                       self.min_commissions), 0.0)
+            return np.around(fees, 6)
+        rates, mask = self.buffers(out.shape)
+        np.greater(cash_changes, 0, out=mask)
+        np.copyto(rates, self.buy_rates)
+        np.copyto(rates, self.sell_rates, where=mask)
+        if self.legacy_buy_fee:
+            np.multiply(cash_changes, rates, out=out)
+        else:
+            np.abs(cash_changes, out=out)
+            np.multiply(out, rates, out=out)
+        np.maximum(out, self.min_commissions, out=out)
+        np.equal(cash_changes, 0, out=mask)
+        np.copyto(out, 0.0, where=mask)
+        return np.around(out, 6, out=out)
+
+    def buy_cash(self, amounts, out=None):
+        '''
+        买入成交金额 amounts(>= 0, 不包含最后一项 MONEY)需要的资金, 包括交易费
+        返回每个标的的资金, out: 与 amounts 相同 shape 的数组, 可以是 amounts
+        NOTE(liuwen): legacy_buy_fee 时与原来的检查一致, 为
+            amounts * (1 + 买入费率); 否则为 amounts + fees, 与 fees 一致
+        '''
+        n = amounts.shape[-1]
+        if self.legacy_buy_fee:
+            return np.multiply(amounts, self.buy_factors[:n], out=out)
+        fees = np.where(amounts > 0, np.maximum(
+            amounts * self.buy_rates[:n], self.min_commissions[:n]), 0.0)
+        return np.add(amounts, np.around(fees, 6), out=out)
+
+    def buffers(self, shape):
+        '''
+        fees(out=...) 使用的临时数组(费率, 掩码), 按 shape 复用
+        '''
+        if self._buffers is None or self._buffers[0].shape != shape:
+            self._buffers = (np.empty(shape, float), np.empty(shape, bool))
+        return self._buffers
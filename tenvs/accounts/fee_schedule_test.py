@@ -0,0 +1,139 @@
+import sys
+
+import numpy as np
+import pytest
+from tenvs.accounts.batch_stock_account import BatchStockAccount
+from tenvs.accounts.const import (MIN_COMMISSION, MONEY,
+                                  STK_BUY_COMMISSION_RATE,
+                                  STK_SELL_COMMISSION_RATE)
+from tenvs.accounts.fee_schedule import (ANY, FeeSchedule, classify,
+                                         lookup)
+from tenvs.accounts.stock_account import StockAccount
+from tenvs.accounts.validation import AccountValidationError
+from tenvs.accounts.stock_account_test import mock_bars
+
+
+def loop_fees(cash_changes):
+    # 原来逐个计算的方式
+    fees = [0] * len(cash_changes)
+    for i in range(len(cash_changes) - 1):
+        if cash_changes[i] > 0:
+            fees[i] = max(
+                cash_changes[i] * STK_SELL_COMMISSION_RATE, MIN_COMMISSION)
+        elif cash_changes[i] < 0:
+            fees[i] = max(
+                cash_changes[i] * STK_BUY_COMMISSION_RATE, MIN_COMMISSION)
+    return np.around(fees, 6)
+
+
+class TestFeeSchedule:
+
+    def test_uniform(self):
+        np.random.seed(0)
+        schedule = FeeSchedule.uniform(300)
+        for _ in range(20):
+            cash_changes = np.random.normal(0, 1e5, 300)
+            cash_changes[np.random.random(300) < 0.3] = 0
+            assert schedule.fees(cash_changes).tolist() == \
+                loop_fees(cash_changes).tolist()
+            out = np.zeros(300)
+            assert schedule.fees(cash_changes, out=out) is out
+            assert out.tolist() == loop_fees(cash_changes).tolist()
+        schedule = FeeSchedule.uniform(4)
+        assert schedule.fees(np.array([1e6, -1e6, 0.0, 1e6])).tolist() == [
+            1878.0, 5.0, 0.0, 0.0]
+
+    def test_classify(self):
+        assert classify('600000.SH') == ('SH', 'main', 'stock')
+        assert classify('688001.SH') == ('SH', 'star', 'stock')
+        assert classify('000001.SZ') == ('SZ', 'main', 'stock')
+        assert classify('300750.SZ') == ('SZ', 'chinext', 'stock')
+        assert classify('510300.SH') == ('SH', 'fund', 'fund')
+        assert classify('159915.SZ') == ('SZ', 'fund', 'fund')
+        assert classify('113001.SH') == ('SH', 'bond', 'bond')
+        assert classify('830799.BJ') == ('BJ', 'bse', 'stock')
+        assert classify(MONEY) == (MONEY, MONEY, 'money')
+
+    def test_from_codes(self):
+        table = {
+            (ANY, ANY, 'stock'): (0.001, 0.002, 5.0),
+            ('SH', 'star', 'stock'): (0.003, 0.004, 5.0),
+            (ANY, ANY, 'fund'): (0.0005, 0.0005, 0.1),
+            (ANY, ANY, 'money'): (0.0, 0.0, 0.0),
+        }
+        assert lookup(table, ('SH', 'star', 'stock'))[0] == 0.003
+        with pytest.raises(KeyError):
+            lookup(table, ('SH', 'bond', 'bond'))
+        schedule = FeeSchedule.from_codes(
+            ['600000.SH', '688001.SH', '510300.SH'], table)
+        assert schedule.buy_rates.tolist() == [0.001, 0.003, 0.0005, 0.0]
+        assert schedule.sell_rates.tolist() == [0.002, 0.004, 0.0005, 0.0]
+        fees = schedule.fees(np.array([1e4, 1e4, 1e4, 1e4]))
+        assert fees.tolist() == [20.0, 40.0, 5.0, 0.0]
+        # 买入按成交金额计算
+        cash_changes = np.array([-1e4, -1e4, -1e4, 0.0])
+        assert schedule.fees(cash_changes).tolist() == [10.0, 30.0, 5.0, 0.0]
+        out = np.zeros(4)
+        schedule.fees(cash_changes, out=out)
+        assert out.tolist() == [10.0, 30.0, 5.0, 0.0]
+        # 默认费率表与 uniform 一致
+        schedule = FeeSchedule.from_codes(['000001.SZ', '600000.SH', MONEY])
+        uniform = FeeSchedule.uniform(3)
+        assert schedule.sell_rates.tolist() == uniform.sell_rates.tolist()
+        assert schedule.min_commissions.tolist() == \
+            uniform.min_commissions.tolist()
+
+    def test_accounts(self):
+        codes = ['000001.SZ', '688001.SH']
+        schedule = FeeSchedule.from_codes(codes)
+        account = StockAccount(1e5, list(codes), fee_schedule=schedule)
+        account.bar_execute(np.array([1000, 1000, 0]), mock_bars(1)['0'])
+        assert account.bar_fees.tolist() == [8.78, 8.78, 0.0]
+        # uniform 与原来一致, 买入只收取最低佣金
+        account = StockAccount(1e5, list(codes))
+        account.bar_execute(np.array([1000, 1000, 0]), mock_bars(1)['0'])
+        assert account.bar_fees.tolist() == [5.0, 5.0, 0.0]
+        with pytest.raises(ValueError):
+            StockAccount(1e5, list(codes),
+                         fee_schedule=FeeSchedule.uniform(2))
+        with pytest.raises(ValueError):
+            BatchStockAccount(2, 1e5, list(codes),
+                              fee_schedule=FeeSchedule.uniform(2))
+
+    def test_buy_orders(self):
+        # 基金和债券: 买入金额 2000, 交易费为最低佣金 2 * 5
+        codes = ['510300.SH', '113001.SH']
+        schedule = FeeSchedule.from_codes(codes)
+        amounts = np.array([1000.0, 1000.0])
+        assert schedule.buy_cash(amounts).tolist() == [1005.0, 1005.0]
+        volumes = np.array([100, 100, 0])
+        bar = mock_bars(1)['0']
+        account = StockAccount(2005, list(codes), fee_schedule=schedule)
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(volumes, bar)
+        assert e.value.check == 'buy_orders'
+        account = StockAccount(2015, list(codes), fee_schedule=schedule)
+        account.bar_execute(volumes, bar)
+        assert account.bar_fees.tolist() == [5.0, 5.0, 0.0]
+        account = BatchStockAccount(2, np.array([2005, 2015]), list(codes),
+                                    fee_schedule=schedule)
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(np.array([volumes, volumes]), bar)
+        assert e.value.check == 'buy_orders'
+        assert e.value.indices == [0]
+        # 按每个标的的买入费率
+        table = {(ANY, ANY, 'fund'): (0.01, 0.01, 0.1),
+                 (ANY, ANY, 'money'): (0.0, 0.0, 0.0)}
+        schedule = FeeSchedule.from_codes(['510300.SH'], table)
+        account = StockAccount(1008, ['510300.SH'], fee_schedule=schedule)
+        with pytest.raises(AccountValidationError):
+            account.bar_execute(np.array([100, 0]), {
+                key: values[1:] for key, values in bar.items()})
+        # uniform 与原来的检查一致
+        schedule = FeeSchedule.uniform(3)
+        assert schedule.buy_cash(amounts).tolist() == (
+            amounts * (1 + STK_BUY_COMMISSION_RATE)).tolist()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
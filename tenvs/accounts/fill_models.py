@@ -0,0 +1,94 @@
+'''
+撮合方式(fill model): 根据 bar 计算所有标的的成交价和是否成交
+
+    fill_model(volumes, bar, limit_prices=None) -> (prices, fills)
+
+    volumes.shape: (n,) 或 (M, n)(BatchStockAccount), 包含了MONEY
+    bar: 见 StockAccount.bar_execute, 各项 shape: (n,)
+    limit_prices: 订单限价, shape 与 volumes 相同, 只有 bar_high_low_price 使用
+    prices: 成交价, shape: (n,) 或与 volumes 相同, MONEY 项为 MONEY_PRICE
+    fills: 是否成交(bool), shape 与 volumes 相同, None 表示全部成交
+        NOTE(liuwen): 未成交的订单撤单, 即该 bar 的交易量为0
+所有计算都是向量化的, 没有逐个订单的循环
+'''
+import numpy as np
+from tenvs.accounts.const import MONEY_PRICE
+
+
+def bar_open_price(volumes, bar, limit_prices=None):
+    '''
+    (默认)Bar开盘价撮合, 全部成交
+    '''
+    return bar['opens'], None
+
+
+def bar_close_price(volumes, bar, limit_prices=None):
+    '''
+    当前Bar收盘价撮合, 全部成交
+    '''
+    return bar['closes'], None
+
+
+def bar_vwap(volumes, bar, limit_prices=None):
+    '''
+    平均交易价格(bar['vwap'], 成交额/成交量)撮合, 全部成交
+    适合有算法交易执行的情况
+    '''
+    return bar['vwap'], None
+
+
+def bar_twap(volumes, bar, limit_prices=None):
+    '''
+    时间平均交易价格撮合, 全部成交, 以 (open + high + low + close) / 4 近似
+    适合有算法交易执行的情况
+    '''
+    prices = bar['opens'] + bar['highs']
+    prices += bar['lows']
+    prices += bar['closes']
+    prices /= 4.0
+    prices[-1] = MONEY_PRICE
+    return prices, None
+
+
+def bar_high_low_price(volumes, bar, limit_prices=None):
+    '''
+    当前Bar最高最低价撮合(Limit Price order), 规则与 Market.buy_check_batch,
+    Market.sell_check_batch 相同:
+        买入: 限价不低于最低价时成交, 成交价为 min(限价, 最高价)
+        卖出: 限价不高于最高价时成交, 成交价为 max(限价, 最低价)
+    limit_prices 为 None 时按最不利的价格全部成交: 买入按最高价, 卖出按最低价
+    '''
+    highs, lows = bar['highs'], bar['lows']
+    buys = volumes > 0
+    if limit_prices is None:
+        prices = np.where(buys, highs, lows)
+        prices[..., -1] = MONEY_PRICE
+        return prices, None
+    limit_prices = np.asarray(limit_prices, dtype=float)
+    fills = np.where(buys, limit_prices >= lows, limit_prices <= highs)
+    prices = np.where(buys, np.minimum(limit_prices, highs),
+                      np.maximum(limit_prices, lows))
+    fills[..., -1] = True
+    prices[..., -1] = MONEY_PRICE
+    return prices, fills
+
+
+FILL_MODELS = {
+    'bar_open_price': bar_open_price,
+    'bar_close_price': bar_close_price,
+    'bar_vwap': bar_vwap,
+    'bar_twap': bar_twap,
+    'bar_high_low_price': bar_high_low_price,
+}
+
+
+def get_fill_model(fill_model):
+    '''
+    fill_model: FILL_MODELS 中的名称, 或者自定义的函数
+    '''
+    if callable(fill_model):
+        return fill_model
+    if fill_model not in FILL_MODELS:
+        raise ValueError(f'Unknown fill model: {fill_model}, '
+                         f'available: {list(FILL_MODELS)}')
+    return FILL_MODELS[fill_model]
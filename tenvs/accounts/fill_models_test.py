@@ -0,0 +1,85 @@
+import sys
+
+import numpy as np
+import pytest
+from tenvs.accounts.batch_stock_account import BatchStockAccount
+from tenvs.accounts.fill_models import (FILL_MODELS, bar_high_low_price,
+                                        bar_twap, get_fill_model)
+from tenvs.accounts.stock_account import StockAccount
+
+
+def mock_bar():
+    return {
+        'pre_day_close': np.array([10.0, 20.0, 1.0]),
+        'opens': np.array([10.0, 20.0, 1.0]),
+        'highs': np.array([11.0, 21.0, 1.0]),
+        'lows': np.array([9.0, 19.0, 1.0]),
+        'closes': np.array([10.6, 19.5, 1.0]),
+        'vwap': np.array([10.2, 19.8, 1.0])}
+
+
+class TestFillModels:
+
+    def test_get_fill_model(self):
+        assert get_fill_model('bar_twap') is bar_twap
+        assert get_fill_model(bar_twap) is bar_twap
+        with pytest.raises(ValueError):
+            get_fill_model('bar_unknown')
+
+    def test_prices(self):
+        bar = mock_bar()
+        volumes = np.array([100.0, -100.0, 0.0])
+        expected = {
+            'bar_open_price': [10.0, 20.0, 1.0],
+            'bar_close_price': [10.6, 19.5, 1.0],
+            'bar_vwap': [10.2, 19.8, 1.0],
+            'bar_twap': [10.15, 19.875, 1.0],
+            'bar_high_low_price': [11.0, 19.0, 1.0],
+        }
+        for name, model in FILL_MODELS.items():
+            prices, fills = model(volumes, bar)
+            assert np.allclose(prices, expected[name]), name
+            assert fills is None
+        # 不修改 bar
+        assert bar['opens'].tolist() == [10.0, 20.0, 1.0]
+
+    def test_limit_prices(self):
+        bar = mock_bar()
+        volumes = np.array([[100.0, -100.0, 0.0],
+                            [100.0, -100.0, 0.0],
+                            [-100.0, 100.0, 0.0]])
+        limit_prices = np.array([[9.5, 20.5, 0.0],
+                                 [8.0, 22.0, 0.0],
+                                 [12.0, 25.0, 0.0]])
+        prices, fills = bar_high_low_price(volumes, bar, limit_prices)
+        assert fills.tolist() == [[True, True, True],
+                                  [False, False, True],
+                                  [False, True, True]]
+        assert prices[fills].tolist() == [9.5, 20.5, 1.0, 1.0, 21.0, 1.0]
+
+    def test_accounts(self):
+        bar = mock_bar()
+        account = StockAccount(1e5, ['000001.SZ', '000002.SZ'],
+                               fill_model='bar_close_price')
+        account.bar_execute(np.array([100, 100, 0]), bar)
+        assert account.bar_cash_changes.tolist() == [-1065.0, -1955.0,
+                                                     -3020.0]
+        # 未成交的订单撤单
+        volumes = np.array([[100, 100, 0], [100, 100, 0]])
+        limit_prices = np.array([[10.0, 18.0, 0], [8.0, 21.0, 0]])
+        batch = BatchStockAccount(2, 1e5, ['000001.SZ', '000002.SZ'],
+                                  fill_model='bar_high_low_price')
+        batch.bar_execute(volumes, bar, limit_prices=limit_prices)
+        assert batch.volumes[:, :-1].tolist() == [[100.0, 0.0], [0.0, 100.0]]
+        assert batch.bar_cash_changes.tolist() == [[-1005.0, 0.0, -1005.0],
+                                                   [0.0, -2105.0, -2105.0]]
+        for i in range(2):
+            account = StockAccount(1e5, ['000001.SZ', '000002.SZ'],
+                                   fill_model='bar_high_low_price')
+            account.bar_execute(volumes[i], bar,
+                                limit_prices=limit_prices[i])
+            assert np.array_equal(account.caps, batch.caps[i])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
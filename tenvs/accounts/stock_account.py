@@ -1,9 +1,8 @@
-import copy
-
 import numpy as np
-from tenvs.accounts.const import (MIN_COMMISSION, MONEY, MONEY_PRICE,
-                                  STK_BUY_COMMISSION_RATE,
-                                  STK_SELL_COMMISSION_RATE)
+from tenvs.accounts.const import MONEY, MONEY_PRICE
+from tenvs.accounts.fee_schedule import FeeSchedule
+from tenvs.accounts.fill_models import get_fill_model
+from tenvs.accounts.validation import AccountValidationError, Validator
 from tenvs.common.logger import logger
 
 
@@ -15,16 +14,33 @@ class StockAccount:
             volumes[i] > 0: 表示买入volumes[i]
             volumes[i] < 0: 表示卖出volumes[i]
             需要调用方约束: 可用余额，可卖股票量限制, 以降低实际交易时的撤单率
-    (默认)bar_open_price: Bar开盘价撮合
-    TODO(liuwen):
+    fill_model: 撮合方式, 见 fill_models.py
+        (默认)bar_open_price: Bar开盘价撮合
         bar_high_low_price: 当前Bar最高最低价撮合(Limit Price order)
         bar_vwap: 平均交易价格撮合(适合有算法交易执行情况下)
         bar_twap: 时间平均交易价格撮合(适合有算法交易执行情况下)
         bar_close_price: 当前Bar收盘价撮合
-    TODO(liuwen): 验证逻辑正确性之后去除 assert
+    validation: 检查级别, 见 validation.py, 检查失败时抛出 AccountValidationError
+        full(默认, 每个bar检查), sampled(每 sample_every 个bar检查一次), none
+    fee_schedule: 每个标的的费率(FeeSchedule), 默认所有股票使用相同的费率
+        (FeeSchedule.uniform, 买入只收取最低佣金),
+        按交易所/板块/资产类别: FeeSchedule.from_codes(codes)
+        长度与 codes(包括MONEY) 不同时抛出 ValueError
+    inplace: 计算结果写入预先分配的数组(out=), 每个bar不再分配新数组, 适合分钟线
+        NOTE(liuwen): inplace=True 时 caps, volumes 等数组属性在每个bar被原地
+            更新, 调用方需要保存时自行 copy; 默认每个bar使用新的数组
     '''
 
-    def __init__(self, investment=1e5, codes=['000001.SZ']):
+    # 对外暴露的数组属性, inplace=False 时每个bar换成新的数组
+    STATE_ARRAYS = ['caps', 'bar_cash_changes', 'volumes', 'frozen_volumes',
+                    'sellable_volumes', 'prices', 'weights', 'bar_pnls',
+                    'day_pnls', 'pnls', 'day_returns', 'contributions',
+                    'day_fees', 'day_cash_changes']
+
+    def __init__(self, investment=1e5, codes=['000001.SZ'],
+                 fee_schedule=None, inplace=False,
+                 fill_model='bar_open_price', validation='full',
+                 sample_every=100):
         # 当前持仓股票
         self.codes = codes
         # 空仓, 也认为是一只股票
@@ -32,6 +48,17 @@ class StockAccount:
         # 跟踪股票数
         self.n = len(codes)
         logger.info(f'codes: {codes}, {self.n}')
+        if fee_schedule is None:
+            fee_schedule = FeeSchedule.uniform(self.n)
+        if len(fee_schedule.buy_rates) != self.n:
+            raise ValueError(f'fee_schedule has {len(fee_schedule.buy_rates)} '
+                             f'rates, expected {self.n}')
+        self.fee_schedule = fee_schedule
+        self.fill_model = get_fill_model(fill_model)
+        self.validator = Validator(validation, sample_every)
+        # 当前bar是否检查
+        self.checking = validation != 'none'
+        self.day, self.bar_id = None, None
         self.investment = investment
         # 当前总资产
         self.total_assets = investment
@@ -83,99 +110,143 @@ class StockAccount:
         self.day_cash_changes = np.zeros((self.n), float)
         # 累计交易费
         self.fee = 0.0
+        self.inplace = inplace
+        # 临时数组
+        self.order_volumes = np.zeros((self.n), float)
+        self.pre_bar_caps = np.zeros((self.n), float)
+        self.bar_fees = np.zeros((self.n), float)
+        self.buffer = np.zeros((self.n), float)
+        self.mask = np.zeros((self.n), bool)
+
+    def renew_arrays(self):
+        '''
+        将对外暴露的数组属性换成新的数组, 调用方保存的引用不再被修改
+        '''
+        for name in self.STATE_ARRAYS:
+            setattr(self, name, getattr(self, name).copy())
+
+    def fail(self, check, message, ok=None):
+        if ok is None:
+            return AccountValidationError(check, message, self.day,
+                                          self.bar_id)
+        return AccountValidationError.from_mask(check, message, ok, self.day,
+                                                self.bar_id)
 
     def day_init(self, pre_day_closes: np.array):
         '''
         每天交易前需要调用
         pre_closes.shape = (self.n,)
         '''
-        assert pre_day_closes[-1] == MONEY_PRICE
+        if self.checking and pre_day_closes[-1] != MONEY_PRICE:
+            raise self.fail('prices', 'pre_day_close of MONEY must be '
+                            f'{MONEY_PRICE}, got {pre_day_closes[-1]}')
         self.pre_day_total_assets = self.total_assets
         # 如果有拆分股票，则按市值不变进行调整
-        self.volumes = self.caps / pre_day_closes
+        np.divide(self.caps, pre_day_closes, out=self.volumes)
         # 当日盈亏
         self.day_pnl = 0.0
-        self.day_pnls = np.zeros((self.n), float)
+        self.day_pnls.fill(0.0)
         # 当前最新一天的日收益率, 以总账户为基线
         self.day_return = 0.0
-        self.day_returns = np.zeros((self.n), float)
+        self.day_returns.fill(0.0)
         # 可用资金
         self.available = self.balance
         # 可卖
-        self.sellable_volumes = copy.deepcopy(self.volumes)
+        np.copyto(self.sellable_volumes, self.volumes)
         # 冻结量
-        self.frozen_volumes = np.zeros((self.n), float)
+        self.frozen_volumes.fill(0.0)
         # 当天交易变化金额
-        self.day_cash_changes = np.zeros((self.n), float)
+        self.day_cash_changes.fill(0.0)
         # 当日交易费
-        self.day_fees = np.zeros((self.n), float)
+        self.day_fees.fill(0.0)
         self.day_fee = 0.0
-        self.bar_cash_changes = 0.0
+        self.bar_cash_changes.fill(0.0)
 
     def update_fees(self, cash_changes):
-        # TODO(liuwen): 优化计算逻辑(if-else => vector op)
-        fees = [0] * self.n
-        # NOTE(liuwen): MONEY不需要缴费
-        for i in range(self.n - 1):
-            # 卖出
-            if cash_changes[i] > 0:
-                fees[i] = max(
-                    cash_changes[i] * STK_SELL_COMMISSION_RATE, MIN_COMMISSION)
-            # 买进
-            elif cash_changes[i] < 0:
-                fees[i] = max(
-                    cash_changes[i] * STK_BUY_COMMISSION_RATE, MIN_COMMISSION)
-        fees = np.around(fees, 6)
+        # NOTE(liuwen): MONEY不需要缴费(费率为0)
+        fees = self.fee_schedule.fees(cash_changes, out=self.bar_fees)
         self.day_fees += fees
         self.day_fee = np.sum(self.day_fees)
         self.fee += self.day_fee
 
     def check_buy_orders(self, volumes: np.array, prices: np.array):
         # fill sell orders by 0
-        filled_volumes = np.maximum(volumes, np.zeros((self.n-1), float))
+        filled_volumes = np.maximum(volumes, 0.0, out=self.buffer[:-1])
         # 不包含最后一项(MONEY项)
-        expected_buy_cash = np.sum((filled_volumes * prices))
-        assert self.available > np.sum(expected_buy_cash) * \
-            (STK_BUY_COMMISSION_RATE + 1)
+        np.multiply(filled_volumes, prices, out=filled_volumes)
+        # 每个标的的买入费率和最低佣金
+        required = np.sum(self.fee_schedule.buy_cash(filled_volumes,
+                                                     out=filled_volumes))
+        if not self.available > required:
+            raise self.fail('buy_orders', f'available {self.available} <= '
+                            f'required {required}')
 
     def check_sell_orders(self, volumes: np.array):
-        assert np.all((volumes[:-1] + self.sellable_volumes[:-1]) >= 0)
+        remains = np.add(volumes[:-1], self.sellable_volumes[:-1],
+                         out=self.buffer[:-1])
+        if not np.all(np.greater_equal(remains, 0, out=self.mask[:-1])):
+            raise self.fail('sell_orders', 'sell volumes exceed sellable '
+                            'volumes', remains >= 0)
 
     def check_money_volume(self, volumes: np.array):
-        assert volumes[-1] + self.available > 0
+        if not volumes[-1] + self.available > 0:
+            raise self.fail('money_volume', f'available {self.available} + '
+                            f'money volume {volumes[-1]} <= 0')
 
     def bar_settlement(self, closes):
         """
         bar结束时，根据bar.closes进行结算, 计算pnls
         NOTE(liuwen): prices[-1] == MONEY_PRICE
         """
-        assert closes[-1] == MONEY_PRICE
-        self.prices = closes
-        pre_bar_caps = copy.deepcopy(self.caps)
-        self.caps = np.around(self.volumes * self.prices, 6)
+        if self.checking and closes[-1] != MONEY_PRICE:
+            raise self.fail('prices', f'close of MONEY must be {MONEY_PRICE}'
+                            f', got {closes[-1]}')
+        np.copyto(self.prices, closes)
+        pre_bar_caps = self.pre_bar_caps
+        np.copyto(pre_bar_caps, self.caps)
+        np.multiply(self.volumes, self.prices, out=self.caps)
+        np.around(self.caps, 6, out=self.caps)
         pre_bar_total_assets = self.total_assets
-        assert pre_bar_total_assets > 0
+        if self.checking and not pre_bar_total_assets > 0:
+            raise self.fail('total_assets', 'total assets '
+                            f'{pre_bar_total_assets} <= 0')
         self.total_assets = np.sum(self.caps)
         # pnl
         self.bar_pnl = self.total_assets - pre_bar_total_assets
         self.bar_pnl = np.around(self.bar_pnl, 6)
-        self.bar_pnls = self.caps + self.bar_cash_changes - pre_bar_caps
-        self.bar_pnls = np.around(self.bar_pnls, 6)
+        np.add(self.caps, self.bar_cash_changes, out=self.bar_pnls)
+        np.subtract(self.bar_pnls, pre_bar_caps, out=self.bar_pnls)
+        np.around(self.bar_pnls, 6, out=self.bar_pnls)
         # MONEY pnl为0
         self.bar_pnls[-1] = 0
-        assert np.around(self.bar_pnl, 6) == np.around(
-            np.sum(self.bar_pnls), 6)
+        if self.checking:
+            self.check_pnl()
         self.day_pnl += self.bar_pnl
         self.day_pnls += self.bar_pnls
         self.pnl += self.bar_pnl
         self.pnls += self.bar_pnls
         # return rate
         self.day_return = self.day_pnl / self.pre_day_total_assets
-        self.day_returns = self.day_pnls / self.pre_day_total_assets
+        np.divide(self.day_pnls, self.pre_day_total_assets,
+                  out=self.day_returns)
         self.value = np.around(self.pnl / self.investment + 1.0, 8)
-        self.contributions = np.around(self.pnls / self.investment, 8)
+        np.divide(self.pnls, self.investment, out=self.contributions)
+        np.around(self.contributions, 8, out=self.contributions)
         # 权重
-        self.weights = self.caps / self.total_assets
+        np.divide(self.caps, self.total_assets, out=self.weights)
+
+    def check_pnl(self):
+        # 总盈亏与各标的盈亏之和一致
+        pnl = np.around(np.sum(self.bar_pnls), 6)
+        if np.around(self.bar_pnl, 6) != pnl:
+            raise self.fail('pnl', f'bar_pnl {self.bar_pnl} != sum of '
+                            f'bar_pnls {pnl}')
+
+    def check_money(self):
+        # MONEY 的持仓量与可用金额一致
+        if self.volumes[-1] != self.available:
+            raise self.fail('money', f'money volume {self.volumes[-1]} != '
+                            f'available {self.available}')
 
     def bar_log(self, day, id):
         logger.info(
@@ -186,7 +257,8 @@ class StockAccount:
         logger.info(f'day={day}, available={self.available: .2f}')
 
     def bar_execute(self, volumes: np.array, bar: dict,
-                    bar_id=0, day_log=False, day='20210101') -> np.array:
+                    bar_id=0, day_log=False, day='20210101',
+                    limit_prices=None) -> np.array:
         '''
         volumes.shape: (self.n,), 包含了MONEY
         bar:
@@ -194,9 +266,11 @@ class StockAccount:
             opens.shape: (self.n,)
             pre_day_close.shape: (self.n)
             closes.shape: (self.n,)
-            highs.shape: (self.n,) # 暂不需要
-            lows.shape: (self.n,) # 暂不需要
-            vwap.shape: (self.n,) # 暂不需要
+            highs.shape: (self.n,) # bar_high_low_price, bar_twap
+            lows.shape: (self.n,) # bar_high_low_price, bar_twap
+            vwap.shape: (self.n,) # bar_vwap
+        limit_prices: 订单限价, shape: (self.n,), 只有 bar_high_low_price 使用
+        未成交的订单撤单, 即该 bar 的交易量为0
 
         (默认)保守交易:
             1. 先根据self.available 决定买入量
@@ -205,18 +279,31 @@ class StockAccount:
             1. 先根据self.sellable_volumes 进行卖出，以获得更多的cash
             2. 再根据self.available 决定买入量
         '''
-        volumes = volumes.astype(float)
-        assert len(volumes) == self.n
+        self.day, self.bar_id = day, bar_id
+        if len(volumes) != self.n:
+            raise self.fail('volumes', f'expected {self.n} volumes, got '
+                            f'{len(volumes)}')
+        self.checking = self.validator.should_check()
+        if not self.inplace:
+            self.renew_arrays()
+        # 不修改调用方的 volumes
+        np.copyto(self.order_volumes, volumes)
+        volumes = self.order_volumes
         if bar_id == 0:
             self.day_init(bar['pre_day_close'])
-        prices = bar['opens']
-        self.check_money_volume(volumes)
-        self.check_buy_orders(volumes[:-1], prices[:-1])
-        self.check_sell_orders(volumes)
+        prices, fills = self.fill_model(volumes, bar, limit_prices)
+        if fills is not None:
+            np.logical_not(fills, out=self.mask)
+            np.copyto(volumes, 0.0, where=self.mask)
+        if self.checking:
+            self.check_money_volume(volumes)
+            self.check_buy_orders(volumes[:-1], prices[:-1])
+            self.check_sell_orders(volumes)
 
         # volume > 0: 买进, cash_changes < 0
         # volume < 0: 卖出, cash_changes > 0
-        self.bar_cash_changes = -volumes * prices
+        np.negative(volumes, out=self.bar_cash_changes)
+        np.multiply(self.bar_cash_changes, prices, out=self.bar_cash_changes)
         self.update_fees(self.bar_cash_changes)
         self.bar_cash_changes -= self.day_fees
 
@@ -228,17 +315,15 @@ class StockAccount:
         self.balance = np.around(self.balance + total_cash_change, 6)
         self.available = np.around(self.available + total_cash_change, 6)
         volumes[-1] = total_cash_change
-        self.volumes = np.around(self.volumes + volumes, 6)
+        np.add(self.volumes, volumes, out=self.volumes)
+        np.around(self.volumes, 6, out=self.volumes)
         # 可卖， 减去卖出的部分
-        self.sellable_volumes += np.minimum(volumes,
-                                            np.zeros((self.n), float))
-        self.sellable_volumes = np.around(self.sellable_volumes, 6)
+        self.sellable_volumes += np.minimum(volumes, 0.0, out=self.buffer)
+        np.around(self.sellable_volumes, 6, out=self.sellable_volumes)
         # 冻结, 加上买进的部分
-        self.frozen_volumes += np.maximum(volumes,
-                                          np.zeros((self.n), float))
-        logger.info(self.volumes[-1])
-        logger.info(self.available)
-        assert self.volumes[-1] == self.available
+        self.frozen_volumes += np.maximum(volumes, 0.0, out=self.buffer)
+        if self.checking:
+            self.check_money()
         self.bar_settlement(bar['closes'])
         self.bar_log(day, bar_id)
         if day_log:
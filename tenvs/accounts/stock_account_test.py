@@ -159,6 +159,30 @@ class TestStockAccount:
         assert account.frozen_volumes.tolist() == [0.0, 500.0, 45799.222]
         assert account.volumes.tolist() == [1500.0, 1500.0, 70129.222]
 
+    def test_inplace(self):
+        bars = mock_bars(10)
+        orders = [[500, 500, 0], [6000, 500, 0], [-5000, 500, 0],
+                  [0, -1500, 0], [100, 0, 0]]
+        account = StockAccount(1e5, ['000001.SZ', '000001.SZ'])
+        inplace = StockAccount(1e5, ['000001.SZ', '000001.SZ'],
+                               inplace=True)
+        arrays = {name: getattr(inplace, name)
+                  for name in StockAccount.STATE_ARRAYS}
+        for day, order in enumerate(orders):
+            volumes = np.array(order)
+            pre_caps = account.caps
+            for acc in [account, inplace]:
+                acc.bar_execute(volumes=volumes, bar=bars[str(day)],
+                                bar_id=0, day=str(day))
+            # 不修改调用方的 volumes, 默认不修改之前的数组
+            assert volumes.tolist() == order
+            assert pre_caps is not account.caps
+            for name, value in vars(account).items():
+                if isinstance(value, (float, np.ndarray)):
+                    assert np.array_equal(value, getattr(inplace, name))
+            for name, array in arrays.items():
+                assert getattr(inplace, name) is array
+
 
 if __name__ == "__main__":
     sys.exit(pytest.main([__file__]))
@@ -0,0 +1,60 @@
+import numpy as np
+
+# full: 每个bar都检查, sampled: 每 sample_every 个bar检查一次, none: 不检查
+VALIDATION_LEVELS = ['full', 'sampled', 'none']
+
+
+class AccountValidationError(AssertionError):
+    '''
+    账户检查失败
+    check: 检查项, 如 buy_orders, sell_orders, money_volume, pnl
+    day, bar_id: 发生的日期和bar
+    indices: 不满足条件的位置, StockAccount 中为标的的下标,
+        BatchStockAccount 中为账户的下标或 (账户, 标的) 的下标
+    NOTE(liuwen): 继承 AssertionError, 与原来使用 assert 时的调用方兼容
+    '''
+
+    def __init__(self, check, message, day=None, bar_id=None, indices=None):
+        self.check = check
+        self.day = day
+        self.bar_id = bar_id
+        self.indices = indices
+        super().__init__(f'{check}: {message} '
+                         f'(day={day}, bar={bar_id}, indices={indices})')
+
+    @classmethod
+    def from_mask(cls, check, message, ok, day=None, bar_id=None):
+        '''
+        ok: 每个位置是否满足条件(bool 数组), 不满足的位置记录在 indices 中
+        '''
+        ok = np.asarray(ok)
+        bad = np.argwhere(~ok)
+        indices = bad[:, 0].tolist() if ok.ndim == 1 else \
+            [tuple(index) for index in bad.tolist()]
+        return cls(check, message, day, bar_id, indices)
+
+
+class Validator:
+    '''
+    决定每个bar是否进行检查
+    level: full(测试), sampled(抽样, 每 sample_every 个bar检查一次,
+        从第一个bar开始), none(不检查, 适合大量参数的回测)
+    '''
+
+    def __init__(self, level='full', sample_every=100):
+        if level not in VALIDATION_LEVELS:
+            raise ValueError(f'Unknown validation level: {level}, '
+                             f'available: {VALIDATION_LEVELS}')
+        if sample_every < 1:
+            raise ValueError(f'sample_every must be >= 1, got {sample_every}')
+        self.level = level
+        self.sample_every = sample_every
+        self.count = 0
+
+    def should_check(self):
+        if self.level == 'full':
+            return True
+        if self.level == 'none':
+            return False
+        self.count += 1
+        return (self.count - 1) % self.sample_every == 0
@@ -0,0 +1,83 @@
+import sys
+
+import numpy as np
+import pytest
+from tenvs.accounts.batch_stock_account import BatchStockAccount
+from tenvs.accounts.stock_account import StockAccount
+from tenvs.accounts.stock_account_test import mock_bars
+from tenvs.accounts.validation import AccountValidationError, Validator
+
+
+class TestValidation:
+
+    def test_validator(self):
+        with pytest.raises(ValueError):
+            Validator('unknown')
+        with pytest.raises(ValueError):
+            Validator('sampled', sample_every=0)
+        assert all(Validator('full').should_check() for _ in range(10))
+        assert not any(Validator('none').should_check() for _ in range(10))
+        validator = Validator('sampled', sample_every=3)
+        assert [validator.should_check() for _ in range(7)] == [
+            True, False, False, True, False, False, True]
+
+    def test_error(self):
+        error = AccountValidationError.from_mask(
+            'sell_orders', 'message', np.array([True, False, False]),
+            day='0', bar_id=1)
+        assert isinstance(error, AssertionError)
+        assert (error.check, error.day, error.bar_id, error.indices) == (
+            'sell_orders', '0', 1, [1, 2])
+        error = AccountValidationError.from_mask(
+            'sell_orders', 'message', np.array([[True, False], [True, True]]))
+        assert error.indices == [(0, 1)]
+
+    def test_stock_account(self):
+        bars = mock_bars(10)
+        account = StockAccount(1e5, ['000001.SZ', '000002.SZ'])
+        # 买入当天不能卖出
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(np.array([-100, 0, 0]), bars['0'], day='0')
+        assert e.value.check == 'sell_orders'
+        assert e.value.indices == [0]
+        assert e.value.day == '0'
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(np.array([20000, 0, 0]), bars['0'])
+        assert e.value.check == 'buy_orders'
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(np.array([0, 0]), bars['0'])
+        assert e.value.check == 'volumes'
+        # 不检查
+        account = StockAccount(1e5, ['000001.SZ', '000002.SZ'],
+                               validation='none')
+        account.bar_execute(np.array([-100, 0, 0]), bars['0'])
+        assert account.volumes[0] == -100
+        # 抽样检查: 第1, 3, ...个bar检查
+        account = StockAccount(1e5, ['000001.SZ', '000002.SZ'],
+                               validation='sampled', sample_every=2)
+        account.bar_execute(np.array([100, 0, 0]), bars['0'], bar_id=0)
+        account.bar_execute(np.array([-200, 0, 0]), bars['0'], bar_id=1)
+        with pytest.raises(AccountValidationError):
+            account.bar_execute(np.array([-200, 0, 0]), bars['0'], bar_id=2)
+
+    def test_batch_stock_account(self):
+        bars = mock_bars(10)
+        account = BatchStockAccount(3, 1e5, ['000001.SZ', '000002.SZ'])
+        volumes = np.array([[100, 0, 0], [0, -100, 0], [20000, 0, 0]])
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(volumes, bars['0'])
+        assert e.value.check == 'buy_orders'
+        assert e.value.indices == [2]
+        volumes[2, 0] = 0
+        with pytest.raises(AccountValidationError) as e:
+            account.bar_execute(volumes, bars['0'])
+        assert e.value.check == 'sell_orders'
+        assert e.value.indices == [(1, 1)]
+        account = BatchStockAccount(3, 1e5, ['000001.SZ', '000002.SZ'],
+                                    validation='none')
+        account.bar_execute(volumes, bars['0'])
+        assert account.volumes[1, 1] == -100
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,86 @@
+# -*- coding:utf-8 -*-
+import json
+import time
+
+
+class Profiler:
+    """
+    按名字统计耗时: 调用次数, 总耗时, 最小/最大耗时和耗时分布(直方图)
+    直方图第 i 个桶为耗时 < 2**i 微秒(且不在前一个桶)的次数, 最后一个桶包括更长的
+    """
+    n_buckets = 24
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # name => [count, total, min, max, histogram]
+        self.stats = {}
+
+    def add(self, name, seconds):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0.0, seconds, seconds,
+                                       [0] * self.n_buckets]
+        stat[0] += 1
+        stat[1] += seconds
+        stat[2] = min(stat[2], seconds)
+        stat[3] = max(stat[3], seconds)
+        bucket = min(int(seconds * 1e6).bit_length(), self.n_buckets - 1)
+        stat[4][bucket] += 1
+
+    def timed(self, name, func):
+        """
+        返回调用 func 并将耗时记录到 name 的函数
+        """
+        def _timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - start)
+        return _timed
+
+    def summary(self):
+        """
+        返回: {name: {"count", "total", "mean", "min", "max", "histogram"}},
+        时间单位为秒, histogram: {"<1us": 次数, "<2us": 次数, ...}, 只包括非空的桶,
+        最后一个桶为 ">=%dus" % 2 ** (n_buckets - 2)
+        """
+        labels = ["<%dus" % 2 ** i for i in range(self.n_buckets - 1)] + \
+            [">=%dus" % 2 ** (self.n_buckets - 2)]
+        result = {}
+        for name, (count, total, min_, max_, histogram) in self.stats.items():
+            result[name] = {
+                "count": count, "total": total, "mean": total / count,
+                "min": min_, "max": max_,
+                "histogram": {label: n for label, n in zip(labels, histogram)
+                              if n > 0}}
+        return result
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+class TimedProxy:
+    """
+    obj 的代理: 调用 obj 的方法时, 耗时记录到 prefix + 方法名, 其他属性直接返回
+    """
+
+    def __init__(self, obj, profiler, prefix=""):
+        self._obj = obj
+        self._profiler = profiler
+        self._prefix = prefix
+        self._methods = {}
+
+    def __getattr__(self, name):
+        method = self._methods.get(name)
+        if method is not None:
+            return method
+        value = getattr(self._obj, name)
+        if not callable(value):
+            return value
+        method = self._profiler.timed(self._prefix + name, value)
+        self._methods[name] = method
+        return method
@@ -0,0 +1,56 @@
+# -*- coding:utf-8 -*-
+
+import json
+import os
+import tempfile
+import unittest
+
+from tenvs.common.profiler import Profiler, TimedProxy
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_add(self):
+        p = Profiler()
+        p.add("a", 0.5e-6)
+        p.add("a", 3e-6)
+        p.add("a", 100.0)
+        stats = p.summary()["a"]
+        self.assertEqual(3, stats["count"])
+        self.assertEqual(0.5e-6, stats["min"])
+        self.assertEqual(100.0, stats["max"])
+        self.assertAlmostEqual(100.0000035, stats["total"])
+        self.assertEqual({"<1us": 1, "<4us": 1, ">=4194304us": 1},
+                         stats["histogram"])
+        # 最后一个桶包括 >= 2 ** 22 微秒的所有耗时
+        p.add("b", (2 ** 22 - 1) * 1e-6)
+        p.add("b", 2 ** 22 * 1e-6)
+        self.assertEqual({"<4194304us": 1, ">=4194304us": 1},
+                         p.summary()["b"]["histogram"])
+        p.reset()
+        self.assertEqual({}, p.summary())
+
+    def test_timed_and_proxy(self):
+        p = Profiler()
+
+        class Obj:
+            value = 1
+
+            def add(self, a, b=0):
+                return a + b
+
+        proxy = TimedProxy(Obj(), p, "obj.")
+        self.assertEqual(3, proxy.add(1, b=2))
+        self.assertEqual(1, proxy.value)
+        with self.assertRaises(TypeError):
+            proxy.add()
+        self.assertEqual(2, p.summary()["obj.add"]["count"])
+        self.assertEqual(["obj.add"], list(p.summary()))
+        path = os.path.join(tempfile.mkdtemp(), "perf.json")
+        p.dump(path)
+        with open(path) as f:
+            self.assertEqual(2, json.load(f)["obj.add"]["count"])
+
+
+if __name__ == '__main__':
+    unittest.main()
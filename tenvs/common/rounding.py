@@ -0,0 +1,20 @@
+# -*- coding:utf-8 -*-
+
+import numpy as np
+
+
+def py_round(values, ndigits=2):
+    """
+    与 python 内置的 round(x, ndigits) 结果一致的 np.round
+    NOTE(wen): np.round 先乘以 10**ndigits 再取整, 乘法的误差使 x.xx5 附近的值
+        可能与 round() 相差 0.01, 这些值(很少)逐个使用 round() 计算
+    返回: 与 values 的 shape 相同的数组
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.round(values, ndigits)
+    scaled = np.abs(values) * 10 ** ndigits
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ties.any():
+        result = np.array(result)
+        result[ties] = [round(v, ndigits) for v in values[ties].tolist()]
+    return result
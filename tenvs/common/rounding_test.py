@@ -0,0 +1,29 @@
+# -*- coding:utf-8 -*-
+
+import random
+import unittest
+
+import numpy as np
+
+from tenvs.common.rounding import py_round
+
+
+class TestRounding(unittest.TestCase):
+
+    def test_py_round(self):
+        # 2.675 * 100 = 267.49999999999997, np.round 得到 2.68
+        self.assertEqual(2.68, np.round(2.675 * 1.0, 2))
+        self.assertEqual(round(2.675, 2), py_round([2.675])[0])
+        random.seed(0)
+        values = [random.uniform(1, 100) * random.choice([1, 1.005, 0.995])
+                  for _ in range(10000)]
+        values += [i / 1000.0 for i in range(1, 10000, 5)]
+        self.assertEqual([round(v, 2) for v in values],
+                         py_round(values).tolist())
+        self.assertEqual([round(v * 1000, 1) for v in values],
+                         py_round(np.array(values) * 1000, 1).tolist())
+        self.assertEqual((2, 3), py_round(np.ones((2, 3))).shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+# -*- coding:utf-8 -*-
+"""
+行情数据的本地缓存
+
+支持两种格式, 按文件后缀区分:
+    npz: (默认)二进制格式, 每列单独存储, 保留列的类型, trade_date 已排序
+    csv: 文本格式, 用于导入/导出
+"""
+import datetime
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMATS = ["npz", "csv"]
+DATE_FORMAT = "%Y%m%d"
+# 旧格式的缓存文件名: <start>-<end>.<fmt>
+LEGACY_PATTERN = re.compile(r"^(\d{8})-(\d{8})\.(npz|csv)$")
+
+# npz 中保存列顺序与日期索引的 key
+COLUMNS_KEY = "__columns__"
+INDEX_KEY = "trade_date"
+
+
+def get_format(path):
+    fmt = path.rsplit(".", 1)[-1]
+    if fmt not in CACHE_FORMATS:
+        raise ValueError("Unknown cache format: %s" % path)
+    return fmt
+
+
+def save_history(df, path):
+    """
+    df: 以 trade_date 为 index 的 DataFrame
+    """
+    fmt = get_format(path)
+    if fmt == "csv":
+        df.to_csv(path)
+        return
+    df = df.sort_index()
+    arrays = {col: df[col].to_numpy() for col in df.columns}
+    arrays[COLUMNS_KEY] = np.array(df.columns, dtype=str)
+    arrays[INDEX_KEY] = np.array(df.index, dtype=str)
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def load_history(path):
+    """
+    返回以 trade_date(str) 为 index 的 DataFrame
+    """
+    fmt = get_format(path)
+    if fmt == "csv":
+        df = pd.read_csv(path)
+        df = df.set_index("trade_date")
+        df.index = df.index.astype(str, copy=False)
+        return df
+    with np.load(path, allow_pickle=False) as data:
+        columns = data[COLUMNS_KEY].tolist()
+        df = pd.DataFrame({col: data[col] for col in columns},
+                          index=pd.Index(data[INDEX_KEY].astype(str),
+                                         name=INDEX_KEY))
+    return df
+
+
+def shift_date(datestr, days):
+    date = datetime.datetime.strptime(datestr, DATE_FORMAT)
+    return (date + datetime.timedelta(days=days)).strftime(DATE_FORMAT)
+
+
+def merge_ranges(ranges):
+    """
+    合并日期区间(闭区间, 如: ["20190101", "20190630"]), 相邻的区间也会合并
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if len(merged) > 0 and start <= shift_date(merged[-1][1], 1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class HistoryStore:
+    """
+    单个标的的行情缓存, 与请求的日期范围无关:
+        <dir>/history.<fmt>: 所有已下载的数据
+        <dir>/ranges.json: 已下载过的日期区间
+    只下载缺失的区间(missing_ranges), 任意子区间通过切片获得(get)
+    NOTE: 目录下已有的旧格式缓存(<start>-<end>.<fmt>)会被自动导入
+    NOTE: 已有的缓存是其他格式(如 npz)时, 读取后转换为 cache_format 保存
+    """
+
+    def __init__(self, dir, cache_format="npz"):
+        self.dir = dir
+        self.history_path = os.path.join(dir, "history." + cache_format)
+        self.ranges_path = os.path.join(dir, "ranges.json")
+        self.df = None
+        self.ranges = []
+        if os.path.exists(self.ranges_path):
+            with open(self.ranges_path) as f:
+                self.ranges = json.load(f)
+            self.load(cache_format)
+        elif os.path.exists(dir):
+            self.import_legacy()
+
+    def load(self, cache_format):
+        if os.path.exists(self.history_path):
+            self.df = load_history(self.history_path)
+            return
+        for fmt in CACHE_FORMATS:
+            path = os.path.join(self.dir, "history." + fmt)
+            if fmt != cache_format and os.path.exists(path):
+                self.df = load_history(path)
+                self.save()
+                os.remove(path)
+                return
+        raise FileNotFoundError("No history file in %s" % self.dir)
+
+    def import_legacy(self):
+        imported = False
+        for name in sorted(os.listdir(self.dir)):
+            match = LEGACY_PATTERN.match(name)
+            if match is None:
+                continue
+            [start, end] = match.groups()[:2]
+            self._merge(load_history(os.path.join(self.dir, name)),
+                        start, end)
+            imported = True
+        if imported:
+            self.save()
+
+    def missing_ranges(self, start, end):
+        """
+        返回[start, end]中未下载过的区间
+        """
+        missing = []
+        cursor = start
+        for range_start, range_end in self.ranges:
+            if range_end < cursor:
+                continue
+            if range_start > end:
+                break
+            if range_start > cursor:
+                missing.append([cursor, shift_date(range_start, -1)])
+            cursor = shift_date(range_end, 1)
+            if cursor > end:
+                return missing
+        missing.append([cursor, end])
+        return missing
+
+    def _merge(self, df, start, end):
+        # NOTE(wen): 当天的数据可能还没有发布, 未来的日期也没有数据, 只记录到
+        #     昨天或返回的最后一个交易日为止, 之后的日期下次再下载
+        last = shift_date(datetime.date.today().strftime(DATE_FORMAT), -1)
+        if len(df) > 0:
+            last = max(last, str(df.index.max()))
+        end = min(end, last)
+        if self.df is not None:
+            df = pd.concat([self.df, df])
+            df = df[~df.index.duplicated(keep="last")]
+        self.df = df.sort_index()
+        if start <= end:
+            self.ranges = merge_ranges(self.ranges + [[start, end]])
+
+    def update(self, df, start, end):
+        """
+        df: [start, end] 区间内下载的数据, 合并后保存
+        ranges 中只记录 [start, min(end, max(昨天, df 的最后一个交易日))]
+        """
+        self._merge(df, start, end)
+        self.save()
+
+    def save(self):
+        if not os.path.exists(self.dir):
+            try:
+                os.makedirs(self.dir)
+            except OSError:
+                pass
+        save_history(self.df, self.history_path)
+        with open(self.ranges_path, "w") as f:
+            json.dump(self.ranges, f)
+
+    def get(self, start, end):
+        """
+        返回[start, end]区间的数据
+        """
+        index = self.df.index
+        return self.df[(index >= start) & (index <= end)]
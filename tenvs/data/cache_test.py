@@ -0,0 +1,135 @@
+# -*- coding:utf-8 -*-
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from tenvs.data.cache import (HistoryStore, load_history, merge_ranges,
+                              save_history)
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame(
+            {"adj_factor": [1.0, 1.0, 2.0],
+             "close": [10.0, 10.5, 5.3],
+             "vol": np.array([100, 200, 300], dtype=np.int64)},
+            index=pd.Index(["20190103", "20190102", "20190104"],
+                           name="trade_date"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_npz(self):
+        path = os.path.join(self.dir, "20190101-20200101.npz")
+        save_history(self.df, path)
+        df = load_history(path)
+        self.assertEqual(["20190102", "20190103", "20190104"],
+                         df.index.tolist())
+        self.assertEqual(["adj_factor", "close", "vol"], df.columns.tolist())
+        self.assertEqual(np.int64, df["vol"].dtype)
+        self.assertEqual(10.5, df.loc["20190102", "close"])
+
+    def test_csv(self):
+        path = os.path.join(self.dir, "20190101-20200101.csv")
+        save_history(self.df, path)
+        df = load_history(path)
+        self.assertEqual(["20190103", "20190102", "20190104"],
+                         df.index.tolist())
+        self.assertEqual(5.3, df.loc["20190104", "close"])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            save_history(self.df, os.path.join(self.dir, "a.json"))
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def frame(self, dates):
+        return pd.DataFrame({"close": [float(d[-2:]) for d in dates]},
+                            index=pd.Index(dates, name="trade_date"))
+
+    def test_merge_ranges(self):
+        self.assertEqual(
+            [["20190101", "20190131"], ["20190301", "20190310"]],
+            merge_ranges([["20190301", "20190310"], ["20190101", "20190110"],
+                          ["20190111", "20190131"]]))
+
+    def test_missing_ranges(self):
+        store = HistoryStore(self.dir)
+        self.assertEqual([["20190101", "20200101"]],
+                         store.missing_ranges("20190101", "20200101"))
+        store.update(self.frame(["20190102", "20190103"]),
+                     "20190101", "20190105")
+        store.update(self.frame(["20190110"]), "20190108", "20190110")
+        self.assertEqual([], store.missing_ranges("20190102", "20190104"))
+        self.assertEqual([["20190106", "20190107"], ["20190111", "20190120"]],
+                         store.missing_ranges("20190101", "20190120"))
+        self.assertEqual([["20181201", "20181231"]],
+                         store.missing_ranges("20181201", "20190103"))
+
+    def test_update_and_get(self):
+        store = HistoryStore(self.dir)
+        store.update(self.frame(["20190102", "20190103"]),
+                     "20190101", "20190103")
+        # 只追加新的一天
+        store.update(self.frame(["20190104"]), "20190104", "20190104")
+        store = HistoryStore(self.dir)
+        self.assertEqual([["20190101", "20190104"]], store.ranges)
+        df = store.get("20190103", "20190104")
+        self.assertEqual(["20190103", "20190104"], df.index.tolist())
+        self.assertEqual(4.0, df.loc["20190104", "close"])
+
+    def test_update_future(self):
+        # 请求的区间超过已发布的数据, 没有数据的日期不记录为已下载
+        store = HistoryStore(self.dir)
+        store.update(self.frame(["20190102", "20190103"]),
+                     "20190101", "20991231")
+        yesterday = (datetime.date.today() -
+                     datetime.timedelta(days=1)).strftime("%Y%m%d")
+        self.assertEqual([["20190101", yesterday]], store.ranges)
+        today = datetime.date.today().strftime("%Y%m%d")
+        self.assertEqual([[today, "20991231"]],
+                         store.missing_ranges("20190101", "20991231"))
+        # 当天的数据已经发布
+        store.update(self.frame([today]), today, "20991231")
+        self.assertEqual([["20190101", today]], store.ranges)
+        # 全部是未来的日期
+        store.update(self.frame([]), "20990101", "20991231")
+        self.assertEqual([["20190101", today]], store.ranges)
+
+    def test_change_format(self):
+        store = HistoryStore(self.dir)
+        store.update(self.frame(["20190102", "20190103"]),
+                     "20190101", "20190103")
+        # npz => csv(导出), 再 csv => npz
+        for fmt in ["csv", "npz"]:
+            store = HistoryStore(self.dir, fmt)
+            self.assertEqual(["history." + fmt, "ranges.json"],
+                             sorted(os.listdir(self.dir)))
+            self.assertEqual([["20190101", "20190103"]], store.ranges)
+            self.assertEqual([2.0, 3.0],
+                             store.get("20190101", "20190103")["close"]
+                             .tolist())
+
+    def test_import_legacy(self):
+        save_history(self.frame(["20190102", "20190103"]),
+                     os.path.join(self.dir, "20190101-20190105.csv"))
+        store = HistoryStore(self.dir)
+        self.assertEqual([["20190101", "20190105"]], store.ranges)
+        self.assertEqual(["20190102", "20190103"],
+                         store.get("20190101", "20190105").index.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
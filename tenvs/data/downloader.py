@@ -0,0 +1,104 @@
+# -*- coding:utf-8 -*-
+"""
+并发下载: 线程池 + 令牌桶限流 + 失败重试(指数退避)
+NOTE(wen): tushare 对每分钟的请求次数有限制(与积分相关), 超过限制会返回错误
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tenvs.common.logger import logger
+
+
+class TokenBucket:
+    """
+    令牌桶限流
+    rate_per_minute: 每分钟生成的令牌数, 即每分钟最多的请求次数
+    capacity: 桶的容量, 即允许的最大突发请求数
+    """
+
+    def __init__(self, rate_per_minute=200, capacity=10,
+                 clock=time.monotonic, sleep=time.sleep):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute should be positive")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self):
+        """
+        获取一个令牌, 没有令牌时阻塞等待
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class Downloader:
+    """
+    workers: 线程数
+    rate_per_minute, capacity: 令牌桶参数, 每次请求消耗一个令牌
+    retries: 失败后的重试次数
+    backoff: 第k次重试前等待 backoff * 2^k 秒
+    """
+
+    def __init__(self, workers=8, rate_per_minute=200, capacity=10,
+                 retries=3, backoff=1.0, sleep=time.sleep):
+        self.workers = workers
+        self.bucket = TokenBucket(rate_per_minute, capacity, sleep=sleep)
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+
+    def call(self, func, *args, **kwargs):
+        """
+        限流, 重试的执行一次请求, func 抛出异常或返回None时视为失败
+        """
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                result = func(*args, **kwargs)
+                if result is not None:
+                    return result
+                error = ValueError("%s returned None" % func.__name__)
+            except Exception as e:
+                error = e
+            if attempt < self.retries:
+                wait = self.backoff * 2 ** attempt
+                logger.warning("request failed: %s, retry in %.1fs" % (
+                    error, wait))
+                self.sleep(wait)
+        raise error
+
+    def map(self, func, keys, name="download"):
+        """
+        在线程池中并发执行 func(key), 返回 dict: key => func(key)
+        func 中的每次请求应通过 self.call 发出, 以统一限流
+        """
+        results = {}
+        total = len(keys)
+        if total == 0:
+            return results
+        step = max(1, total // 10)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(func, key): key for key in keys}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if done % step == 0 or done == total:
+                    logger.info("%s: %d/%d" % (name, done, total))
+        return results
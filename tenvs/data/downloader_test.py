@@ -0,0 +1,157 @@
+# -*- coding:utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pandas as pd
+from tenvs.data.downloader import Downloader, TokenBucket
+from tenvs.market import Market
+
+DATES = ["20190102", "20190103", "20190104", "20190107"]
+
+
+def fake_daily(ts_code, start_date, end_date, scale=1.0):
+    # 与tushare返回格式一致: 按日期降序
+    dates = [d for d in DATES if start_date <= d <= end_date]
+    n = len(dates)
+    close = [scale * (10.0 + DATES.index(d)) for d in dates]
+    price = scale * 10.0
+    df = pd.DataFrame({
+        "ts_code": [ts_code] * n, "trade_date": dates,
+        "open": close, "high": close, "low": close, "close": close,
+        "pre_close": [price - 1] + close[:-1], "change": [1.0] * n,
+        "pct_chg": [1.0] * n, "vol": [100.0] * n, "amount": [1000.0] * n})
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+class FakeTushare:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def set_token(self, token):
+        pass
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None):
+        with self.lock:
+            self.calls.append((ts_code, adj, start_date, end_date))
+        return fake_daily(ts_code, start_date, end_date,
+                          2.0 if adj == "hfq" else 1.0)
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        with self.lock:
+            self.calls.append((ts_code, "index", start_date, end_date))
+        return fake_daily(ts_code, start_date, end_date, 300.0)
+
+    def pro_api(self):
+        return self
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_acquire(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(t):
+            waits.append(t)
+            now[0] += t
+
+        bucket = TokenBucket(rate_per_minute=60, capacity=2,
+                             clock=lambda: now[0], sleep=sleep)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertEqual([], waits)
+        # 桶已空, 每秒生成一个令牌
+        bucket.acquire()
+        self.assertEqual([1.0], waits)
+
+
+class TestDownloader(unittest.TestCase):
+    def setUp(self):
+        self.waits = []
+        self.downloader = Downloader(workers=4, rate_per_minute=6000,
+                                     retries=2, backoff=0.5,
+                                     sleep=self.waits.append)
+
+    def test_call_retry(self):
+        results = [None, Exception("timeout"), "ok"]
+
+        def func():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.assertEqual("ok", self.downloader.call(func))
+        self.assertEqual([0.5, 1.0], self.waits)
+
+    def test_call_failed(self):
+        def func():
+            raise IOError("network error")
+
+        with self.assertRaises(IOError):
+            self.downloader.call(func)
+
+    def test_map(self):
+        keys = ["%06d.SZ" % i for i in range(20)]
+        results = self.downloader.map(lambda k: k.lower(), keys)
+        self.assertEqual({k: k.lower() for k in keys}, results)
+
+
+class TestMarketDownload(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def new_market(self, fake, end="20190110"):
+        codes = ["000001.SZ", "000002.SZ", "600000.SH"]
+        downloader = Downloader(workers=3, rate_per_minute=6000,
+                                sleep=lambda t: None)
+        with mock.patch("tenvs.data.provider.ts", fake):
+            return Market(start="20190101", end=end, codes=codes,
+                          indexs=["000300.SH"], data_dir=self.data_dir,
+                          downloader=downloader)
+
+    def test_cold_start(self):
+        fake = FakeTushare()
+        m = self.new_market(fake)
+        # 每支股票下载不复权, 后复权各一次, 指数各一次
+        self.assertEqual(3 * 2 + 3, len(fake.calls))
+        self.assertEqual(DATES, m.open_dates)
+        self.assertEqual(["000001.SZ", "000002.SZ", "600000.SH"],
+                         list(m.codes_history.keys()))
+        df = m.codes_history["600000.SH"]
+        self.assertEqual(DATES, df.index.tolist())
+        self.assertEqual(2.0, df.loc["20190103", "adj_factor"])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.data_dir, "000002.SZ", "history.npz")))
+        # 已有缓存, 不再下载
+        fake = FakeTushare()
+        self.new_market(fake)
+        self.assertEqual([], fake.calls)
+
+    def test_incremental(self):
+        self.new_market(FakeTushare(), end="20190103")
+        fake = FakeTushare()
+        m = self.new_market(fake, end="20190107")
+        # 只下载缺失的区间
+        self.assertEqual(3 * 2 + 3, len(fake.calls))
+        for call in fake.calls:
+            self.assertEqual(("20190104", "20190107"), call[2:])
+        self.assertEqual(DATES, m.open_dates)
+        self.assertEqual(DATES, m.codes_history["000001.SZ"].index.tolist())
+        # 子区间直接从缓存切片
+        fake = FakeTushare()
+        m = self.new_market(fake, end="20190104")
+        self.assertEqual([], fake.calls)
+        self.assertEqual(DATES[:3], m.open_dates)
+
+
+if __name__ == '__main__':
+    unittest.main()
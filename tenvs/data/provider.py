@@ -0,0 +1,153 @@
+# -*- coding:utf-8 -*-
+"""
+行情数据源(provider), Market 通过 provider 获取个股和指数的日线数据
+
+接口与 tushare 相同, 返回 tushare 格式的 DataFrame(包括 ts_code, trade_date 列):
+    pro_bar(ts_code, adj, start_date, end_date): 个股日线, adj: None(不复权)/hfq
+    index_daily(ts_code, start_date, end_date): 指数日线
+
+实现:
+    TushareProvider: 从 tushare 下载
+    LocalFileProvider: 读取本地文件
+    RecordingProvider: 代理, 记录被代理的 provider 的返回值, 之后离线回放
+    tenvs.data.synthetic.SyntheticData: 合成数据
+"""
+import os
+import tempfile
+
+import pandas as pd
+import tushare as ts
+
+from tenvs.data.cache import CACHE_FORMATS, load_history, save_history
+
+PROVIDER_MODES = ["auto", "record", "replay"]
+
+
+class DataProvider:
+    """
+    行情数据源的接口
+    """
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None):
+        raise NotImplementedError
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        raise NotImplementedError
+
+
+class TushareProvider(DataProvider):
+    """
+    ts_token: tushare.pro 的 token
+    NOTE(wen): 使用tushare下载指数日线信息需要在tushare.pro帐户中有200积分
+    """
+
+    def __init__(self, ts_token=""):
+        ts.set_token(ts_token)
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None):
+        return ts.pro_bar(ts_code=ts_code, adj=adj,
+                          start_date=start_date, end_date=end_date)
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        pro = ts.pro_api()
+        return pro.index_daily(ts_code=ts_code, start_date=start_date,
+                               end_date=end_date)
+
+
+class LocalFileProvider(DataProvider):
+    """
+    读取本地文件中的数据, 每个标的一个文件(不包括 ts_code 列, 以 trade_date 为 index):
+        <root>/daily/<code>.<fmt>: 个股不复权日线
+        <root>/daily_hfq/<code>.<fmt>: 个股后复权日线
+        <root>/index_daily/<code>.<fmt>: 指数日线
+    fmt: npz 或 csv, 见 tenvs.data.cache
+    没有数据文件时抛出 FileNotFoundError
+    """
+
+    def __init__(self, root, file_format="csv"):
+        if file_format not in CACHE_FORMATS:
+            raise ValueError("Unknown file format: %s" % file_format)
+        self.root = root
+        self.file_format = file_format
+
+    def path(self, kind, code):
+        return os.path.join(self.root, kind, "%s.%s" % (
+            code, self.file_format))
+
+    def write(self, kind, code, df):
+        """
+        保存 tushare 格式的数据 df 到 <root>/<kind>/<code>.<fmt>
+        """
+        path = self.path(kind, code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df = df.drop(columns=["ts_code"], errors="ignore")
+        df = df.set_index("trade_date")
+        df.index = df.index.astype(str, copy=False)
+        save_history(df, path)
+
+    def read(self, kind, code, start_date, end_date):
+        df = load_history(self.path(kind, code))
+        index = df.index
+        df = df[(index >= (start_date or "")) &
+                (index <= (end_date or "99999999"))]
+        # 与 tushare 一致: 按日期倒序
+        df = df.sort_index(ascending=False).reset_index()
+        df.insert(0, "ts_code", code)
+        return df
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None):
+        if adj not in (None, "hfq"):
+            raise ValueError("Unsupported adj: %s" % adj)
+        kind = "daily" if adj is None else "daily_hfq"
+        return self.read(kind, ts_code, start_date, end_date)
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        return self.read("index_daily", ts_code, start_date, end_date)
+
+
+class RecordingProvider(DataProvider):
+    """
+    provider 的代理: 将每次请求的返回值保存在 path 中, 之后相同的请求直接返回保存的
+    数据(pickle, 与原始返回值完全相同), 不再访问 provider
+    mode:
+        auto: 有记录时回放, 否则请求 provider 并记录
+        record: 总是请求 provider 并记录(覆盖已有的记录)
+        replay: 只回放, 没有记录时抛出 FileNotFoundError, 不访问 provider
+    NOTE(wen): 记录以请求参数为 key, Market 只请求缓存中缺失的日期区间, 回放时
+        使用与记录时相同的 data_dir 状态(例如都为空目录), 才能得到相同的请求
+    """
+
+    def __init__(self, provider, path, mode="auto"):
+        if mode not in PROVIDER_MODES:
+            raise ValueError("Unknown mode: %s" % mode)
+        self.provider = provider
+        self.path = path
+        self.mode = mode
+
+    def record_path(self, method, *args):
+        name = "_".join([method] + ["" if arg is None else str(arg)
+                                    for arg in args])
+        return os.path.join(self.path, name + ".pkl")
+
+    def call(self, method, *args):
+        path = self.record_path(method, *args)
+        if self.mode != "record" and os.path.exists(path):
+            return pd.read_pickle(path)
+        if self.mode == "replay":
+            raise FileNotFoundError("No record for %s%s: %s" % (
+                method, args, path))
+        result = getattr(self.provider, method)(*args)
+        if result is not None:
+            os.makedirs(self.path, exist_ok=True)
+            # 先写入临时文件, 避免并发读到不完整的记录
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            os.close(fd)
+            pd.to_pickle(result, tmp_path)
+            os.replace(tmp_path, path)
+        return result
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None):
+        return self.call("pro_bar", ts_code, adj, start_date, end_date)
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        return self.call("index_daily", ts_code, start_date, end_date)
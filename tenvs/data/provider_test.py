@@ -0,0 +1,133 @@
+# -*- coding:utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from tenvs.data.provider import (DataProvider, LocalFileProvider,
+                                 RecordingProvider)
+from tenvs.data.synthetic import SyntheticData, SyntheticMarket
+from tenvs.market import Market
+
+
+class CountingProvider(DataProvider):
+    """
+    记录请求次数的 provider
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.calls = []
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None):
+        self.calls.append(("pro_bar", ts_code, adj, start_date, end_date))
+        return self.provider.pro_bar(ts_code, adj, start_date, end_date)
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        self.calls.append(("index_daily", ts_code, start_date, end_date))
+        return self.provider.index_daily(ts_code, start_date, end_date)
+
+
+class TestProvider(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.data = SyntheticData(seed=1, start="20180101", end="20201231")
+        self.codes = ["000001.SZ", "600000.SH"]
+        self.indexs = ["000001.SH", "399001.SZ"]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_market(self, provider, data_dir):
+        return Market(codes=self.codes, indexs=self.indexs,
+                      start="20190101", end="20191231",
+                      data_dir=data_dir, provider=provider)
+
+    def test_local_file(self):
+        for file_format in ["csv", "npz"]:
+            root = os.path.join(self.dir, file_format)
+            provider = LocalFileProvider(root, file_format)
+            for code in self.codes:
+                provider.write("daily", code, self.data.pro_bar(
+                    code, None, "20180101", "20201231"))
+                provider.write("daily_hfq", code, self.data.pro_bar(
+                    code, "hfq", "20180101", "20201231"))
+            for code in self.indexs:
+                provider.write("index_daily", code, self.data.index_daily(
+                    code, "20180101", "20201231"))
+            pd.testing.assert_frame_equal(
+                self.data.pro_bar("000001.SZ", "hfq", "20190101", "20190630"),
+                provider.pro_bar("000001.SZ", "hfq", "20190101", "20190630"))
+            pd.testing.assert_frame_equal(
+                self.data.index_daily("000001.SH", "20190101", "20190630"),
+                provider.index_daily("000001.SH", "20190101", "20190630"))
+            with self.assertRaises(FileNotFoundError):
+                provider.pro_bar("000002.SZ", None, "20190101", "20190630")
+            market = self.make_market(
+                provider, os.path.join(self.dir, file_format + "_cache"))
+            expected = SyntheticMarket(
+                data=self.data, codes=self.codes, indexs=self.indexs,
+                start="20190101", end="20191231")
+            np.testing.assert_array_equal(expected.market_data,
+                                          market.market_data)
+
+    def test_recording(self):
+        path = os.path.join(self.dir, "records")
+        source = CountingProvider(self.data)
+        recorder = RecordingProvider(source, path)
+        df = recorder.pro_bar("000001.SZ", "hfq", "20190101", "20190630")
+        self.assertEqual(1, len(source.calls))
+        # 有记录时不再请求
+        pd.testing.assert_frame_equal(
+            df, recorder.pro_bar("000001.SZ", "hfq", "20190101", "20190630"),
+            check_exact=True)
+        self.assertEqual(1, len(source.calls))
+        # record: 总是请求
+        RecordingProvider(source, path, mode="record").pro_bar(
+            "000001.SZ", "hfq", "20190101", "20190630")
+        self.assertEqual(2, len(source.calls))
+        replay = RecordingProvider(None, path, mode="replay")
+        pd.testing.assert_frame_equal(
+            df, replay.pro_bar("000001.SZ", "hfq", "20190101", "20190630"),
+            check_exact=True)
+        with self.assertRaises(FileNotFoundError):
+            replay.pro_bar("000001.SZ", None, "20190101", "20190630")
+        with self.assertRaises(ValueError):
+            RecordingProvider(source, path, mode="unknown")
+
+    def test_recording_exact(self):
+        # 保留类型, NaN, 列顺序
+        df = pd.DataFrame({"ts_code": ["000001.SZ", "000001.SZ"],
+                           "trade_date": ["20190103", "20190102"],
+                           "close": [0.1 + 0.2, np.nan],
+                           "vol": np.array([100, 200], dtype=np.int64)})
+
+        class Fixed(DataProvider):
+            def index_daily(self, ts_code, start_date=None, end_date=None):
+                return df
+
+        path = os.path.join(self.dir, "records")
+        RecordingProvider(Fixed(), path).index_daily("000001.SZ")
+        replayed = RecordingProvider(None, path, mode="replay").index_daily(
+            "000001.SZ")
+        pd.testing.assert_frame_equal(df, replayed, check_exact=True)
+
+    def test_market_replay(self):
+        path = os.path.join(self.dir, "records")
+        source = CountingProvider(self.data)
+        recorded = self.make_market(RecordingProvider(source, path),
+                                    os.path.join(self.dir, "cache1"))
+        self.assertEqual(2 * len(self.codes) + len(self.indexs),
+                         len(source.calls))
+        replayed = self.make_market(
+            RecordingProvider(None, path, mode="replay"),
+            os.path.join(self.dir, "cache2"))
+        np.testing.assert_array_equal(recorded.market_data,
+                                      replayed.market_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
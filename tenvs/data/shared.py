@@ -0,0 +1,120 @@
+# -*- coding:utf-8 -*-
+"""
+以 .npy 文件保存 Market 数据, 供多个进程以只读, 零拷贝(memory-mapped)的方式共享
+
+目录结构:
+    <path>/meta.json: 元信息, 最后写入, 存在即表示数据完整
+    <path>/<name>.npy: numpy 数组
+"""
+import contextlib
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+META_FILE = "meta.json"
+# 数据布局变化时加1, 旧版本的 snapshot 需要重新生成
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_key(codes, indexs, start, end):
+    """
+    由 codes, indexs 和日期区间计算 snapshot 的 key, 用于检查 snapshot 是否对应
+    """
+    content = json.dumps([list(codes), list(indexs), start, end])
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def pack_frames(frames, keys):
+    """
+    将 frames[key] (以trade_date为index, 列相同的 DataFrame) 按keys顺序合并
+    返回: values(n_rows, n_columns), dates(n_rows,), offsets(len(keys) + 1,),
+         columns
+    frames[keys[i]] 对应 values[offsets[i]: offsets[i + 1]]
+    """
+    if len(keys) == 0:
+        return np.zeros((0, 0)), np.zeros((0,), dtype=str), \
+            np.zeros((1,), dtype=np.int64), []
+    values = np.concatenate(
+        [frames[key].to_numpy(dtype=float) for key in keys])
+    dates = np.concatenate(
+        [np.asarray(frames[key].index, dtype=str) for key in keys])
+    offsets = np.cumsum([0] + [len(frames[key]) for key in keys])
+    columns = frames[keys[0]].columns.tolist()
+    return values, dates, offsets, columns
+
+
+def unpack_frames(values, dates, offsets, columns, keys):
+    """
+    pack_frames 的逆操作, 返回的 DataFrame 直接使用 values 的内存, 不复制
+    """
+    frames = {}
+    for i, key in enumerate(keys):
+        start, end = offsets[i], offsets[i + 1]
+        index = pd.Index(dates[start: end].astype(str), name="trade_date")
+        frames[key] = pd.DataFrame(values[start: end], index=index,
+                                   columns=columns, copy=False)
+    return frames
+
+
+def save_arrays(path, arrays, meta):
+    """
+    arrays: dict, name => np.array
+    meta: 可以json序列化的dict
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    meta_path = os.path.join(path, META_FILE)
+    # 先删除meta, 写入过程中其他进程不会读到不完整的数据
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    # NOTE(wen): 先写入临时文件再 os.replace, 不覆盖原文件的内容,
+    #     其他进程已经 memory-mapped 的旧数据仍然有效
+    for name, array in arrays.items():
+        with _replace(os.path.join(path, name + ".npy"), "wb") as f:
+            np.save(f, np.asarray(array))
+    meta = dict(meta, arrays=list(arrays.keys()))
+    with _replace(meta_path, "w") as f:
+        json.dump(meta, f)
+
+
+@contextlib.contextmanager
+def _replace(path, mode):
+    """
+    写入同一目录下的临时文件, 完成后以 os.replace 原子地替换 path
+    """
+    tmp_path = path + ".tmp.%d" % os.getpid()
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_meta(path):
+    """
+    返回 save_arrays 写入的 meta, 没有写入(或没有写完)时返回 None
+    """
+    meta_path = os.path.join(path, META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def load_arrays(path, mmap_mode="r"):
+    """
+    返回: arrays, meta
+    mmap_mode="r": 只读的memory-mapped数组, 多个进程共享同一份物理内存
+    """
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    arrays = {}
+    for name in meta["arrays"]:
+        arrays[name] = np.load(os.path.join(path, name + ".npy"),
+                               mmap_mode=mmap_mode, allow_pickle=False)
+    return arrays, meta
@@ -0,0 +1,69 @@
+# -*- coding:utf-8 -*-
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from tenvs.data.shared import (load_arrays, pack_frames, save_arrays,
+                               snapshot_key, unpack_frames)
+
+
+class TestShared(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        index = pd.Index(["20190102", "20190103"], name="trade_date")
+        self.frames = {
+            "a": pd.DataFrame({"open": [1.0, 2.0], "close": [1.5, 2.5]},
+                              index=index),
+            "b": pd.DataFrame({"open": [3.0], "close": [3.5]},
+                              index=index[1:])}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_pack_frames(self):
+        values, dates, offsets, columns = pack_frames(self.frames, ["a", "b"])
+        self.assertEqual((3, 2), values.shape)
+        self.assertEqual([0, 2, 3], offsets.tolist())
+        self.assertEqual(["open", "close"], columns)
+        frames = unpack_frames(values, dates, offsets, columns, ["a", "b"])
+        self.assertTrue(np.shares_memory(frames["a"].values, values))
+        self.assertEqual(3.5, frames["b"].loc["20190103", "close"])
+        self.assertEqual(["20190102", "20190103"],
+                         frames["a"].index.tolist())
+
+    def test_save_and_load_arrays(self):
+        values, dates, offsets, columns = pack_frames(self.frames, ["a", "b"])
+        save_arrays(self.dir, {"values": values, "dates": dates},
+                    {"columns": columns})
+        arrays, meta = load_arrays(self.dir)
+        self.assertEqual(columns, meta["columns"])
+        self.assertIsInstance(arrays["values"], np.memmap)
+        self.assertFalse(arrays["values"].flags.writeable)
+        self.assertTrue(np.array_equal(values, arrays["values"]))
+        self.assertEqual(dates.tolist(), arrays["dates"].tolist())
+
+    def test_save_arrays_mapped(self):
+        # 重新写入时, 已经 memory-mapped 的数组不受影响
+        save_arrays(self.dir, {"values": np.arange(1000.0)}, {})
+        arrays, _ = load_arrays(self.dir)
+        save_arrays(self.dir, {"values": np.zeros(10)}, {})
+        self.assertEqual(np.arange(1000.0).tolist(),
+                         arrays["values"].tolist())
+        new_arrays, _ = load_arrays(self.dir)
+        self.assertEqual([0.0] * 10, new_arrays["values"].tolist())
+
+    def test_snapshot_key(self):
+        key = snapshot_key(["a"], ["b"], "20190101", "20200101")
+        self.assertEqual(key,
+                         snapshot_key(("a",), ("b",), "20190101", "20200101"))
+        self.assertNotEqual(key,
+                            snapshot_key(["a"], [], "20190101", "20200101"))
+        self.assertNotEqual(key,
+                            snapshot_key(["a"], ["b"], "20190101", "20200102"))
+
+
+if __name__ == '__main__':
+    unittest.main()
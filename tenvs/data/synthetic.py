@@ -0,0 +1,369 @@
+# -*- coding:utf-8 -*-
+"""
+合成行情数据, 用于离线测试和性能测试, 不需要 tushare token 和网络
+
+SyntheticData 批量(向量化)生成多个标的的日线数据, 包括:
+    停牌: 停牌日没有数据, 复牌后的 pre_close 为停牌前的收盘价
+    涨跌停: 收盘价为涨跌停价, 其中一部分为一字板(open=high=low=close)
+    拆分/除权: 复权因子变化, 除权日的 pre_close 为除权后的价格
+每个标的的数据只由 seed 和 code 决定, 与请求的日期区间和一起生成的其他标的无关,
+因此分段请求(缓存只下载缺失区间)得到的数据与一次请求的相同
+    NOTE(wen): first_open 除外, SyntheticMarket 以 first_open=start 使第一个
+        交易日不停牌, start 不同时该日及之后停牌期间的数据可能不同,
+        不同 start 的 SyntheticMarket(cache=True) 不要共用 data_dir
+SyntheticData 是一个 DataProvider, pro_bar, index_daily 以与 tushare 相同的格式返回数据
+
+SyntheticMarket: 使用 SyntheticData 代替 tushare 的 Market
+"""
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from tenvs.data.downloader import Downloader
+from tenvs.data.provider import DataProvider
+from tenvs.market import Market
+
+# ts.pro_bar 返回的列
+BAR_COLUMNS = ["ts_code", "trade_date", "open", "high", "low", "close",
+               "pre_close", "change", "pct_chg", "vol", "amount"]
+# pro.index_daily 返回的列
+INDEX_COLUMNS = ["ts_code", "trade_date", "close", "open", "high", "low",
+                 "pre_close", "change", "pct_chg", "vol", "amount"]
+# Market 中个股数据的列: 复权因子, 不复权数据, 后复权数据
+PRICE_COLUMNS = ["open", "high", "low", "close", "pre_close", "change"]
+EQUITY_COLUMNS = ["open", "high", "low", "close", "pre_close", "change",
+                  "pct_chg", "vol", "amount"]
+CODE_COLUMNS = ["adj_factor"] + EQUITY_COLUMNS + \
+    [col + "_hfq" for col in EQUITY_COLUMNS]
+# 拆分/除权的比例
+SPLIT_RATIOS = np.array([1.01, 1.02, 1.05, 1.1, 1.2, 1.3, 1.5, 2.0])
+
+
+def trade_dates(start, end):
+    """
+    [start, end] 中的工作日, 作为合成数据的交易日历
+    """
+    return pd.bdate_range(start, end).strftime("%Y%m%d").tolist()
+
+
+def ar1(values, phi, block=256):
+    """
+    y[t] = phi * y[t - 1] + values[t], y[-1] = 0, 沿第0维(时间)计算
+    分块使用闭式解 y[t] = sum(phi**(t - s) * values[s]), 块内的系数不会溢出
+    """
+    result = np.empty_like(values, dtype=float)
+    last = np.zeros(values.shape[1:])
+    for start in range(0, len(values), block):
+        chunk = values[start: start + block]
+        powers = phi ** np.arange(1, len(chunk) + 1)
+        powers = powers.reshape((-1,) + (1,) * (values.ndim - 1))
+        result[start: start + len(chunk)] = powers * (
+            last + np.cumsum(chunk / powers, axis=0))
+        last = result[start + len(chunk) - 1]
+    return result
+
+
+def suspended_mask(starts, durations):
+    """
+    starts: (n_dates, m) 停牌开始的位置, durations: 对应的停牌天数
+    返回: (n_dates, m), 停牌时为True
+    """
+    rows = np.arange(len(starts))[:, None]
+    ends = np.where(starts, rows + durations, 0)
+    return rows < np.maximum.accumulate(ends, axis=0)
+
+
+class SyntheticData(DataProvider):
+    """
+    seed: 随机种子, 相同的 seed 和 code 得到相同的数据
+    start, end: 合成数据的日期范围, 请求的区间超出范围的部分没有数据,
+        每次请求只生成从 start 到请求的 end 的数据
+    daily_std: 个股日收益率的标准差, 指数为其一半
+    price_range: 个股初始价格的范围, 价格以 mean_reversion 的速度回归初始价格
+    suspend_rate: 每天开始停牌的概率, suspend_days: 平均停牌天数
+    limit_rate: 每天涨跌停的概率, sealed_rate: 涨跌停中一字板的比例
+    split_rate: 每年拆分/除权的次数(期望)
+    chunk_size: 每次向量化生成的标的数量, 限制生成时的内存
+    """
+    limit_pct = 0.1
+    index_price_range = (1000.0, 20000.0)
+
+    def __init__(self, seed=0, start="20000101", end="20301231",
+                 daily_std=0.02, price_range=(5.0, 200.0),
+                 mean_reversion=0.002,
+                 suspend_rate=0.002, suspend_days=5, limit_rate=0.01,
+                 sealed_rate=0.5, split_rate=0.3, chunk_size=128):
+        self.seed = seed
+        self.dates = np.array(trade_dates(start, end), dtype=str)
+        self.daily_std = daily_std
+        self.price_range = price_range
+        self.mean_reversion = mean_reversion
+        self.suspend_rate = suspend_rate
+        self.suspend_days = suspend_days
+        self.limit_rate = limit_rate
+        self.sealed_rate = sealed_rate
+        self.split_rate = split_rate
+        self.chunk_size = chunk_size
+
+    def rng(self, code, stream=0):
+        return np.random.default_rng(
+            [self.seed, zlib.crc32(code.encode("utf-8")), stream])
+
+    def draw(self, codes, index=False, n=None):
+        """
+        每个标的使用自己的随机数生成器, 返回 name => (n, len(codes)) 的随机数
+        n: 日期数量, 默认为全部日期
+        每个随机数序列使用单独的生成器, 前 n 个日期的随机数与 n 无关
+        """
+        n = len(self.dates) if n is None else n
+        m = len(codes)
+        normals = ["eps", "open", "high", "low", "vol"]
+        uniforms = [] if index else ["suspend", "limit", "sealed", "split"]
+        # 每个标的的随机数写入一行, 最后转置
+        r = {name: np.empty((m, n)) for name in normals + uniforms}
+        r["base"], r["adj"] = np.empty(m), np.empty(m)
+        if not index:
+            r["duration"] = np.empty((m, n), dtype=np.int64)
+            r["split_ratio"] = np.empty((m, n), dtype=np.int64)
+        for j, code in enumerate(codes):
+            rng = self.rng(code)
+            r["base"][j] = rng.uniform(0, 1)
+            r["adj"][j] = rng.uniform(1, 10)
+            for k, name in enumerate(normals + uniforms, 1):
+                rng = self.rng(code, k)
+                if name in normals:
+                    rng.standard_normal(out=r[name][j])
+                else:
+                    rng.random(out=r[name][j])
+            if not index:
+                k = len(normals + uniforms) + 1
+                r["duration"][j] = self.rng(code, k).geometric(
+                    1.0 / self.suspend_days, n)
+                r["split_ratio"][j] = self.rng(code, k + 1).integers(
+                    0, len(SPLIT_RATIOS), n)
+        r["high"], r["low"] = np.abs(r["high"]), np.abs(r["low"])
+        return {name: values.T for name, values in r.items()}
+
+    def generate(self, codes, index=False, first_open=None, end=None):
+        """
+        向量化生成 codes 在 end(默认为最后一个日期)及之前的全部日期上的数据
+        index: 为True时生成指数数据(没有停牌, 涨跌停和拆分)
+        first_open: 不为None时, >= first_open的第一个交易日不停牌
+            NOTE(wen): Market 要求第一个交易日不停牌
+        返回: name => (n, len(codes)) 的数组, n 为 <= end 的日期数量,
+            name 为 EQUITY_COLUMNS 和 adj_factor, trading(是否开盘)
+            每个日期的数据只依赖之前的日期, 与 end 无关
+        """
+        n, m = len(self.dates), len(codes)
+        if end is not None:
+            n = int(np.searchsorted(self.dates, end, side="right"))
+        if n == 0:
+            panel = {name: np.zeros((0, m))
+                     for name in EQUITY_COLUMNS + ["adj_factor"]}
+            panel["trading"] = np.zeros((0, m), dtype=bool)
+            return panel
+        r = self.draw(codes, index, n)
+        std = self.daily_std / 2 if index else self.daily_std
+        low, high = np.log(self.index_price_range if index
+                           else self.price_range)
+        base = low + (high - low) * r["base"]
+        # 普通交易日的涨跌幅小于涨跌停, 留出价格取整的误差
+        eps = np.clip(r["eps"] * std, -0.08, 0.08)
+        trading = np.ones((n, m), dtype=bool)
+        limits = np.zeros((n, m))
+        ratios = np.ones((n, m))
+        sealed = np.zeros((n, m), dtype=bool)
+        if not index:
+            trading = ~suspended_mask(r["suspend"] < self.suspend_rate,
+                                      r["duration"])
+            if first_open is not None:
+                first = np.searchsorted(self.dates[:n], first_open)
+                trading[first: first + 1] = True
+            trading[0] = True
+            limit_day = (r["limit"] < self.limit_rate) & trading
+            limit_day[0] = False
+            limits = np.where(limit_day, np.sign(eps + 1e-12), 0.0)
+            eps = np.where(limit_day,
+                           np.log1p(limits * self.limit_pct), eps)
+            split_day = (r["split"] < self.split_rate / 250) & trading
+            split_day[0] = False
+            ratios = np.where(split_day, SPLIT_RATIOS[r["split_ratio"]], 1.0)
+            sealed = limit_day & (r["sealed"] < self.sealed_rate)
+            # 停牌期间价格不变
+            eps = np.where(trading, eps, 0.0)
+        # 不复权的对数价格, 除权日下降 log(拆分比例), 以 mean_reversion 回归 base
+        log_prices = base + ar1(eps - np.log(ratios),
+                                1 - self.mean_reversion)
+        path = np.exp(log_prices)
+        if not index:
+            # 停牌期间使用停牌前的价格
+            rows = np.maximum.accumulate(
+                np.where(trading, np.arange(n)[:, None], 0), axis=0)
+            path = np.take_along_axis(path, rows, axis=0)
+        splits = np.cumprod(ratios, axis=0)
+        first_pre_close = np.round(np.exp(base), 2)
+
+        def get_pre_close(close, cols=slice(None)):
+            pre_close = np.concatenate([first_pre_close[None, cols],
+                                        close[:-1]])
+            return np.where(ratios[:, cols] != 1.0,
+                            np.round(pre_close / ratios[:, cols], 2),
+                            pre_close)
+
+        def get_limit_prices(pre_close):
+            up = np.round(pre_close * (1 + self.limit_pct), 2)
+            down = np.round(pre_close * (1 - self.limit_pct), 2)
+            return up, down
+
+        # 收盘价限制在涨跌停价之间, 涨跌停日为涨跌停价, 依赖前一日的收盘价,
+        # 逐步修正直到涨跌停价不再变化(连续涨跌停的天数),
+        # 每次只修正涨跌停价仍在变化的标的
+        close = np.round(path, 2)
+        if not index:
+            cols = np.arange(m)
+            up, down = get_limit_prices(get_pre_close(close))
+            while len(cols):
+                target = np.round(path[:, cols], 2)
+                limit = limits[:, cols]
+                fixed = np.where(limit > 0, up, np.where(
+                    limit < 0, down, np.clip(target, down, up)))
+                close[:, cols] = np.take_along_axis(
+                    fixed, rows[:, cols], axis=0)
+                new_up, new_down = get_limit_prices(
+                    get_pre_close(close[:, cols], cols))
+                changed = ((new_up != up) | (new_down != down)).any(axis=0)
+                cols = cols[changed]
+                up, down = new_up[:, changed], new_down[:, changed]
+        pre_close = get_pre_close(close)
+        open_ = np.round(pre_close * np.exp(r["open"] * std / 4), 2)
+        high_ = np.round(np.maximum(open_, close) *
+                         (1 + r["high"] * std / 2), 2)
+        low_ = np.round(np.minimum(open_, close) *
+                        (1 - r["low"] * std / 2), 2)
+        if not index:
+            up, down = get_limit_prices(pre_close)
+            open_ = np.clip(open_, down, up)
+            high_ = np.clip(high_, down, up)
+            low_ = np.clip(low_, down, up)
+            # 一字板
+            open_ = np.where(sealed, close, open_)
+            high_ = np.where(sealed, close, high_)
+            low_ = np.where(sealed, close, low_)
+        change = np.round(close - pre_close, 2)
+        vol = np.exp(11.5 + r["vol"] * 0.5) * (1 + 99 * index)
+        vol = np.round(np.where(sealed, vol * 0.1, vol), 2)
+        adj_factor = np.round(r["adj"][None] * splits, 3)
+        return {"open": open_, "high": high_, "low": low_, "close": close,
+                "pre_close": pre_close, "change": change,
+                "pct_chg": np.round(change / pre_close * 100, 4),
+                "vol": vol,
+                "amount": np.round(vol * (high_ + low_) / 2 / 10, 3),
+                "adj_factor": adj_factor, "trading": trading}
+
+    def iter_frames(self, codes, start, end, index=False, first_open=None):
+        """
+        按 chunk_size 分批生成, 依次返回 (code, 以 trade_date 为index的DataFrame)
+        个股: 列为 CODE_COLUMNS, 与 Market.codes_history 相同, 不包括停牌日
+        指数: 列为 INDEX_COLUMNS(不包括ts_code, trade_date)
+        """
+        # 只生成到 end, 不生成之后的日期
+        rows = self.dates[self.dates <= end] >= start
+        dates = self.dates[:len(rows)][rows]
+        for i in range(0, len(codes), self.chunk_size):
+            chunk = codes[i: i + self.chunk_size]
+            panel = self.generate(chunk, index, first_open, end)
+            panel = {name: values[rows] for name, values in panel.items()}
+            for j, code in enumerate(chunk):
+                if index:
+                    columns = {col: panel[col][:, j]
+                               for col in INDEX_COLUMNS[2:]}
+                else:
+                    columns = {"adj_factor": panel["adj_factor"][:, j]}
+                    for col in EQUITY_COLUMNS:
+                        columns[col] = panel[col][:, j]
+                    for col in EQUITY_COLUMNS:
+                        values = panel[col][:, j]
+                        if col in PRICE_COLUMNS:
+                            values = np.round(
+                                values * panel["adj_factor"][:, j], 4)
+                        columns[col + "_hfq"] = values
+                    # 与 Market.download_code_history 相同
+                    columns["adj_factor"] = \
+                        columns["close_hfq"] / columns["close"]
+                trading = panel["trading"][:, j]
+                df = pd.DataFrame(
+                    columns, index=pd.Index(dates, name="trade_date"))
+                yield code, df[trading] if not trading.all() else df
+
+    def code_frames(self, codes, start, end, first_open=None):
+        return dict(self.iter_frames(list(codes), start, end,
+                                     first_open=first_open))
+
+    def index_frames(self, codes, start, end):
+        return dict(self.iter_frames(list(codes), start, end, index=True))
+
+    def to_tushare(self, df, code, columns):
+        # 与 tushare 一致, 按日期倒序
+        df = df.reset_index()
+        df.insert(0, "ts_code", code)
+        return df[columns].iloc[::-1].reset_index(drop=True)
+
+    def pro_bar(self, ts_code, adj=None, start_date=None, end_date=None,
+                first_open=None):
+        """
+        与 ts.pro_bar(ts_code, adj, start_date, end_date) 的格式相同
+        """
+        if adj not in (None, "hfq"):
+            raise ValueError("Unsupported adj: %s" % adj)
+        df = self.code_frames([ts_code], start_date, end_date,
+                              first_open)[ts_code]
+        if adj == "hfq":
+            df = df[[col + "_hfq" for col in EQUITY_COLUMNS]]
+            df.columns = EQUITY_COLUMNS
+        return self.to_tushare(df, ts_code, BAR_COLUMNS)
+
+    def index_daily(self, ts_code, start_date=None, end_date=None):
+        """
+        与 pro.index_daily(ts_code, start_date, end_date) 的格式相同
+        """
+        df = self.index_frames([ts_code], start_date, end_date)[ts_code]
+        return self.to_tushare(df, ts_code, INDEX_COLUMNS)
+
+
+class SyntheticMarket(Market):
+    """
+    使用合成数据的 Market, 参数与 Market 相同, 另外:
+    seed: SyntheticData 的随机种子
+    data: SyntheticData, 不为None时忽略seed
+    cache: 为False(默认)时直接在内存中批量生成, 不读写 data_dir;
+        为True时与 Market 相同, 缓存在 data_dir 中
+        NOTE(wen): 不要与 tushare 的数据使用同一个 data_dir, 不同 seed 的数据
+            也应使用不同的目录
+    生成的个股数据在 Market 的第一个交易日不停牌
+    """
+
+    def __init__(self, seed=0, data=None, cache=False, downloader=None,
+                 **kwargs):
+        if data is None:
+            data = SyntheticData(seed)
+        self.data = data
+        self.cache = cache
+        if downloader is None:
+            # 本地生成, 不需要限流和重试
+            downloader = Downloader(rate_per_minute=1e9, capacity=1e9,
+                                    retries=0)
+        super().__init__(downloader=downloader, provider=data, **kwargs)
+
+    def load_history(self, codes, data_dir, download, name="download"):
+        if self.cache:
+            return super().load_history(codes, data_dir, download, name)
+        if download == self.download_index_history:
+            return self.data.index_frames(codes, self.start, self.end)
+        return self.data.code_frames(codes, self.start, self.end,
+                                     first_open=self.start)
+
+    def download_code_history(self, code, start, end):
+        # 直接生成 Market 的格式, 不需要合并不复权和后复权的数据
+        return self.data.code_frames([code], start, end,
+                                     first_open=self.start)[code]
@@ -0,0 +1,199 @@
+# -*- coding:utf-8 -*-
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from tenvs.data.synthetic import (BAR_COLUMNS, CODE_COLUMNS, INDEX_COLUMNS,
+                                  SyntheticData, SyntheticMarket, ar1,
+                                  suspended_mask)
+
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.data = SyntheticData(seed=1, start="20150101", end="20201231")
+        # 停牌, 涨跌停和拆分较多的数据
+        self.eventful = SyntheticData(
+            seed=3, start="20150101", end="20201231", suspend_rate=0.02,
+            limit_rate=0.05, split_rate=1)
+
+    def test_ar1(self):
+        values = np.random.RandomState(0).normal(size=(600, 3))
+        expected = np.zeros_like(values)
+        last = np.zeros(3)
+        for t in range(len(values)):
+            last = expected[t] = 0.99 * last + values[t]
+        np.testing.assert_allclose(expected, ar1(values, 0.99, block=64))
+
+    def test_suspended_mask(self):
+        starts = np.array([[0, 1, 0, 0, 1, 0, 0, 0]], dtype=bool).T
+        durations = np.array([[0, 2, 0, 0, 3, 0, 0, 0]]).T
+        self.assertEqual([0, 1, 1, 0, 1, 1, 1, 0],
+                         suspended_mask(starts, durations)[:, 0].tolist())
+
+    def test_pro_bar(self):
+        df = self.data.pro_bar("000001.SZ", start_date="20190101",
+                               end_date="20190301")
+        self.assertEqual(BAR_COLUMNS, df.columns.tolist())
+        # 按日期倒序
+        self.assertEqual("20190301", df["trade_date"].iloc[0])
+        self.assertEqual("20190101", df["trade_date"].iloc[-1])
+        hfq = self.data.pro_bar("000001.SZ", adj="hfq",
+                                start_date="20190101", end_date="20190301")
+        self.assertEqual(BAR_COLUMNS, hfq.columns.tolist())
+        np.testing.assert_array_equal(df["vol"], hfq["vol"])
+        self.assertTrue((hfq["close"] > df["close"]).all())
+
+    def test_bars(self):
+        codes = ["%06d.SZ" % i for i in range(20)]
+        frames = self.eventful.code_frames(codes, "20150101", "20201231")
+        n_dates = len(self.eventful.dates)
+        suspended, sealed_up, sealed_down, splits = 0, 0, 0, 0
+        for code in codes:
+            df = frames[code]
+            self.assertEqual(CODE_COLUMNS, df.columns.tolist())
+            suspended += n_dates - len(df)
+            oc = df[["open", "close"]]
+            self.assertTrue((df["high"] >= oc.max(axis=1)).all())
+            self.assertTrue((df["low"] <= oc.min(axis=1)).all())
+            self.assertTrue((df["low"] > 0).all())
+            self.assertTrue((df["pct_chg"].abs() < 11).all())
+            np.testing.assert_allclose(
+                df["close_hfq"] / df["close"], df["adj_factor"], rtol=1e-4)
+            one_price = df["high"] == df["low"]
+            sealed_up += (one_price & (df["pct_chg"] > 9.7)).sum()
+            sealed_down += (one_price & (df["pct_chg"] < -9.7)).sum()
+            # 复牌后的 pre_close 为停牌前的收盘价, 除权日为除权后的价格
+            ratios = (df["adj_factor"] / df["adj_factor"].shift()).iloc[1:]
+            pre_close = df["close"].shift().iloc[1:]
+            split = ratios > 1.005
+            splits += split.sum()
+            np.testing.assert_array_equal(
+                df["pre_close"].iloc[1:][~split], pre_close[~split])
+            np.testing.assert_allclose(
+                df["pre_close"].iloc[1:][split],
+                (pre_close / ratios)[split], rtol=1e-3, atol=0.006)
+        self.assertGreater(suspended, 0)
+        self.assertGreater(sealed_up, 0)
+        self.assertGreater(sealed_down, 0)
+        self.assertGreater(splits, 0)
+
+    def test_deterministic(self):
+        full = self.data.pro_bar("600000.SH", start_date="20180101",
+                                 end_date="20191231")
+        first = SyntheticData(seed=1, start="20150101", end="20201231") \
+            .pro_bar("600000.SH", start_date="20180101", end_date="20181231")
+        second = self.data.pro_bar(
+            "600000.SH", start_date="20190101", end_date="20191231")
+        pd.testing.assert_frame_equal(
+            full, pd.concat([second, first], ignore_index=True))
+        # 与一起生成的其他标的无关
+        panel = self.data.generate(["000001.SZ", "600000.SH"])
+        single = self.data.generate(["600000.SH"])
+        for name, values in single.items():
+            np.testing.assert_array_equal(values[:, 0], panel[name][:, 1])
+        other = SyntheticData(seed=2, start="20150101", end="20201231") \
+            .pro_bar("600000.SH", start_date="20180101", end_date="20191231")
+        self.assertFalse(full.equals(other))
+
+    def test_generate_end(self):
+        # 只生成到 end, 与生成全部日期的前一部分相同
+        codes = ["%06d.SZ" % i for i in range(20)]
+        full = self.eventful.generate(codes)
+        part = self.eventful.generate(codes, end="20170630")
+        n = int((self.eventful.dates <= "20170630").sum())
+        self.assertEqual((n, 20), part["close"].shape)
+        for name, values in part.items():
+            np.testing.assert_array_equal(full[name][:n], values)
+
+    def test_first_open(self):
+        codes = ["%06d.SZ" % i for i in range(20)]
+        panel = self.eventful.generate(codes)
+        date_id = np.where(~panel["trading"].all(axis=1))[0][0]
+        date = self.eventful.dates[date_id]
+        panel = self.eventful.generate(codes, first_open=date)
+        self.assertTrue(panel["trading"][date_id].all())
+
+    def test_empty(self):
+        data = SyntheticData(seed=1, start="20200105", end="20200104")
+        panel = data.generate(["000001.SZ", "000002.SZ"])
+        self.assertEqual((0, 2), panel["close"].shape)
+        self.assertEqual((0, 2), panel["trading"].shape)
+        df = data.pro_bar("000001.SZ", start_date="20190101",
+                          end_date="20190301")
+        self.assertEqual(BAR_COLUMNS, df.columns.tolist())
+        self.assertEqual(0, len(df))
+
+    def test_index_daily(self):
+        df = self.data.index_daily("000001.SH", start_date="20190101",
+                                   end_date="20190301")
+        self.assertEqual(INDEX_COLUMNS, df.columns.tolist())
+        self.assertEqual(44, len(df))
+
+    def test_market(self):
+        codes = ["%06d.SZ" % i for i in range(10)]
+        market = SyntheticMarket(data=self.eventful, codes=codes,
+                                 start="20190101", end="20191231")
+        self.assertEqual(261, len(market.open_dates))
+        self.assertTrue(market.trading[0].all())
+        self.assertFalse(market.trading.all())
+        self.assertTrue(
+            (market.adj_factors[1:] / market.adj_factors[:-1] > 1.005).any())
+        data_dir = tempfile.mkdtemp()
+        try:
+            cached = SyntheticMarket(
+                data=self.eventful, codes=codes, start="20190101",
+                end="20191231", data_dir=data_dir, cache=True)
+            np.testing.assert_array_equal(market.market_data,
+                                          cached.market_data)
+            # 第二次从缓存加载
+            cached = SyntheticMarket(
+                data=self.eventful, codes=codes, start="20190101",
+                end="20191231", data_dir=data_dir, cache=True)
+            np.testing.assert_array_equal(market.market_data,
+                                          cached.market_data)
+        finally:
+            shutil.rmtree(data_dir)
+
+    def test_snapshot_mismatch(self):
+        market = SyntheticMarket(data=self.data, codes=["000001.SZ"],
+                                 indexs=[], start="20190101", end="20190301")
+        path = tempfile.mkdtemp()
+        try:
+            market.save_snapshot(path)
+            with self.assertRaises(ValueError) as context:
+                SyntheticMarket.load_snapshot(path, end="20190401")
+        finally:
+            shutil.rmtree(path)
+        # 同时显示请求的和 snapshot 中的参数
+        message = str(context.exception)
+        self.assertIn("[20190101, 20190401]", message)
+        self.assertIn("[20190101, 20190301]", message)
+        self.assertIn("snapshot codes: ['000001.SZ']", message)
+
+    def test_market_first_day_suspended(self):
+        codes = ["000001.SZ", "000002.SZ"]
+
+        class Data(SyntheticData):
+            # 000002.SZ 第一个交易日停牌
+            def code_frames(self, codes, start, end, first_open=None):
+                frames = super().code_frames(codes, start, end, first_open)
+                if "000002.SZ" in frames:
+                    frames["000002.SZ"] = frames["000002.SZ"].iloc[1:]
+                return frames
+
+        data = Data(seed=1)
+        with self.assertRaises(ValueError):
+            SyntheticMarket(data=data, codes=codes, start="20190101",
+                            end="20190601")
+        market = SyntheticMarket(data=data, codes=codes, start="20190101",
+                                 end="20190601", lazy=True)
+        market.ensure_codes(codes[:1])
+        with self.assertRaises(ValueError):
+            market.ensure_codes()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ import os
 import random
 import unittest
 
+import numpy as np
 from tenvs.envs.average import AverageEnv
 from tenvs.market import Market
 
@@ -70,6 +71,16 @@ class TestAverage(unittest.TestCase):
         self.assertEqual(24, len(actual[0]))
         # TODO: 更具体的测试
 
+    def test_obs_window(self):
+        pre_obs = self.env.reset()
+        self.assertFalse(pre_obs.flags.writeable)
+        for i in range(3):
+            obs, _, _, _, _ = self.env.step(self.env.get_random_action())
+            self.assertEqual(pre_obs.shape, obs.shape)
+            # 滑动一行
+            self.assertEqual(pre_obs[1:].tolist(), obs[:-1].tolist())
+            pre_obs = obs
+
     def test_reset(self):
         self.env.reset(infer=True)
         self.assertEqual(243, self.env.current_time_id)
@@ -89,6 +100,35 @@ class TestAverage(unittest.TestCase):
         self.assertEqual(10.14, sell_price)
         self.assertEqual(10.34, buy_price)
 
+    def test_get_action_prices(self):
+        # 与逐个计算的出价相同
+        self.env.reset()
+        actual = self.env.get_action_prices(np.array([-0.1, 0.3]))
+        expect = [self.env.get_action_price([-0.1, 0.3], code)[i]
+                  for i, code in enumerate(self.codes)]
+        self.assertEqual(expect, actual.tolist())
+
+    def test_profiling(self):
+        env = AverageEnv(self.m, investment=self.invesment,
+                         look_back_days=self.look_back_days)
+        env.reset()
+        self.assertEqual({}, env.perf_stats())
+        env.enable_profiling()
+        for i in range(3):
+            env.step(env.get_random_action())
+        stats = env.perf_stats()
+        for name in env.profiled_phases + ["market.sell_check_batch",
+                                           "market.get_hlc_prices"]:
+            self.assertEqual(3, stats[name]["count"], name)
+        self.assertGreaterEqual(stats["step"]["total"],
+                                stats["do_action"]["total"])
+        # 关闭后恢复原来的方法和 market
+        env.enable_profiling(False)
+        env.step(env.get_random_action())
+        self.assertIs(self.m, env.market)
+        self.assertNotIn("step", vars(env))
+        self.assertEqual(3, env.perf_stats()["step"]["count"])
+
     def test_buy_and_hold(self):
         self.env.reset()
         action = self.env.get_buy_close_action(datestr=self.env.current_date)
@@ -4,11 +4,19 @@ import random
 import gym
 import numpy as np
 from tenvs.common.logger import logger
+from tenvs.common.profiler import Profiler, TimedProxy
+from tenvs.common.rounding import py_round
 from tenvs.envs.reward import get_reward_func
-from tenvs.portfolio import Portfolio
+from tenvs.portfolio import PortfolioBook, PortfolioView
 
 
 class BaseEnv(gym.Env):
+    # 是否使用批量计算的 reward 函数, 见 tenvs.envs.reward.register
+    batched_reward = False
+    # enable_profiling 时计时的方法
+    profiled_phases = ["step", "do_action", "update_portfolio",
+                       "update_value_percent", "update_reward", "_next"]
+
     def __init__(self, market=None, investment=100000.0, look_back_days=10,
                  used_infos=["equities_hfq_info", "indexs_info"],
                  reward_fn="daily_return_add_price_bound", log_deals=False):
@@ -27,13 +35,18 @@ class BaseEnv(gym.Env):
         # 输入数据: 个股信息 + 指数信息
         self.used_infos = used_infos
         self.market_info_size = self.get_market_info_size()
+        # 市场信息, shape: (n_dates, market_info_size)
+        self.market_obs = market.get_market_obs(used_infos)
         # 开市日期列表
         self.dates = market.open_dates
         # 记录一个回合的收益序列
         self.returns = []
-        self.reward_fn = get_reward_func(name=reward_fn)
+        self.reward_fn = get_reward_func(name=reward_fn,
+                                         batched=self.batched_reward)
         self.reward_fn_name = reward_fn
         self.log_deals = log_deals
+        self.profiler = None
+        self.profiling = False
 
     def get_market_info_size(self):
         size = 0
@@ -50,28 +63,11 @@ class BaseEnv(gym.Env):
         return self.look_back_days
 
     def get_market_info(self, date):
-        info = []
-        for info_name in self.used_infos:
-            data = self.market.market_info[date][info_name]
-            info.extend(data)
-        return np.array(info)
+        return self.market_obs[self.market.date_index[date]]
 
     def get_hlc_prices(self):
-        date = self.current_date
-        highs, lows, closes = [], [], []
-        for i in range(self.n):
-            code = self.codes[i]
-            if date in self.market.codes_history[code].index:
-                highs.append(self.market.codes_history[code].loc[date, "high"])
-                lows.append(self.market.codes_history[code].loc[date, "low"])
-                closes.append(self.market.codes_history[code].loc[date,
-                                                                  "close"])
-            else:
-                # 停牌时
-                highs.append(0)
-                lows.append(0)
-                closes.append(0)
-        return highs, lows, closes
+        # 停牌时为0
+        return self.market.get_hlc_prices(self.current_date, self.n)
 
     def update_reward(self, sell_prices, buy_prices):
         if self.reward_fn_name in ["daily_return", "simple"]:
@@ -93,6 +89,13 @@ class BaseEnv(gym.Env):
             code=code,
             datestr=self.current_date,
             bid_price=price)
+        return self.fill_sell(id, ok, price, target_pct)
+
+    def fill_sell(self, id, ok, price, target_pct):
+        """
+        按 sell_check 的结果卖出, price 为成交价
+        """
+        code = self.codes[id]
         if ok:
             # 全仓卖出
             cash_change, price, vol = self.portfolios[
@@ -118,6 +121,13 @@ class BaseEnv(gym.Env):
             code=code,
             datestr=self.current_date,
             bid_price=price)
+        return self.fill_buy(id, ok, price, target_pct)
+
+    def fill_buy(self, id, ok, price, target_pct):
+        """
+        按 buy_check 的结果买进, price 为成交价
+        """
+        code = self.codes[id]
         pre_cash = self.cash
         if ok:
             # 分仓买进
@@ -135,19 +145,67 @@ class BaseEnv(gym.Env):
             return cash_change, ok
         return 0, ok
 
+    def get_action_prices(self, action_values):
+        """
+        action_values: 数组, 取值[-1, 1], 最后一维对应前 n 支股票
+        scale [-1, 1] to [-0.1, 0.1], 返回基于前一交易日收盘价的出价
+        """
+        date_id = self.market.date_index[self.current_date]
+        pre_closes = self.market.pre_closes[date_id, :self.n]
+        return np.round(pre_closes * (1 + action_values * 0.1), 2)
+
+    def execute_orders(self, sell_prices, sell_pcts, buy_prices, buy_pcts):
+        """
+        所有股票先以 sell_prices 卖出到目标仓位 sell_pcts, 再以 buy_prices 买进到
+        buy_pcts, 与按股票顺序逐个调用 sell/buy 的结果相同
+        每一步所有股票一次完成成交检查和下单, 见 PortfolioBook.order_target_percents
+        返回: cash_change
+        """
+        cash_change = 0
+        orders = [("sell", self.market.sell_check_batch, sell_prices,
+                   sell_pcts),
+                  ("buy", self.market.buy_check_batch, buy_prices, buy_pcts)]
+        for side, check, bid_prices, target_pcts in orders:
+            oks, prices = check(self.current_date, bid_prices)
+            # 按最高/最低价成交, 见 PortfolioBook.round_fee
+            py_rounding = oks & (prices != bid_prices)
+            changes, volumes = self.book.order_target_percents(
+                0, target_pcts, prices, self.portfolio_value, self.cash,
+                oks=oks, py_rounding=py_rounding)
+            filled = np.flatnonzero(volumes)
+            rounding = py_rounding[filled]
+            for i, change, price, vol in zip(
+                    filled.tolist(),
+                    self.round_values(changes[filled], 1, rounding).tolist(),
+                    self.round_values(prices[filled], 2, rounding).tolist(),
+                    volumes[filled].tolist()):
+                self.info["orders"].append([side, self.codes[i], change,
+                                            price, vol])
+                if self.log_deals:
+                    logger.info("%s %s price: %.3f, volume: %d" % (
+                        side, self.codes[i], price, vol))
+            # 逐个累加, 与逐个下单的结果相同
+            changes = changes.tolist()
+            self.cash = sum(changes, self.cash)
+            cash_change = sum(changes, cash_change)
+        return cash_change
+
+    def round_values(self, values, ndigits, py_rounding):
+        """
+        与逐个下单时的 round() 结果一致, 见 PortfolioBook.round_fee
+        """
+        result = np.round(values, ndigits)
+        result[py_rounding] = py_round(values[py_rounding], ndigits)
+        return result
+
     def update_portfolio(self):
         pre_portfolio_value = self.portfolio_value
-        self.market_value = 0
-        self.daily_pnl = 0
-        self.pnl = 0
-        self.transaction_cost = 0
-        self.all_transaction_cost = 0
-        for p in self.portfolios:
-            self.market_value += p.market_value
-            self.daily_pnl += p.daily_pnl
-            self.pnl += p.pnl
-            self.transaction_cost += p.transaction_cost
-            self.all_transaction_cost += p.all_transaction_cost
+        book = self.book
+        self.market_value = book.market_value[0].sum()
+        self.daily_pnl = book.daily_pnl[0].sum()
+        self.pnl = book.pnl[0].sum()
+        self.transaction_cost = book.transaction_cost[0].sum()
+        self.all_transaction_cost = book.all_transaction_cost[0].sum()
         self.total_pnl += self.pnl
 
         # 当日收益率 更新
@@ -164,13 +222,79 @@ class BaseEnv(gym.Env):
             self.value_percent = 0.0
         else:
             self.value_percent = self.market_value / self.portfolio_value
-        for i in range(self.n):
-            self.portfolios[i].update_value_percent(self.portfolio_value)
+        self.book.update_value_percent(self.portfolio_value)
 
-    def get_init_obs(self, infer=False):
+    def get_portfolio_info(self):
+        """
+        前 n 支股票的 [daily_return, value_percent, ...], shape: (2 * n,)
+        """
+        info = np.empty(2 * self.n)
+        info[0::2] = self.book.daily_return[0, :self.n]
+        info[1::2] = self.book.value_percent[0, :self.n]
+        return info
+
+    def get_init_portfolio_obs(self):
         raise NotImplementedError
 
+    def get_init_obs(self, infer=False):
+        """
+        obs 由两部分组成: 市场信息, 帐户信息(收益率, 持仓量)
+        NOTE(wen): obs 是缓冲区 self.obs_buffer 中最近 look_back_days 行的只读
+            view, 每步只写入新的一行(市场信息取自 self.market_obs). 缓冲区只有
+            2 * look_back_days 行, 与回合长度无关; 写满时换用新的缓冲区, 最近的
+            look_back_days - 1 行移到开头, 每步的平均开销与 look_back_days 无关.
+            已返回的 obs 指向旧的缓冲区, 不会被修改
+        """
+        move_days = 0
+        if infer is True:
+            move_days = 1
+        tid = self.current_time_id + move_days
+        self.obs_buffer = np.zeros(self.obs_buffer_shape())
+        window = self.obs_buffer[..., :self.look_back_days, :]
+        window[..., :self.market_info_size] = \
+            self.market_obs[tid - self.look_back_days: tid]
+        window[..., self.market_info_size:] = self.get_init_portfolio_obs()
+        self.obs_end = self.look_back_days
+        return self.get_obs_window()
+
+    def obs_buffer_shape(self):
+        return (2 * self.look_back_days, self.input_size)
+
+    def get_obs_window(self):
+        obs = self.obs_buffer[..., self.obs_end - self.look_back_days:
+                              self.obs_end, :]
+        obs.flags.writeable = False
+        return obs
+
+    def next_obs_row(self):
+        """
+        返回缓冲区中新的一行(VectorEnv: 每个环境的新的一行), 写入后调用
+        get_obs_window 得到新的 obs
+        """
+        if self.obs_end == self.obs_buffer.shape[-2]:
+            # 缓冲区已满: 最近的 look_back_days - 1 行移到新的缓冲区的开头
+            keep = self.look_back_days - 1
+            buffer = np.empty_like(self.obs_buffer)
+            buffer[..., :keep, :] = \
+                self.obs_buffer[..., self.obs_end - keep: self.obs_end, :]
+            self.obs_buffer = buffer
+            self.obs_end = keep
+        row = self.obs_buffer[..., self.obs_end, :]
+        self.obs_end += 1
+        return row
+
+    def append_obs(self, portfolio_info):
+        """
+        写入当天的市场信息和 portfolio_info, 返回新的 obs
+        """
+        row = self.next_obs_row()
+        row[:self.market_info_size] = self.get_market_info(self.current_date)
+        row[self.market_info_size:] = portfolio_info
+        return self.get_obs_window()
+
     def reset(self, infer=False):
+        # lazy 模式下, 只加载使用的前 n 支股票
+        self.market.ensure_codes(self.codes[:self.n])
         # 当前时间
         self.current_time_id = self._init_current_time_id(infer)
         self.current_date = self.dates[self.current_time_id]
@@ -191,11 +315,12 @@ class BaseEnv(gym.Env):
         self.pre_cash = self.cash
         self.total_pnl = 0
 
-        # 每只股的 portfolio
+        # 所有股票的持仓, self.portfolios[i] 是第i支股票的 Portfolio
+        self.book = PortfolioBook(1, len(self.codes))
         self.portfolios = []
-        for code in self.codes:
-            self.portfolios.append(Portfolio(code=code,
-                                             log_deals=self.log_deals))
+        for i, code in enumerate(self.codes):
+            self.portfolios.append(PortfolioView(self.book, i, code=code,
+                                                 log_deals=self.log_deals))
         self.obs = self.get_init_obs(infer)
         self.portfolio_value_logs = []
         return self.obs
@@ -211,7 +336,7 @@ class BaseEnv(gym.Env):
         logger.debug("=" * 50 + "%s" % self.current_date + "=" * 50)
         logger.debug("current_time_id: %d, portfolio: %.1f" %
                      (self.current_time_id, self.portfolio_value))
-        logger.debug("step action: %s" % str(action))
+        logger.debug("step action: %s", action)
 
         # 到最后一天
         if self.current_date == self.dates[-1]:
@@ -234,6 +359,43 @@ class BaseEnv(gym.Env):
             "reward": self.reward}
         return self.obs, self.reward, self.done, self.info, self.rewards
 
+    def enable_profiling(self, enabled=True):
+        """
+        enabled=True: 统计 step, step 中各阶段(profiled_phases)和其中 Market 方法
+            调用(名字为 market.方法名)的耗时, 见 perf_stats
+        enabled=False: 停止统计, 已有的统计结果保留
+        NOTE(wen): 开启时在实例上用计时的函数替换这些方法, self.market 替换为
+            TimedProxy; 关闭时恢复, 没有额外开销
+        """
+        if enabled == self.profiling:
+            return
+        if enabled:
+            if self.profiler is None:
+                self.profiler = Profiler()
+            for name in self.profiled_phases:
+                setattr(self, name,
+                        self.profiler.timed(name, getattr(self, name)))
+            self.market = TimedProxy(self.market, self.profiler, "market.")
+        else:
+            for name in self.profiled_phases:
+                delattr(self, name)
+            self.market = self.market._obj
+        self.profiling = enabled
+
+    def perf_stats(self):
+        """
+        enable_profiling 后的累计耗时统计, 见 Profiler.summary
+        """
+        if self.profiler is None:
+            return {}
+        return self.profiler.summary()
+
+    def dump_perf_stats(self, path):
+        # perf_stats 以 json 格式写入 path
+        if self.profiler is None:
+            self.profiler = Profiler()
+        self.profiler.dump(path)
+
     def get_random_action(self):
         return [random.uniform(-1, 1) for i in range(self.action_space)]
 
@@ -40,21 +40,6 @@ class MultiVolEnv(BaseEnv):
         obs = np.array([one_day] * self.look_back_days)
         return obs
 
-    def get_init_obs(self, infer=False):
-        """
-        obs 由两部分组成: 市场信息, 帐户信息(收益率, 持仓量)
-        """
-        market_info = []
-        move_days = 0
-        if infer is True:
-            move_days = 1
-        tid = self.current_time_id + move_days
-        for date in self.dates[tid - self.look_back_days: tid]:
-            market_info.append(self.get_market_info(date))
-        market_info = np.array(market_info)
-        portfolio_info = self.get_init_portfolio_obs()
-        return np.concatenate((market_info, portfolio_info), axis=1)
-
     def get_action_price(self, v_price, code):
         pre_close = self.market.get_pre_close_price(
             code, self.current_date)
@@ -76,56 +61,35 @@ class MultiVolEnv(BaseEnv):
         """
         cash_change = 0
         # 更新拆分信息
-        for i in range(self.n):
-            code = self.codes[i]
-            divide_rate = self.market.get_divide_rate(code, self.current_date)
-            self.portfolios[i].update_before_trade(divide_rate)
-        sell_prices, buy_prices = [], []
+        date_id = self.market.get_date_id(self.current_date)
+        pre_date_id = self.market.get_date_id(self.current_date, before=True)
+        self.book.update_before_trade(
+            self.market.adj_factors[date_id, :self.n] /
+            self.market.adj_factors[pre_date_id, :self.n])
         if only_update:
             sell_prices, buy_prices = [0] * self.n, [0] * self.n
-        if not only_update:
-            # 卖出
-            for i in range(self.n):
-                code = self.codes[i]
-                act_i = action[4 * i: 4 * (i + 1)]
-                sell_price = self.get_action_price(act_i[0], code)
-                sell_prices.append(sell_price)
-                target_pct = self.get_action_target_pct(act_i[1])
-                sell_cash_change, ok = self.sell(i, sell_price, target_pct)
-                cash_change += sell_cash_change
-            # 买进
-            for i in range(self.n):
-                code = self.codes[i]
-                act_i = action[4 * i: 4 * (i + 1)]
-                buy_price = self.get_action_price(act_i[2], code)
-                buy_prices.append(buy_price)
-                target_pct = self.get_action_target_pct(act_i[3])
-                buy_cash_change, ok = self.buy(i, buy_price, target_pct)
-                cash_change += buy_cash_change
+        else:
+            action = np.asarray(action, dtype=float).reshape(self.n, 4)
+            sell_prices = self.get_action_prices(action[:, 0])
+            sell_pcts = self.get_action_target_pct(action[:, 1])
+            buy_prices = self.get_action_prices(action[:, 2])
+            buy_pcts = self.get_action_target_pct(action[:, 3])
+            cash_change = self.execute_orders(sell_prices, sell_pcts,
+                                              buy_prices, buy_pcts)
+            sell_prices, buy_prices = sell_prices.tolist(), buy_prices.tolist()
 
         logger.debug("do_action: time_id: %d, cash_change: %.1f" % (
             self.current_time_id, cash_change))
 
         # update
-        for i in range(self.n):
-            code = self.codes[i]
-            close_price = self.market.get_close_price(code, self.current_date)
-            self.portfolios[i].update_after_trade(
-                close_price=close_price,
-                cash_change=cash_change,
-                pre_portfolio_value=pre_portfolio_value)
+        self.book.update_after_trade(
+            close_prices=self.market.closes[date_id, :self.n],
+            cash_change=cash_change,
+            pre_portfolio_value=pre_portfolio_value)
         return sell_prices, buy_prices
 
     def _next(self):
-        market_info = self.get_market_info(self.current_date)
-        portfolio_info = []
-        for i in range(self.n):
-            portfolio_info.append(self.portfolios[i].daily_return)
-            portfolio_info.append(self.portfolios[i].value_percent)
-        portfolio_info = np.array(portfolio_info)
-        new_obs = np.concatenate((market_info, portfolio_info), axis=0)
-        obs = np.concatenate((self.obs[1:, :],
-                              np.array([new_obs])), axis=0)
+        obs = self.append_obs(self.get_portfolio_info())
         if not self.done:
             self.current_time_id += 1
             self.current_date = self.dates[self.current_time_id]
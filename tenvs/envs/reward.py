@@ -1,12 +1,27 @@
 # -*- coding:utf-8 -*-
+import numpy as np
 from tenvs.common.logger import logger
 
 mapping = {}
+# 批量计算的 reward 函数, 输入为 numpy 数组, 见 register
+batch_mapping = {}
 
 
-def register(name):
+def register(name, batched=False):
+    """
+    batched=False: func(daily_return, highs, lows, closes, sell_prices,
+        buy_prices), 输入为单个环境的值, 价格为长度为 n 的 list
+    batched=True: 参数相同, 输入为 numpy 数组, 可以同时计算多个环境:
+        daily_return: 标量或 shape (n_envs,)
+        highs, lows, closes: shape (n,)
+        sell_prices, buy_prices: shape (n,) 或 (n_envs, n)
+        返回: 标量或 shape (n_envs,)
+    """
     def _thunk(func):
-        mapping[name] = func
+        if batched:
+            batch_mapping[name] = func
+        else:
+            mapping[name] = func
         return func
     return _thunk
 
@@ -26,7 +41,7 @@ def daily_return(daily_return, *args):
 @register("daily_return_add_count_rate")
 def daily_return_add_count_rate(daily_return, highs, lows,
                                 closes, sell_prices, buy_prices):
-    fail, success, profit_count, loss_count = 0, 0, 0
+    fail, success, profit_count, loss_count = 0, 0, 0, 0
     for i in range(len(highs)):
         # 买
         if buy_prices[i] >= lows[i]:
@@ -49,7 +64,9 @@ def daily_return_add_count_rate(daily_return, highs, lows,
             fail += 1
 
     success_rate = (success * 2) / (success + fail)
-    profit_rate = (profit_count * 2) / (profit_count + loss_count)
+    profit_rate = 0
+    if success > 0:
+        profit_rate = (profit_count * 2) / (profit_count + loss_count)
 
     reward = daily_return + success_rate + profit_rate
 
@@ -124,7 +141,98 @@ def daily_return_with_chl_penalty(daily_return, highs, lows,
     return reward
 
 
-def get_reward_func(name):
+def batch_mean_squared_error(a, b, scaled=10.0):
+    """
+    与 mean_squared_error 相同, 在最后一维上计算
+    a: shape (n,), b: shape (n,) 或 (n_envs, n)
+    """
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    valid = a != 0
+    errors = (scaled * (1 - b / np.where(valid, a, 1))) ** 2
+    return np.where(valid, errors, 0.0).sum(axis=-1) / a.shape[-1]
+
+
+@register("simple", batched=True)
+def batch_simple(daily_return, *args):
+    return np.where(np.asarray(daily_return) <= 0, -1, 1)
+
+
+@register("daily_return_add_count_rate", batched=True)
+def batch_daily_return_add_count_rate(daily_return, highs, lows,
+                                      closes, sell_prices, buy_prices):
+    sell_prices = np.asarray(sell_prices, dtype=float)
+    buy_prices = np.asarray(buy_prices, dtype=float)
+    # 买/卖可以成交
+    buy_ok = buy_prices >= lows
+    sell_ok = sell_prices <= highs
+    success = buy_ok.sum(axis=-1) + sell_ok.sum(axis=-1)
+    # 买价不高于收盘价, 卖价高于收盘价为盈利
+    profit_count = (buy_ok & (buy_prices <= closes)).sum(axis=-1) + \
+        (sell_ok & (sell_prices > closes)).sum(axis=-1)
+    success_rate = (success * 2) / (2 * len(highs))
+    profit_rate = np.where(success > 0,
+                           (profit_count * 2) / np.maximum(success, 1), 0)
+    return daily_return + success_rate + profit_rate
+
+
+@register("daily_return_add_buy_sell_penalty", batched=True)
+def batch_daily_return_add_buy_sell_penalty(daily_return, highs, lows,
+                                            closes, sell_prices, buy_prices):
+    # 如果出现买价>卖价 增加一个较大的惩罚
+    count = (np.asarray(sell_prices) < np.asarray(buy_prices)).sum(axis=-1)
+    return (daily_return - 0.05 * count) * 3
+
+
+@register("daily_return_add_price_bound", batched=True)
+def batch_daily_return_add_price_bound(daily_return, highs, lows,
+                                       closes, sell_prices, buy_prices):
+    # 如果出现买价>卖价 增加一个较大的惩罚
+    count = (np.asarray(sell_prices) < np.asarray(buy_prices)).sum(axis=-1)
+    # 计算 bound
+    sell_error = batch_mean_squared_error(highs, sell_prices)
+    buy_error = batch_mean_squared_error(lows, buy_prices)
+    return daily_return - 1.0 * count - sell_error - buy_error
+
+
+@register("daily_return_with_chl_penalty", batched=True)
+def batch_daily_return_with_chl_penalty(daily_return, highs, lows,
+                                        closes, sell_prices, buy_prices):
+    reward = batch_daily_return_add_price_bound(
+        daily_return, highs, lows, closes, sell_prices, buy_prices)
+    # 增加相对于收盘价的惩罚
+    closes = np.asarray(closes, dtype=float)
+    sell_prices = np.asarray(sell_prices, dtype=float)
+    buy_prices = np.asarray(buy_prices, dtype=float)
+    valid = closes != 0
+    safe_closes = np.where(valid, closes, 1)
+    sell_error = np.where(valid & (sell_prices < closes),
+                          ((closes - sell_prices) * 10 / safe_closes) ** 2, 0)
+    buy_error = np.where(valid & (buy_prices > closes),
+                         ((buy_prices - closes) * 10 / safe_closes) ** 2, 0)
+    return reward + (sell_error + buy_error).sum(axis=-1)
+
+
+def batch_reward(func):
+    """
+    将单个环境的 reward 函数转为批量计算的函数, 逐个环境调用 func
+    """
+    def _batch(daily_return, highs, lows, closes, sell_prices, buy_prices):
+        daily_returns = np.asarray(daily_return, dtype=float)
+        highs, lows, closes = [np.asarray(v).tolist()
+                               for v in (highs, lows, closes)]
+        shape = daily_returns.shape + (len(highs),)
+        sell_prices = np.broadcast_to(sell_prices, shape).tolist()
+        buy_prices = np.broadcast_to(buy_prices, shape).tolist()
+        if daily_returns.ndim == 0:
+            return func(daily_returns.item(), highs, lows, closes,
+                        sell_prices, buy_prices)
+        return np.array([func(r, highs, lows, closes, s, b) for r, s, b in
+                         zip(daily_returns.tolist(), sell_prices,
+                             buy_prices)], dtype=float)
+    return _batch
+
+
+def get_reward_func(name, batched=False):
     """
     If you want to register your own reward function, you just need:
     Usage Example:
@@ -134,14 +242,21 @@ def get_reward_func(name):
     def your_reward_function(**kwargs):
         ...
         return reward_fn
+    batched=True: 返回批量计算的函数(VectorEnv 使用), 没有注册批量计算的函数时,
+        使用 batch_reward 逐个环境计算
     """
     logger.info("tenvs.envs.reward use reward function: %s" % name)
+    if batched and not callable(name) and name in batch_mapping:
+        return batch_mapping[name]
     if callable(name):
-        return name
+        func = name
     elif name in mapping:
-        return mapping[name]
+        func = mapping[name]
     else:
         raise ValueError('Unknown network type: {}'.format(name))
+    if batched:
+        return batch_reward(func)
+    return func
 
 
 def main():
@@ -1,6 +1,9 @@
+import random
 import unittest
 
-from tenvs.envs.reward import get_reward_func, mean_squared_error
+import numpy as np
+from tenvs.envs.reward import (batch_mapping, batch_mean_squared_error,
+                               get_reward_func, mapping, mean_squared_error)
 
 
 class TestReward(unittest.TestCase):
@@ -24,6 +27,60 @@ class TestReward(unittest.TestCase):
         v = fn(0.03, highs, lows, closes, sell_prices, buy_prices)
         self.assertEqual(0.09, v)
 
+    def test_daily_return_add_count_rate(self):
+        fn = get_reward_func("daily_return_add_count_rate")
+        highs, lows, closes = [100, 100], [90, 90], [95, 95]
+        # 成交 3 次, 盈利 2 次: 0.03 + 6 / 4 + 4 / 3
+        v = fn(0.03, highs, lows, closes, [98, 101], [92, 96])
+        self.assertAlmostEqual(0.03 + 1.5 + 4 / 3, v)
+        # 都不能成交
+        v = fn(0.03, highs, lows, closes, [101, 101], [80, 80])
+        self.assertEqual(0.03, v)
+
+    def test_batch_mean_squared_error(self):
+        self.assertEqual(12.5, batch_mean_squared_error([2.0, 4.0],
+                                                        [1.0, 4.0]))
+        self.assertEqual([12.5, 0], batch_mean_squared_error(
+            [2.0, 0], [[1.0, 4.0], [2.0, 1.0]]).tolist())
+
+    def test_batched(self):
+        # 批量计算与逐个计算的结果一致
+        self.assertEqual(set(mapping), set(batch_mapping))
+        random.seed(0)
+        n_envs, n = 4, 5
+        closes = np.array([random.uniform(5, 20) for _ in range(n)])
+        closes[0] = 0
+        highs, lows = closes * 1.05, closes * 0.95
+        daily_returns = np.array([random.uniform(-0.1, 0.1)
+                                  for _ in range(n_envs)])
+        sell_prices = closes * np.random.RandomState(0).uniform(
+            0.9, 1.1, (n_envs, n))
+        buy_prices = closes * np.random.RandomState(1).uniform(
+            0.9, 1.1, (n_envs, n))
+        args = [a.tolist() for a in (highs, lows, closes)]
+        for name in mapping:
+            fn = get_reward_func(name)
+            batch_fn = get_reward_func(name, batched=True)
+            expect = [fn(r, *args, s, b) for r, s, b in zip(
+                daily_returns.tolist(), sell_prices.tolist(),
+                buy_prices.tolist())]
+            actual = batch_fn(daily_returns, highs, lows, closes,
+                              sell_prices, buy_prices)
+            self.assertTrue(np.allclose(expect, actual), name)
+            # 单个环境
+            actual = batch_fn(daily_returns[0], highs, lows, closes,
+                              sell_prices[0], buy_prices[0])
+            self.assertAlmostEqual(expect[0], actual, msg=name)
+
+    def test_batch_reward(self):
+        # 没有批量计算的函数时, 逐个环境计算
+        def fn(daily_return, highs, lows, closes, sell_prices, buy_prices):
+            return daily_return + sum(sell_prices)
+        batch_fn = get_reward_func(fn, batched=True)
+        self.assertEqual([3.5, 2.0], batch_fn(
+            np.array([0.5, 0]), [1, 1], [1, 1], [1, 1],
+            np.array([[1, 2], [1, 1]]), 0).tolist())
+
 
 if __name__ == '__main__':
     unittest.main()
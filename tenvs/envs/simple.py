@@ -42,21 +42,6 @@ class SimpleEnv(BaseEnv):
         obs = np.array([one_day] * self.look_back_days)
         return obs
 
-    def get_init_obs(self, infer=False):
-        """
-        obs 由两部分组成: 市场信息, 帐户信息(收益率, 持仓量)
-        """
-        market_info = []
-        move_days = 0
-        if infer is True:
-            move_days = 1
-        tid = self.current_time_id + move_days
-        for date in self.dates[tid - self.look_back_days: tid]:
-            market_info.append(self.get_market_info(date))
-        market_info = np.array(market_info)
-        portfolio_info = self.get_init_portfolio_obs()
-        return np.concatenate((market_info, portfolio_info), axis=1)
-
     def get_action_price(self, action):
         pre_close = self.market.get_pre_close_price(
             self.code, self.current_date)
@@ -96,12 +81,7 @@ class SimpleEnv(BaseEnv):
         return sell_prices, buy_prices
 
     def _next(self):
-        market_info = self.get_market_info(self.current_date)
-        portfolio_info = np.array([self.portfolio.daily_return,
-                                   self.portfolio.value_percent])
-        new_obs = np.concatenate((market_info, portfolio_info), axis=0)
-        obs = np.concatenate((self.obs[1:, :],
-                              np.array([new_obs])), axis=0)
+        obs = self.append_obs(self.get_portfolio_info())
         if not self.done:
             self.current_time_id += 1
             self.current_date = self.dates[self.current_time_id]
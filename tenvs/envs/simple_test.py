@@ -6,7 +6,10 @@ import os
 import random
 import unittest
 
+import numpy as np
+from tenvs.data.synthetic import SyntheticMarket
 from tenvs.envs.simple import SimpleEnv
+from tenvs.envs.vector import SimpleVectorEnv
 from tenvs.market import Market
 
 logging.root.setLevel(logging.INFO)
@@ -92,5 +95,64 @@ class TestSimple(unittest.TestCase):
         self.assertEqual(expect, actual)
 
 
+class TestSimpleLazy(unittest.TestCase):
+    def setUp(self):
+        # 合成数据, 不需要 TUSHARE_TOKEN
+        self.codes = ["000001.SZ", "000002.SZ", "000003.SZ"]
+        self.m = SyntheticMarket(
+            seed=1, start="20190101", end="20190601", codes=self.codes,
+            indexs=["000001.SH"], lazy=True)
+
+    def run_env(self, env):
+        env.reset()
+        done = False
+        while not np.all(done):
+            _, _, done, _, _ = env.step(env.get_random_action())
+
+    def test_lazy(self):
+        # 只加载 env 使用的第一支股票
+        self.run_env(SimpleEnv(self.m, used_infos=["indexs_info"],
+                               reward_fn="simple"))
+        self.assertEqual(set(self.codes[1:]), self.m.pending_codes)
+        # reward 使用 highs, lows, closes
+        self.run_env(SimpleEnv(self.m, used_infos=["indexs_info"]))
+        self.run_env(SimpleVectorEnv(self.m, num_envs=2,
+                                     used_infos=["indexs_info"]))
+        self.assertEqual(set(self.codes[1:]), self.m.pending_codes)
+        n_dates = len(self.m.open_dates)
+        self.assertEqual((3, n_dates, 1), self.m.hlc.shape)
+        # 个股信息包含所有股票
+        SimpleEnv(self.m)
+        self.assertEqual(set(), self.m.pending_codes)
+        highs, _, _ = self.m.get_hlc_prices(self.m.open_dates[0])
+        self.assertEqual((3, n_dates, 3), self.m.hlc.shape)
+        np.testing.assert_array_equal(self.m.highs[0], highs)
+
+
+class TestSimpleObs(unittest.TestCase):
+    def test_obs_buffer(self):
+        # 缓冲区的大小与回合长度无关, 已返回的 obs 不会被修改
+        for end in ["20190301", "20201231"]:
+            m = SyntheticMarket(seed=1, start="20190101", end=end,
+                                codes=["000001.SZ"], indexs=["000001.SH"])
+            env = SimpleEnv(m, look_back_days=5)
+            obs_list = [env.reset()]
+            copies = [obs_list[0].copy()]
+            done = False
+            while not done:
+                date_id = m.date_index[env.current_date]
+                obs, _, done, _, _ = env.step(env.get_random_action())
+                self.assertEqual((10, env.input_size), env.obs_buffer.shape)
+                np.testing.assert_array_equal(
+                    env.market_obs[date_id - 4: date_id + 1],
+                    obs[:, :env.market_info_size])
+                obs_list.append(obs)
+                copies.append(obs.copy())
+            for obs, copy in zip(obs_list, copies):
+                np.testing.assert_array_equal(copy, obs)
+            for pre, obs in zip(copies[:-1], copies[1:]):
+                np.testing.assert_array_equal(pre[1:], obs[:-1])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,281 @@
+# -*- coding:utf-8 -*-
+"""
+多进程运行多个环境, 每个子进程运行一个 scenario.make_env 创建的环境
+obs, reward, done 等写入预先分配的共享内存, 进程间只传递很小的控制消息
+子进程通过 Market.attach 共享主进程 dump_shared 的 Market 数据, 不重复下载和计算
+"""
+import multiprocessing as mp
+import random
+import shutil
+import tempfile
+import traceback
+import weakref
+
+import numpy as np
+from tenvs.data.shared import SNAPSHOT_VERSION, load_meta, snapshot_key
+from tenvs.market import Market
+from tenvs.scenario import make_env
+
+
+def _shared_array(ctx, shape, dtype):
+    # 返回 (RawArray, 对应的 numpy view)
+    dtype = np.dtype(dtype)
+    size = int(np.prod(shape)) * dtype.itemsize
+    raw = ctx.RawArray("b", max(size, 1))
+    return raw, _as_array(raw, shape, dtype)
+
+
+def _as_array(raw, shape, dtype):
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape))
+    return np.frombuffer(raw, dtype=dtype, count=count).reshape(shape)
+
+
+def _worker(index, remote, parent_remote, market_path, env_args, buffers,
+            seed, auto_reset):
+    """
+    子进程: 执行主进程的命令, 结果写入 buffers 中的第 index 行
+    命令: ("reset", None), ("step", None), ("seed", seed), ("close", None)
+    """
+    parent_remote.close()
+    try:
+        market = Market.attach(market_path)
+        env = make_env(market=market, **env_args)
+        arrays = {name: _as_array(raw, shape, dtype)
+                  for name, (raw, shape, dtype) in buffers.items()}
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+    except Exception:
+        remote.send(("error", traceback.format_exc()))
+        remote.close()
+        return
+    remote.send(("ok", None))
+
+    def write_obs(obs):
+        arrays["obs"][index] = obs
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+        except EOFError:
+            break
+        try:
+            if cmd == "reset":
+                write_obs(env.reset())
+                remote.send(("ok", env.current_date))
+            elif cmd == "step":
+                action = arrays["actions"][index].tolist()
+                obs, reward, done, info, _ = env.step(action)
+                arrays["reward"][index] = reward
+                arrays["done"][index] = done
+                arrays["portfolio_value"][index] = env.portfolio_value
+                arrays["daily_pnl"][index] = env.daily_pnl
+                if done and auto_reset:
+                    arrays["final_obs"][index] = obs
+                    obs = env.reset()
+                write_obs(obs)
+                remote.send(("ok", (info["current_date"], info["orders"])))
+            elif cmd == "seed":
+                random.seed(data)
+                np.random.seed(data)
+                remote.send(("ok", None))
+            elif cmd == "close":
+                remote.send(("ok", None))
+                break
+            else:
+                raise ValueError("Unknown command: %s" % cmd)
+        except Exception:
+            remote.send(("error", traceback.format_exc()))
+    remote.close()
+
+
+def _cleanup(processes, remotes, shared_dir):
+    """
+    结束仍在运行的子进程, 关闭管道, 删除 shared_dir(为None时不删除)
+    NOTE(wen): weakref.finalize 调用, 参数中不能引用 SubprocVectorEnv
+    """
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+    for remote in remotes:
+        remote.close()
+    if shared_dir is not None:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+class SubprocVectorEnv:
+    """
+    num_envs 个子进程, 每个运行一个 scenario 环境(参数与 scenario.make_env 相同)
+    action: shape (num_envs, action_space)
+    step 返回:
+        obs: (num_envs, look_back_days, input_size), 共享内存的只读 view,
+            下一次 step/reset 时会被覆盖, 需要保存时请复制
+        reward, done: (num_envs,)
+        info: dict, current_date/orders 为每个环境的list,
+            portfolio_value/daily_pnl 为 (num_envs,) 的数组
+        rewards: (num_envs, n)
+    shared_dir: dump_shared 的目录, 默认使用临时目录, close 时删除
+        指定的目录中已有与 market 对应的数据时直接使用, 不重新写入,
+        多个 SubprocVectorEnv 可以共享; 已有其他 market 的数据时抛出 ValueError
+        NOTE(wen): 没有调用 close 时, 对象被回收或解释器退出时结束子进程并删除
+            临时目录, 建议使用 with SubprocVectorEnv(...) as env
+    seed: 第 i 个子进程使用 seed + i 作为随机种子
+    auto_reset: 回合结束的子进程自动 reset, 结束时的 obs 在 info["final_obs"]
+    context: multiprocessing 启动方式, fork/spawn/forkserver, 默认使用系统默认值
+    """
+
+    def __init__(self, scenario, market, num_envs, investment,
+                 look_back_days, used_infos, reward_fn, log_deals=False,
+                 shared_dir=None, seed=None, auto_reset=True, context=None):
+        self.num_envs = num_envs
+        self.auto_reset = auto_reset
+        env_args = {"scenario": scenario, "investment": investment,
+                    "look_back_days": look_back_days,
+                    "used_infos": used_infos, "reward_fn": reward_fn,
+                    "log_deals": log_deals}
+        # 主进程中的环境只用来获取 action_space, input_size 等信息
+        env = make_env(market=market, **env_args)
+        self.n = env.n
+        self.action_space = env.action_space
+        self.input_size = env.input_size
+        self.look_back_days = look_back_days
+
+        self.remove_shared_dir = shared_dir is None
+        if shared_dir is None:
+            shared_dir = tempfile.mkdtemp(prefix="tenvs_shared_")
+        self.shared_dir = shared_dir
+        self.remotes, self.processes = [], []
+        self.closed = False
+        self.waiting = False
+        self._finalizer = weakref.finalize(
+            self, _cleanup, self.processes, self.remotes,
+            shared_dir if self.remove_shared_dir else None)
+        try:
+            self._start(market, ctx=mp.get_context(context),
+                        env_args=env_args, seed=seed)
+        except BaseException:
+            # 启动失败时结束已启动的子进程, 删除临时目录
+            self.closed = True
+            self._finalizer()
+            raise
+
+    def _dump_shared(self, market):
+        """
+        只在 shared_dir 中没有数据时写入. 已有的数据可能正在被其他进程
+        memory-mapped 使用, 与 market 对应时直接使用, 否则抛出 ValueError
+        """
+        meta = load_meta(self.shared_dir)
+        if meta is None:
+            market.dump_shared(self.shared_dir)
+            return
+        key = snapshot_key(market.codes, market.indexs, market.start,
+                           market.end)
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("key") != key:
+            raise ValueError(
+                "shared_dir %s holds another market: codes: %s, indexs: %s, "
+                "[%s, %s]" % (self.shared_dir, meta.get("codes"),
+                              meta.get("indexs"), meta.get("start"),
+                              meta.get("end")))
+
+    def _start(self, market, ctx, env_args, seed):
+        num_envs, look_back_days = self.num_envs, self.look_back_days
+        self._dump_shared(market)
+        obs_shape = (num_envs, look_back_days, self.input_size)
+        specs = {"obs": (obs_shape, np.float64),
+                 "final_obs": (obs_shape, np.float64),
+                 "actions": ((num_envs, self.action_space), np.float64),
+                 "reward": ((num_envs,), np.float64),
+                 "done": ((num_envs,), np.bool_),
+                 "portfolio_value": ((num_envs,), np.float64),
+                 "daily_pnl": ((num_envs,), np.float64)}
+        buffers = {}
+        self.buffers = {}
+        for name, (shape, dtype) in specs.items():
+            raw, array = _shared_array(ctx, shape, dtype)
+            buffers[name] = (raw, shape, dtype)
+            self.buffers[name] = array
+
+        for i in range(num_envs):
+            remote, work_remote = ctx.Pipe()
+            worker_seed = None if seed is None else seed + i
+            process = ctx.Process(
+                target=_worker,
+                args=(i, work_remote, remote, self.shared_dir, env_args,
+                      buffers, worker_seed, self.auto_reset),
+                daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self._receive()
+
+    def _receive(self):
+        results = [remote.recv() for remote in self.remotes]
+        errors = [data for status, data in results if status == "error"]
+        if len(errors) > 0:
+            raise RuntimeError("SubprocVectorEnv worker error:\n%s" %
+                               errors[0])
+        return [data for _, data in results]
+
+    def _view(self, name):
+        array = self.buffers[name].view()
+        array.flags.writeable = False
+        return array
+
+    def seed(self, seed):
+        for i, remote in enumerate(self.remotes):
+            remote.send(("seed", seed + i))
+        self._receive()
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        self._receive()
+        return self._view("obs")
+
+    def step_async(self, action):
+        self.buffers["actions"][...] = np.asarray(action, dtype=float).reshape(
+            self.num_envs, self.action_space)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        results = self._receive()
+        self.waiting = False
+        reward = self.buffers["reward"].copy()
+        done = self.buffers["done"].copy()
+        info = {"current_date": [date for date, _ in results],
+                "orders": [orders for _, orders in results],
+                "portfolio_value": self.buffers["portfolio_value"].copy(),
+                "daily_pnl": self.buffers["daily_pnl"].copy()}
+        if self.auto_reset and done.any():
+            info["final_obs"] = self._view("final_obs")
+        rewards = np.repeat(reward[:, None], self.n, axis=1)
+        return self._view("obs"), reward, done, info, rewards
+
+    def step(self, action):
+        self.step_async(action)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.waiting:
+                self._receive()
+            for remote in self.remotes:
+                remote.send(("close", None))
+            self._receive()
+        finally:
+            # 正常退出的子进程直接 join, 出错时 terminate
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,127 @@
+# -*- coding:utf-8 -*-
+
+import gc
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from tenvs.data.synthetic import SyntheticMarket
+from tenvs.envs.subproc import SubprocVectorEnv
+from tenvs.market import Market
+from tenvs.scenario import make_env
+
+logging.root.setLevel(logging.ERROR)
+
+
+class TestSubprocVectorEnv(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        # NOTE: 需要在环境变量中设置 TUSHARE_TOKEN
+        ts_token = os.getenv("TUSHARE_TOKEN")
+        self.m = Market(
+            ts_token=ts_token,
+            start="20190101",
+            end="20200101",
+            codes=["000001.SZ", "000002.SZ"],
+            indexs=[],
+            data_dir="/tmp/tenvs")
+        self.args = ["multi_vol", self.m, 2, 100000.0, 10,
+                     ["equities_hfq_info", "indexs_info"],
+                     "daily_return_add_price_bound"]
+
+    def test_step(self):
+        # 每个子进程的结果与单独运行的环境一致
+        env = SubprocVectorEnv(*self.args, seed=0)
+        envs = [make_env("multi_vol", self.m, 100000.0, 10,
+                         ["equities_hfq_info", "indexs_info"],
+                         "daily_return_add_price_bound", False)
+                for _ in range(2)]
+        obs = env.reset()
+        self.assertEqual((2, 10, envs[0].input_size), obs.shape)
+        self.assertFalse(obs.flags.writeable)
+        self.assertTrue(np.array_equal(
+            np.stack([e.reset() for e in envs]), obs))
+        rng = np.random.RandomState(0)
+        for _ in range(20):
+            action = rng.uniform(-1, 1, (2, env.action_space))
+            outs = [e.step(action[i].tolist()) for i, e in enumerate(envs)]
+            obs, reward, done, info, _ = env.step(action)
+            self.assertTrue(np.array_equal(np.stack([o[0] for o in outs]),
+                                           obs))
+            self.assertEqual([o[1] for o in outs], reward.tolist())
+            self.assertEqual([o[3]["orders"] for o in outs], info["orders"])
+            self.assertEqual([e.portfolio_value for e in envs],
+                             info["portfolio_value"].tolist())
+        env.close()
+
+    def test_auto_reset(self):
+        env = SubprocVectorEnv(*self.args, auto_reset=True)
+        env.reset()
+        done = np.zeros(2, dtype=bool)
+        while not done.any():
+            obs, reward, done, info, _ = env.step(
+                np.zeros((2, env.action_space)))
+        self.assertTrue(done.all())
+        self.assertIn("final_obs", info)
+        self.assertFalse(np.array_equal(info["final_obs"], obs))
+        env.close()
+        self.assertFalse(os.path.exists(env.shared_dir))
+
+
+class TestSubprocCleanup(unittest.TestCase):
+    def setUp(self):
+        # 合成数据, 不需要 TUSHARE_TOKEN
+        self.m = SyntheticMarket(
+            seed=1, start="20190101", end="20190601",
+            codes=["000001.SZ", "000002.SZ"], indexs=[])
+        self.args = ["multi_vol", self.m, 2, 100000.0, 10,
+                     ["equities_hfq_info"], "daily_return_add_price_bound"]
+
+    def test_with(self):
+        with SubprocVectorEnv(*self.args) as env:
+            env.reset()
+            env.step(np.zeros((2, env.action_space)))
+            processes = env.processes
+        self.assertTrue(env.closed)
+        self.assertFalse(os.path.exists(env.shared_dir))
+        self.assertFalse(any(p.is_alive() for p in processes))
+
+    def test_shared_dir(self):
+        # 已有对应的数据时不重新写入, 其他 env 的 memory-mapped 数据不受影响
+        shared_dir = tempfile.mkdtemp()
+        path = os.path.join(shared_dir, "market_data.npy")
+        try:
+            with SubprocVectorEnv(*self.args, shared_dir=shared_dir) as env:
+                inode = os.stat(path).st_ino
+                obs = env.reset().copy()
+                with SubprocVectorEnv(*self.args,
+                                      shared_dir=shared_dir) as other:
+                    self.assertEqual(inode, os.stat(path).st_ino)
+                    np.testing.assert_array_equal(obs, other.reset())
+            self.assertTrue(os.path.exists(path))
+            market = SyntheticMarket(
+                seed=1, start="20190101", end="20190701",
+                codes=["000001.SZ", "000002.SZ"], indexs=[])
+            with self.assertRaises(ValueError):
+                SubprocVectorEnv("multi_vol", market, *self.args[2:],
+                                 shared_dir=shared_dir)
+            self.assertEqual(inode, os.stat(path).st_ino)
+        finally:
+            shutil.rmtree(shared_dir)
+
+    def test_not_closed(self):
+        # 没有 close 时, 回收对象后结束子进程, 删除临时目录
+        env = SubprocVectorEnv(*self.args)
+        env.reset()
+        shared_dir, processes = env.shared_dir, env.processes
+        del env
+        gc.collect()
+        self.assertFalse(os.path.exists(shared_dir))
+        self.assertFalse(any(p.is_alive() for p in processes))
+
+
+if __name__ == '__main__':
+    unittest.main()
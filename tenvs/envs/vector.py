@@ -0,0 +1,319 @@
+# -*- coding:utf-8 -*-
+
+import numpy as np
+from tenvs.envs.base import BaseEnv
+from tenvs.portfolio import PortfolioBook
+
+
+class VectorEnv(BaseEnv):
+    """
+    同时运行 num_envs 个同一场景的环境, 所有环境按相同的日期同步前进
+    action: shape (num_envs, action_space), 每一行是一个环境的 action
+    step 返回按环境堆叠的结果:
+        obs: (num_envs, look_back_days, input_size)
+        reward, done: (num_envs,)
+        rewards: (num_envs, n)
+    账户和订单状态保存在 shape 为 (num_envs, n) 的数组中, 见 PortfolioBook
+    auto_reset: 回合结束时自动 reset, 结束时的 obs 保存在 info["final_obs"]
+    NOTE(wen): 每个环境的逻辑与对应的单个环境一致, reward 使用批量计算的函数,
+        与单个环境的 reward 可能有浮点数误差
+    """
+    batched_reward = True
+
+    def __init__(self, market=None, num_envs=1, investment=100000.0,
+                 look_back_days=10,
+                 used_infos=["equities_hfq_info", "indexs_info"],
+                 reward_fn="daily_return_add_price_bound", log_deals=False,
+                 auto_reset=False):
+        super(VectorEnv, self).__init__(market, investment, look_back_days,
+                                        used_infos, reward_fn, log_deals)
+        self.num_envs = num_envs
+        self.auto_reset = auto_reset
+        self.portfolio_info_size = 2 * self.n
+        self.input_size = self.market_info_size + self.portfolio_info_size
+
+    def get_action_orders(self, action):
+        """
+        返回: sell_prices, sell_pcts, buy_prices, buy_pcts, shape (num_envs, n)
+        """
+        raise NotImplementedError
+
+    def get_random_action(self):
+        return np.random.uniform(-1, 1, (self.num_envs, self.action_space))
+
+    def get_init_portfolio_obs(self):
+        return np.zeros((self.num_envs, self.look_back_days,
+                         self.portfolio_info_size))
+
+    def obs_buffer_shape(self):
+        """
+        与 BaseEnv 相同, 缓冲区增加 num_envs 维
+        """
+        return (self.num_envs, 2 * self.look_back_days, self.input_size)
+
+    def append_obs(self, daily_returns, value_percents):
+        """
+        写入当天的市场信息和各股票的 (daily_return, value_percent)
+        """
+        row = self.next_obs_row()
+        size = self.market_info_size
+        row[:, :size] = self.get_market_info(self.current_date)
+        row[:, size::2] = daily_returns
+        row[:, size + 1::2] = value_percents
+        return self.get_obs_window()
+
+    def reset(self, infer=False):
+        # lazy 模式下, 只加载使用的前 n 支股票
+        self.market.ensure_codes(self.codes[:self.n])
+        self.current_time_id = self._init_current_time_id(infer)
+        self.current_date = self.dates[self.current_time_id]
+        self.done = False
+        self.reward = np.zeros(self.num_envs)
+        self.rewards = np.zeros((self.num_envs, self.n))
+        self.info = {}
+        self.portfolio_value = np.full(self.num_envs, float(self.investment))
+        self.starting_cash = self.investment
+        self.cash = np.full(self.num_envs, float(self.investment))
+        self.pre_cash = self.cash.copy()
+        self.total_pnl = np.zeros(self.num_envs)
+        self.book = PortfolioBook(self.num_envs, self.n)
+        self.obs = self.get_init_obs(infer)
+        self.portfolio_value_logs = []
+        return self.obs
+
+    def fill_orders(self, check, bid_prices, target_pcts, volumes,
+                    cash_change):
+        """
+        按 check(sell_check_batch/buy_check_batch) 的结果, 所有账户的所有股票
+        一次下单, 与逐个股票下单的结果相同: 同一账户中后面的股票受前面成交后剩余
+        资金的限制, 见 PortfolioBook.order_target_percents
+        """
+        # 只检查 market 中的前 n 支股票
+        oks, prices = check(self.current_date, bid_prices)
+        # 按最高/最低价成交, 见 PortfolioBook.round_fee
+        py_rounding = oks & (prices != bid_prices)
+        changes, volumes[...] = self.book.order_target_percents(
+            None, target_pcts, prices, self.portfolio_value, self.cash,
+            oks=oks, py_rounding=py_rounding)
+        # 按股票的顺序逐个累加, 与逐个下单的结果相同
+        for total in (self.cash, cash_change):
+            total[...] = np.cumsum(
+                np.concatenate((total[:, None], changes), axis=1),
+                axis=1)[:, -1]
+
+    def do_action(self, action, pre_portfolio_value, only_update):
+        date_id = self.market.date_index[self.current_date]
+        pre_date_id = self.market.get_date_id(self.current_date, before=True)
+        # 更新拆分信息
+        adj_factors = self.market.adj_factors
+        self.book.update_before_trade(adj_factors[date_id, :self.n] /
+                                      adj_factors[pre_date_id, :self.n])
+        cash_change = np.zeros(self.num_envs)
+        shape = (self.num_envs, self.n)
+        self.sell_volumes = np.zeros(shape, dtype=np.int64)
+        self.buy_volumes = np.zeros(shape, dtype=np.int64)
+        if only_update:
+            sell_prices, buy_prices = np.zeros(shape), np.zeros(shape)
+        else:
+            sell_prices, sell_pcts, buy_prices, buy_pcts = \
+                self.get_action_orders(action)
+            # 先卖, 再买
+            self.fill_orders(self.market.sell_check_batch, sell_prices,
+                             np.broadcast_to(sell_pcts, shape),
+                             self.sell_volumes, cash_change)
+            self.fill_orders(self.market.buy_check_batch, buy_prices,
+                             np.broadcast_to(buy_pcts, shape),
+                             self.buy_volumes, cash_change)
+        self.book.update_after_trade(
+            close_prices=self.market.closes[date_id, :self.n],
+            cash_change=cash_change,
+            pre_portfolio_value=pre_portfolio_value)
+        return sell_prices, buy_prices
+
+    def update_portfolio(self):
+        pre_portfolio_value = self.portfolio_value
+        book = self.book
+        self.market_value = book.market_value.sum(axis=1)
+        self.daily_pnl = book.daily_pnl.sum(axis=1)
+        self.pnl = book.pnl.sum(axis=1)
+        self.transaction_cost = book.transaction_cost.sum(axis=1)
+        self.all_transaction_cost = book.all_transaction_cost.sum(axis=1)
+        self.total_pnl += self.pnl
+        # 当日收益率 更新
+        self.daily_return = np.where(
+            pre_portfolio_value == 0, 0.0,
+            self.daily_pnl / np.where(pre_portfolio_value == 0, 1,
+                                      pre_portfolio_value))
+        self.portfolio_value = self.market_value + self.cash
+        self.portfolio_value_logs.append(self.portfolio_value)
+
+    def update_value_percent(self):
+        self.value_percent = np.where(
+            self.portfolio_value == 0, 0.0,
+            self.market_value / np.where(self.portfolio_value == 0, 1,
+                                         self.portfolio_value))
+        self.book.update_value_percent(self.portfolio_value)
+
+    def update_reward(self, sell_prices, buy_prices):
+        highs, lows, closes = self.get_hlc_prices()
+        reward = self.reward_fn(self.daily_return, highs, lows, closes,
+                                sell_prices, buy_prices)
+        self.reward = np.broadcast_to(np.asarray(reward, dtype=float),
+                                      (self.num_envs,)).copy()
+        # 每一只股的reward与总的reward一致
+        self.rewards = np.repeat(self.reward[:, None], self.n, axis=1)
+
+    def _next(self):
+        obs = self.append_obs(self.book.daily_return, self.book.value_percent)
+        if not self.done:
+            self.current_time_id += 1
+            self.current_date = self.dates[self.current_time_id]
+        self.pre_cash = self.cash.copy()
+        return obs
+
+    def step(self, action, only_update=False):
+        """
+        action: shape (num_envs, action_space)
+        返回: obs, reward, done, info, rewards
+        """
+        action = np.asarray(action, dtype=float).reshape(
+            self.num_envs, self.action_space)
+        self.action = action
+        # 到最后一天
+        if self.current_date == self.dates[-1]:
+            self.done = True
+        pre_portfolio_value = self.portfolio_value
+        sell_prices, buy_prices = self.do_action(action,
+                                                 pre_portfolio_value,
+                                                 only_update)
+        self.update_portfolio()
+        self.update_value_percent()
+        self.update_reward(sell_prices, buy_prices)
+        self.obs = self._next()
+        self.info = {
+            "current_date": self.current_date,
+            "portfolio_value": np.round(
+                self.portfolio_value / self.investment, 3),
+            "daily_pnl": np.round(self.daily_pnl, 1),
+            "reward": self.reward,
+            "sell_volumes": self.sell_volumes,
+            "buy_volumes": self.buy_volumes}
+        info, done = self.info, np.full(self.num_envs, self.done)
+        reward, rewards = self.reward, self.rewards
+        if self.done and self.auto_reset:
+            info["final_obs"] = self.obs
+            self.reset()
+        return self.obs, reward, done, info, rewards
+
+
+class SimpleVectorEnv(VectorEnv):
+    """
+    num_envs 个 SimpleEnv: action: [scaled_sell_price, scaled_buy_price]
+    """
+
+    def __init__(self, market=None, num_envs=1, investment=100000.0,
+                 look_back_days=10,
+                 used_infos=["equities_hfq_info", "indexs_info"],
+                 reward_fn="daily_return_add_price_bound", log_deals=False,
+                 auto_reset=False):
+        super(SimpleVectorEnv, self).__init__(
+            market, num_envs, investment, look_back_days, used_infos,
+            reward_fn, log_deals, auto_reset)
+        # 只使用第一支股票
+        self.n = 1
+        self.codes = market.codes[:1]
+        self.action_space = 2
+        self.portfolio_info_size = 2
+        self.input_size = self.market_info_size + self.portfolio_info_size
+
+    def get_action_orders(self, action):
+        # 全仓卖出, 全仓买进
+        sell_prices = self.get_action_prices(action[:, :1])
+        buy_prices = self.get_action_prices(action[:, 1:])
+        return sell_prices, 0.0, buy_prices, 1.0
+
+    def get_buy_close_action(self, datestr):
+        """
+        与 SimpleEnv.get_buy_close_action 相同, shape (num_envs, 2)
+        """
+        date_id = self.market.date_index[datestr]
+        buy_act_v = self.scale_pct_to_action_value(
+            self.market.pct_chgs[date_id, 0])
+        return np.tile([0, buy_act_v], (self.num_envs, 1))
+
+
+class AverageVectorEnv(VectorEnv):
+    """
+    num_envs 个 AverageEnv: action: [scaled_sell_price, scaled_buy_price]*n
+    """
+
+    def __init__(self, market=None, num_envs=1, investment=100000.0,
+                 look_back_days=10,
+                 used_infos=["equities_hfq_info", "indexs_info"],
+                 reward_fn="daily_return_add_price_bound", log_deals=False,
+                 auto_reset=False):
+        super(AverageVectorEnv, self).__init__(
+            market, num_envs, investment, look_back_days, used_infos,
+            reward_fn, log_deals, auto_reset)
+        self.avg_percent = 1.0 / self.n
+        self.action_space = 2 * self.n
+
+    def get_action_orders(self, action):
+        action = action.reshape(self.num_envs, self.n, 2)
+        # 全部卖出, 再平均分仓买进
+        sell_prices = self.get_action_prices(action[:, :, 0])
+        buy_prices = self.get_action_prices(action[:, :, 1])
+        return sell_prices, 0.0, buy_prices, self.avg_percent
+
+    def get_buy_close_action(self, datestr):
+        """
+        与 AverageEnv.get_buy_close_action 相同, shape (num_envs, 2 * n)
+        """
+        date_id = self.market.date_index[datestr]
+        action = np.zeros((self.n, 2))
+        action[:, 1] = self.scale_pct_to_action_value(
+            self.market.pct_chgs[date_id, :self.n])
+        return np.tile(action.reshape(-1), (self.num_envs, 1))
+
+
+class MultiVolVectorEnv(VectorEnv):
+    """
+    num_envs 个 MultiVolEnv: action: [scaled_sell_price, scaled_sell_percent,
+    scaled_buy_price, scaled_buy_percent]*n
+    """
+
+    def __init__(self, market=None, num_envs=1, investment=100000.0,
+                 look_back_days=10,
+                 used_infos=["equities_hfq_info", "indexs_info"],
+                 reward_fn="daily_return_add_price_bound", log_deals=False,
+                 auto_reset=False):
+        super(MultiVolVectorEnv, self).__init__(
+            market, num_envs, investment, look_back_days, used_infos,
+            reward_fn, log_deals, auto_reset)
+        self.action_space = 4 * self.n
+
+    def get_action_target_pct(self, v_vol):
+        # scale [-1, 1] to [0, 1]
+        return v_vol * 0.5 + 0.5
+
+    def get_action_orders(self, action):
+        action = action.reshape(self.num_envs, self.n, 4)
+        sell_prices = self.get_action_prices(action[:, :, 0])
+        sell_pcts = self.get_action_target_pct(action[:, :, 1])
+        buy_prices = self.get_action_prices(action[:, :, 2])
+        buy_pcts = self.get_action_target_pct(action[:, :, 3])
+        return sell_prices, sell_pcts, buy_prices, buy_pcts
+
+    def get_buy_close_action(self, datestr):
+        """
+        与 MultiVolEnv.get_buy_close_action 相同, shape (num_envs, 4 * n)
+        """
+        date_id = self.market.date_index[datestr]
+        action = np.zeros((self.n, 4))
+        # -1: 表示卖出量为0
+        action[:, 1] = -1
+        action[:, 2] = self.scale_pct_to_action_value(
+            self.market.pct_chgs[date_id, :self.n])
+        # 均匀分仓
+        action[:, 3] = (1.0 / self.n) * 2.0 - 1.0
+        return np.tile(action.reshape(-1), (self.num_envs, 1))
@@ -0,0 +1,117 @@
+# -*- coding:utf-8 -*-
+
+import logging
+import os
+import unittest
+
+import numpy as np
+from tenvs.data.synthetic import SyntheticMarket
+from tenvs.market import Market
+from tenvs.scenario import make_env, make_vector_env
+
+logging.root.setLevel(logging.ERROR)
+
+
+class TestVectorEnv(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        # NOTE: 需要在环境变量中设置 TUSHARE_TOKEN
+        ts_token = os.getenv("TUSHARE_TOKEN")
+        self.m = Market(
+            ts_token=ts_token,
+            start="20190101",
+            end="20200101",
+            codes=["000001.SZ", "000002.SZ"],
+            indexs=[],
+            data_dir="/tmp/tenvs")
+        self.investment = 100000.0
+        self.look_back_days = 10
+        self.used_infos = ["equities_hfq_info", "indexs_info"]
+
+    def check_same_as_env(self, scenario, reward_fn, num_envs=3):
+        # 每个环境的结果与单独运行的环境一致
+        envs = [make_env(scenario, self.m, self.investment,
+                         self.look_back_days, self.used_infos, reward_fn,
+                         False) for _ in range(num_envs)]
+        vec_env = make_vector_env(scenario, self.m, num_envs,
+                                  self.investment, self.look_back_days,
+                                  self.used_infos, reward_fn)
+        obs = vec_env.reset()
+        self.assertEqual((num_envs, self.look_back_days,
+                          vec_env.input_size), obs.shape)
+        self.assertTrue(np.array_equal(
+            np.stack([env.reset() for env in envs]), obs))
+        action = vec_env.get_buy_close_action(vec_env.current_date)
+        rng = np.random.RandomState(0)
+        done = False
+        while not done:
+            outs = [env.step(list(action[i])) for i, env in enumerate(envs)]
+            obs, reward, dones, info, _ = vec_env.step(action)
+            done = outs[0][2]
+            self.assertEqual([done] * num_envs, dones.tolist())
+            # NOTE: 交易费使用 np.round, 可能有几分钱的差别
+            self.assertTrue(np.allclose(
+                [env.portfolio_value for env in envs],
+                vec_env.portfolio_value, atol=1.0))
+            self.assertTrue(np.allclose([out[0] for out in outs], obs,
+                                        atol=1e-4))
+            self.assertTrue(np.allclose([out[1] for out in outs], reward,
+                                        atol=1e-3))
+            action = rng.uniform(-1, 1, (num_envs, vec_env.action_space))
+
+    def test_simple(self):
+        self.check_same_as_env("simple", "simple")
+
+    def test_average(self):
+        self.check_same_as_env("average", "daily_return_add_price_bound")
+
+    def test_multi_vol(self):
+        self.check_same_as_env("multi_vol", "daily_return_with_chl_penalty")
+
+    def test_auto_reset(self):
+        vec_env = make_vector_env("average", self.m, 2, self.investment,
+                                  self.look_back_days, self.used_infos,
+                                  "simple", auto_reset=True)
+        vec_env.reset()
+        dones = np.zeros(2, dtype=bool)
+        while not dones.any():
+            obs, reward, dones, info, _ = vec_env.step(
+                vec_env.get_random_action())
+        self.assertIn("final_obs", info)
+        self.assertEqual(self.look_back_days, vec_env.current_time_id)
+        self.assertTrue(np.array_equal(
+            vec_env.cash, [self.investment] * 2))
+
+
+class TestVectorObs(unittest.TestCase):
+    def test_obs_buffer(self):
+        # 合成数据, 不需要 TUSHARE_TOKEN
+        # 缓冲区的大小与回合长度无关, 已返回的 obs 不会被修改
+        m = SyntheticMarket(seed=1, start="20190101", end="20190601",
+                            codes=["000001.SZ", "000002.SZ"], indexs=[])
+        env = make_vector_env("average", m, 3, 100000.0, 5,
+                              ["equities_hfq_info"], "simple",
+                              auto_reset=True)
+        obs_list = [env.reset()]
+        copies = [obs_list[0].copy()]
+        done = np.zeros(3, dtype=bool)
+        while not done.any():
+            obs, _, done, info, _ = env.step(env.get_random_action())
+            self.assertEqual((3, 10, env.input_size), env.obs_buffer.shape)
+            obs_list.append(obs)
+            copies.append(obs.copy())
+        # 自动 reset 后继续 step, 结束时的 obs 不变
+        final_obs, final_copy = info["final_obs"], info["final_obs"].copy()
+        for _ in range(20):
+            env.step(env.get_random_action())
+        np.testing.assert_array_equal(final_copy, final_obs)
+        for obs, copy in zip(obs_list, copies):
+            np.testing.assert_array_equal(copy, obs)
+        # 所有环境的市场信息相同
+        size = env.market_info_size
+        np.testing.assert_array_equal(copies[-1][0, :, :size],
+                                      copies[-1][2, :, :size])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,33 @@
 # -*- coding:utf-8 -*-
+import bisect
 import os
+import threading
 
+import numpy as np
 import pandas as pd
-import tushare as ts
 
 from tenvs.common.logger import logger
+from tenvs.data.cache import CACHE_FORMATS, HistoryStore
+from tenvs.data.downloader import Downloader
+from tenvs.data.provider import TushareProvider
+from tenvs.data.shared import (SNAPSHOT_VERSION, load_arrays, pack_frames,
+                               save_arrays, snapshot_key, unpack_frames)
+
+
+class LazyHistory(dict):
+    """
+    lazy 模式下的 codes_history, 访问尚未加载的 code 时调用 load([code])
+    """
+
+    def __init__(self, load):
+        super().__init__()
+        self.load = load
+
+    def __missing__(self, code):
+        self.load([code])
+        if code not in self:
+            raise KeyError(code)
+        return dict.__getitem__(self, code)
 
 
 class Market:
@@ -18,7 +41,22 @@ class Market:
         399001.SZ: 深证成指
         ...
     NOTE(wen): 使用tushare下载指数日线信息需要在tushare.pro帐户中有200积分
+    provider: 数据源, 见 tenvs.data.provider, 默认 TushareProvider(ts_token)
+        离线/可复现: RecordingProvider(TushareProvider(ts_token), path),
+        LocalFileProvider(root), tenvs.data.synthetic.SyntheticData(seed)
     data_dir: 存储数据文件的目录，以降低重复下载的频率
+        每个标的的数据保存在 <data_dir>/<code>/ 中, 只下载未缓存过的日期区间
+    cache_format: 缓存格式, npz(默认, 二进制) 或 csv
+    downloader: 没有缓存时用于并发, 限流下载的 Downloader, 默认 Downloader()
+    lazy: 为True时, 初始化只加载交易日历和指数, 个股数据在第一次访问时加载,
+        也可以调用 materialize() 一次加载全部
+    prefetch: lazy 模式下, 在后台线程中预先加载个股数据
+    snapshot: 保存处理好的数据, 之后直接加载, 不需要重新读取和计算
+        market.save_snapshot(path)
+        market = Market.load_snapshot(path), 只读, memory-mapped
+    多进程共享:
+        主进程: market.dump_shared(path)
+        其他进程: market = Market.attach(path), 只读, 零拷贝
     """
 
     def __init__(self,
@@ -27,14 +65,34 @@ class Market:
                  end="20200101",
                  codes=["000001.SZ"],
                  indexs=["000001.SH", "399001.SZ"],
-                 data_dir="/tmp/tenvs"):
-        ts.set_token(ts_token)
+                 data_dir="/tmp/tenvs",
+                 cache_format="npz",
+                 downloader=None,
+                 lazy=False,
+                 prefetch=False,
+                 provider=None):
+        if provider is None:
+            provider = TushareProvider(ts_token)
+        self.provider = provider
         self.start = start
         self.end = end
         self.codes = codes
         self.indexs = indexs
         self.data_dir = data_dir
-        self.load_codes_history()
+        if cache_format not in CACHE_FORMATS:
+            raise ValueError("Unknown cache format: %s" % cache_format)
+        self.cache_format = cache_format
+        if downloader is None:
+            downloader = Downloader()
+        self.downloader = downloader
+        # lazy 模式下尚未加载的个股
+        self.pending_codes = set()
+        self.lock = threading.RLock()
+        if lazy:
+            self.codes_history = LazyHistory(self.ensure_codes)
+            self.pending_codes = set(self.codes)
+        else:
+            self.load_codes_history()
         self.load_indexs_history()
         # hfq数据: 去除不复权数据(9列) 和复权因子(1列): 10, 从第11列开始是后复权数据
         self.equity_hfq_info_start_index = 10
@@ -44,10 +102,51 @@ class Market:
         # NOTE(wen): 如果涨跌幅超过 top_pct_change则认为到达涨跌停的状态
         # TODO: 准确的涨跌停判断方式
         self.top_pct_change = 9.7
+        self.prefetch_thread = None
+        if prefetch and self.pending_codes:
+            self.prefetch_thread = threading.Thread(
+                target=self.prefetch, name="market-prefetch", daemon=True)
+            self.prefetch_thread.start()
+
+    def ensure_codes(self, codes=None):
+        """
+        加载 codes(默认全部)中尚未加载的个股数据, 并填充其在 market_info 中的列
+        """
+        if not self.pending_codes:
+            return
+        with self.lock:
+            codes = [code for code in (self.codes if codes is None else codes)
+                     if code in self.pending_codes]
+            if len(codes) == 0:
+                return
+            history = self.load_history(
+                codes, self.data_dir, self.download_code_history,
+                name="download codes")
+            for code in codes:
+                self.codes_history[code] = history[code]
+                self.init_code_info(self.code_index[code], code)
+                self.pending_codes.discard(code)
+
+    def materialize(self):
+        """
+        加载全部个股数据, 可以重复调用
+        """
+        self.ensure_codes()
+        return self
+
+    def prefetch(self):
+        # 分批加载, 避免长时间持有锁, 阻塞按需加载
+        batch = max(1, self.downloader.workers)
+        codes = list(self.codes)
+        try:
+            for i in range(0, len(codes), batch):
+                self.ensure_codes(codes[i: i + batch])
+        except Exception as e:
+            # 出错的个股在访问时会重新加载
+            logger.warning("prefetch failed: %s" % e)
 
     def get_info_size(self, info_name):
-        date = self.open_dates[0]
-        return len(self.market_info[date][info_name])
+        return int(np.prod(self.market_info[info_name].shape[1:]))
 
     def init_size_info(self):
         """
@@ -56,10 +155,10 @@ class Market:
         self.equity_hfq_info_size = self.get_info_size("equities_hfq_info")
         self.indexs_info_size = self.get_info_size("indexs_info")
 
-    def get_code_history(self, code, adj=None):
-        return ts.pro_bar(
+    def get_code_history(self, code, adj=None, start=None, end=None):
+        return self.provider.pro_bar(
             ts_code=code, adj=adj,
-            start_date=self.start, end_date=self.end)
+            start_date=start or self.start, end_date=end or self.end)
 
     def load_codes_history(self):
         """
@@ -76,165 +175,297 @@ class Market:
         u'pct_chg_hfq', u'vol_hfq', u'amount_hfq']
         """
 
-        self.codes_history = {}
-        for code in self.codes:
-            dir = os.path.join(self.data_dir, code)
-            if not os.path.exists(dir):
-                try:
-                    os.makedirs(dir)
-                except OSError:
-                    pass
-            data_path = os.path.join(dir,
-                                     self.start + "-" + self.end + ".csv")
-            if os.path.exists(data_path):
-                df = pd.read_csv(data_path)
-                df = df.set_index("trade_date")
-                df.index = df.index.astype(str, copy=False)
-                self.codes_history[code] = df
-
-            else:
-                # 不复权
-                df_bfq = self.get_code_history(code, adj=None)
-                df_bfq = df_bfq.drop(columns=["ts_code"], axis=1)
-                # 后复权
-                df_hfq = self.get_code_history(code, adj="hfq")
-                df_hfq = df_hfq.drop(columns=["ts_code"], axis=1)
-                df = pd.merge(df_bfq, df_hfq,
-                              on='trade_date', how='left',
-                              suffixes=('', '_hfq'))
-                # 拆分因子
-                col_name = df.columns.tolist()
-                col_name.insert(0, 'adj_factor')
-                df = df.reindex(columns=col_name)
-                df["adj_factor"] = df["close_hfq"] / df["close"]
-                df = df.sort_values(by="trade_date", ascending=True)
-                df = df.set_index("trade_date")
-                df.index = df.index.astype(str, copy=False)
-                df.to_csv(data_path)
-                self.codes_history[code] = df
+        self.codes_history = self.load_history(
+            self.codes, self.data_dir, self.download_code_history,
+            name="download codes")
+
+    def load_history(self, codes, data_dir, download, name="download"):
+        """
+        读取codes在[self.start, self.end]的数据, 并发下载缺失的日期区间
+        download(code, start, end): 下载一个区间的数据
+        """
+        stores = {}
+        for code in codes:
+            stores[code] = HistoryStore(os.path.join(data_dir, code),
+                                        self.cache_format)
+
+        def update(code):
+            store = stores[code]
+            for start, end in store.missing_ranges(self.start, self.end):
+                store.update(download(code, start, end), start, end)
+
+        missing = [code for code in stores
+                   if len(stores[code].missing_ranges(self.start,
+                                                      self.end)) > 0]
+        self.downloader.map(update, missing, name=name)
+        return {code: stores[code].get(self.start, self.end)
+                for code in codes}
+
+    def download_code_history(self, code, start, end):
+        # 不复权
+        df_bfq = self.downloader.call(self.get_code_history, code,
+                                      adj=None, start=start, end=end)
+        df_bfq = df_bfq.drop(columns=["ts_code"])
+        # 后复权
+        df_hfq = self.downloader.call(self.get_code_history, code,
+                                      adj="hfq", start=start, end=end)
+        df_hfq = df_hfq.drop(columns=["ts_code"])
+        df = pd.merge(df_bfq, df_hfq,
+                      on='trade_date', how='left',
+                      suffixes=('', '_hfq'))
+        # 拆分因子
+        col_name = df.columns.tolist()
+        col_name.insert(0, 'adj_factor')
+        df = df.reindex(columns=col_name)
+        df["adj_factor"] = df["close_hfq"] / df["close"]
+        df = df.sort_values(by="trade_date", ascending=True)
+        df = df.set_index("trade_date")
+        df.index = df.index.astype(str, copy=False)
+        return df
 
     def load_indexs_history(self):
-        self.indexs_history = {}
         # 默认加载: 000001.SH(上证指数), 399001.SZ(深城证指)
         indexs = ["000001.SH", "399001.SZ"]
         for code in self.indexs:
             if code not in indexs:
                 indexs.append(code)
 
-        for code in indexs:
-            dir = os.path.join(self.data_dir, "indexs", code)
-            if not os.path.exists(dir):
-                os.makedirs(dir)
-            data_path = os.path.join(dir,
-                                     self.start + "-" + self.end + ".csv")
-            if os.path.exists(data_path):
-                df = pd.read_csv(data_path)
-                df = df.set_index("trade_date")
-                df.index = df.index.astype(str, copy=False)
-                self.indexs_history[code] = df
-            else:
-                pro = ts.pro_api()
-                df = pro.index_daily(ts_code=code,
-                                     start_date=self.start,
-                                     end_date=self.end)
-                df = df.drop(columns=["ts_code"], axis=1)
-                df = df.sort_values(by="trade_date", ascending=True)
-                df = df.set_index("trade_date")
-                df.index = df.index.astype(str, copy=False)
-                df.to_csv(data_path)
-                self.indexs_history[code] = df
-
-    def set_pre_info(self):
-        date = self.open_dates[0]
-        self.equities_pre_hfq_info = {}
-        self.equities_pre_bfq_info = {}
-        for code in self.codes:
-            # 如果第一天就停牌，这里会出错，建议另外选择一天开始回测
-            try:
-                data = self.codes_history[code].loc[date].tolist()
-                bfq_data = data[1: self.equity_hfq_info_start_index]
-                # 开盘时， open=1
-                bfq_data.append(1)
-                self.equities_pre_bfq_info[code] = bfq_data
-                # 后复权
-                hfq_data = data[self.equity_hfq_info_start_index:]
-                # 开盘时， open=1
-                hfq_data.append(1)
-                self.equities_pre_hfq_info[code] = hfq_data
-            except Exception as e:
-                print("%s, %s停牌，建议另外选择一天开始回测" % (code, date))
-                print(e)
-                exit()
-
-    def get_equities_bfq_info(self, date):
-        info = []
-        for code in self.codes:
-            data = None
-            if date in self.codes_history[code].index:
-                data = self.codes_history[code].loc[date].tolist()
-                data = data[1: self.equity_hfq_info_start_index]
-                # 开盘时， open=1
-                data.append(1)
-            else:
-                # 如果停牌则使用前一开盘日信息
-                data = self.equities_pre_bfq_info[code]
-                data[-1] = 0
-            # 更新前一开盘日信息
-            self.equities_pre_bfq_info[code] = data
-            info.extend(data)
-        return info
-
-    def get_equities_hfq_info(self, date):
-        info = []
-        for code in self.codes:
-            data = None
-            if date in self.codes_history[code].index:
-                data = self.codes_history[code].loc[date].tolist()
-                data = data[self.equity_hfq_info_start_index:]
-                # 开盘时， open=1
-                data.append(1)
-            else:
-                # 如果停牌则使用前一开盘日信息
-                data = self.equities_pre_hfq_info[code]
-                data[-1] = 0
-            # 更新前一开盘日信息
-            self.equities_pre_hfq_info[code] = data
-            info.extend(data)
-        return info
-
-    def get_indexs_info(self, date):
-        info = []
-        for code in self.indexs:
-            data = self.indexs_history[code].loc[date].tolist()
-            info.extend(data)
-        return info
+        self.indexs_history = self.load_history(
+            indexs, os.path.join(self.data_dir, "indexs"),
+            self.download_index_history, name="download indexs")
+
+    def get_index_history(self, code, start=None, end=None):
+        return self.provider.index_daily(ts_code=code,
+                                         start_date=start or self.start,
+                                         end_date=end or self.end)
+
+    def download_index_history(self, code, start, end):
+        df = self.downloader.call(self.get_index_history, code,
+                                  start=start, end=end)
+        df = df.drop(columns=["ts_code"])
+        df = df.sort_values(by="trade_date", ascending=True)
+        df = df.set_index("trade_date")
+        df.index = df.index.astype(str, copy=False)
+        return df
 
     def init_market_info(self):
         """
-        以日期为key, 将市场相关信息组织在一个dict中:
-            equities_hfq_info: 合并之后的个股信息, 如果某支股停牌，则使用它前一开盘日信息
-            indexs_info: 合并之后指数信息
+        将市场相关信息组织在一个连续的 numpy 矩阵 self.market_data 中,
+        shape: (n_dates, info_size), 按info_name分段, 各段的 view 保存在
+        self.market_info 中:
+            equities_bfq_info: (n_dates, n_codes, 10), 个股不复权信息 + 开盘标志
+            equities_hfq_info: (n_dates, n_codes, 10), 个股后复权信息 + 开盘标志
+            indexs_info: (n_dates, n_indexs, 9), 指数信息
+        如果某支股停牌，则使用它前一开盘日信息, 开盘标志为0
+        self.date_index: 日期 => 行号
         Note(wen): 添加其他市场相关信息，都放在这里
         """
         self.open_dates = self.indexs_history["000001.SH"].index.tolist()
         self.open_dates.sort()
-        self.set_pre_info()
+        self.date_index = {date: i for i, date in enumerate(self.open_dates)}
+        # 不复权数据(9列) + 开盘标志(1列)
+        equity_size = self.equity_hfq_info_start_index
+        index_size = self.indexs_history["000001.SH"].shape[1]
+        shapes = [("equities_bfq_info", len(self.codes), equity_size),
+                  ("equities_hfq_info", len(self.codes), equity_size),
+                  ("indexs_info", len(self.indexs), index_size)]
+        # info_name => [起始列, 结束列, 个数, 每个的信息长度]
+        self.market_info_sections = {}
+        size = 0
+        for name, n, info_size in shapes:
+            self.market_info_sections[name] = [size, size + n * info_size,
+                                               n, info_size]
+            size += n * info_size
+        self.market_data = np.zeros((len(self.open_dates), size))
+        self.init_market_info_views()
+        self.init_price_info()
+        for i, code in enumerate(self.codes):
+            if code not in self.pending_codes:
+                self.init_code_info(i, code)
+        for i, code in enumerate(self.indexs):
+            self.market_info["indexs_info"][:, i, :] = \
+                self.indexs_history[code].reindex(self.open_dates).to_numpy(
+                    dtype=float)
+
+    def init_price_info(self):
+        """
+        以 [date_id, code_id] 索引的价格信息, shape: (n_dates, n_codes)
+        停牌日使用前一开盘日的值:
+            closes: 收盘价
+            pre_closes: 前一收盘价
+            adj_factors: 复权因子
+            opens, highs, lows, pct_chgs: 开盘价, 最高价, 最低价, 涨跌幅
+        trading: 是否开盘, 停牌为False
+        """
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        shape = (len(self.open_dates), len(self.codes))
+        for name in self.price_arrays:
+            setattr(self, name, np.zeros(shape))
+        self.trading = np.zeros(shape, dtype=bool)
+        # 第一次调用 get_hlc_prices 时计算
+        self.hlc = None
+
+    def init_market_info_views(self):
         self.market_info = {}
-        for date in self.open_dates:
-            self.market_info[date] = {}
-            self.market_info[date]["equities_bfq_info"] = \
-                self.get_equities_bfq_info(date)
-            self.market_info[date]["equities_hfq_info"] = \
-                self.get_equities_hfq_info(date)
-            self.market_info[date]["indexs_info"] = self.get_indexs_info(date)
+        n_dates = len(self.open_dates)
+        for name, section in self.market_info_sections.items():
+            [start, end, n, info_size] = section
+            self.market_info[name] = self.market_data[:, start: end].reshape(
+                n_dates, n, info_size)
+
+    def init_code_info(self, i, code):
+        """
+        填充第i支股票在 market_info 中的数据
+        """
+        df = self.codes_history[code]
+        trading = pd.Index(self.open_dates).isin(df.index)
+        # 如果第一天就停牌，无法填充停牌日的数据，建议另外选择一天开始回测
+        if not trading[0]:
+            raise ValueError("%s, %s停牌，建议另外选择一天开始回测" % (
+                code, self.open_dates[0]))
+        # 停牌日使用前一开盘日的数据
+        rows = np.where(trading, np.arange(len(trading)), 0)
+        rows = np.maximum.accumulate(rows)
+        data = df.reindex(self.open_dates).to_numpy(dtype=float)[rows]
+        start = self.equity_hfq_info_start_index
+        bfq = self.market_info["equities_bfq_info"]
+        bfq[:, i, :-1] = data[:, 1: start]
+        # 开盘时， open=1, 停牌时, open=0
+        bfq[:, i, -1] = trading
+        hfq = self.market_info["equities_hfq_info"]
+        hfq[:, i, :-1] = data[:, start:]
+        hfq[:, i, -1] = trading
+        for name, column in self.price_arrays.items():
+            getattr(self, name)[:, i] = data[:, df.columns.get_loc(column)]
+        self.trading[:, i] = trading
+
+    def get_market_obs(self, info_names):
+        """
+        将info_names对应的信息按顺序拼接, 返回 shape: (n_dates, info_size)
+        第 self.date_index[date] 行即为date当天的市场信息
+        NOTE: info_names 在 self.market_data 中相邻时, 返回的是 view, 不复制数据
+        NOTE(wen): lazy 模式下, 只有 info_names 包含个股信息(code_infos)时
+            才需要加载全部个股
+        """
+        if any(name in self.code_infos for name in info_names):
+            self.ensure_codes()
+        sections = [self.market_info_sections[name] for name in info_names]
+        adjacent = all(pre[1] == cur[0]
+                       for pre, cur in zip(sections[:-1], sections[1:]))
+        if len(sections) > 0 and adjacent:
+            return self.market_data[:, sections[0][0]: sections[-1][1]]
+        infos = [self.market_info[name].reshape(len(self.open_dates), -1)
+                 for name in info_names]
+        return np.concatenate(infos, axis=1)
+
+    # 包含所有个股的信息
+    code_infos = ["equities_bfq_info", "equities_hfq_info"]
+    # init_price_info 初始化的数组 => codes_history 中对应的列
+    price_arrays = {"closes": "close", "pre_closes": "pre_close",
+                    "adj_factors": "adj_factor", "opens": "open",
+                    "highs": "high", "lows": "low", "pct_chgs": "pct_chg"}
+    # dump_shared/attach 时通过 meta.json 保存的属性
+    shared_attrs = ["start", "end", "codes", "indexs", "data_dir",
+                    "cache_format", "equity_hfq_info_start_index",
+                    "top_pct_change", "open_dates", "market_info_sections"]
+
+    def save_snapshot(self, path):
+        """
+        将处理好的Market数据写入path目录, Market.load_snapshot(path) 加载
+        """
+        self.materialize()
+        index_codes = list(self.indexs_history.keys())
+        codes_values, codes_dates, codes_offsets, codes_columns = \
+            pack_frames(self.codes_history, self.codes)
+        indexs_values, indexs_dates, indexs_offsets, indexs_columns = \
+            pack_frames(self.indexs_history, index_codes)
+        arrays = {
+            "market_data": self.market_data,
+            "codes_values": codes_values,
+            "codes_dates": codes_dates,
+            "codes_offsets": codes_offsets,
+            "indexs_values": indexs_values,
+            "indexs_dates": indexs_dates,
+            "indexs_offsets": indexs_offsets}
+        for name in self.price_arrays:
+            arrays[name] = getattr(self, name)
+        arrays["trading"] = self.trading
+        meta = {key: getattr(self, key) for key in self.shared_attrs}
+        meta["version"] = SNAPSHOT_VERSION
+        meta["key"] = snapshot_key(self.codes, self.indexs, self.start,
+                                   self.end)
+        meta["codes_columns"] = codes_columns
+        meta["index_codes"] = index_codes
+        meta["indexs_columns"] = indexs_columns
+        save_arrays(path, arrays, meta)
+
+    @classmethod
+    def load_snapshot(cls, path, codes=None, indexs=None, start=None,
+                      end=None, mmap_mode="r"):
+        """
+        加载 save_snapshot 写入的数据, 不下载, 不重新计算
+        codes, indexs, start, end: 不为None时, 检查 snapshot 是否与之对应
+        mmap_mode="r": 只读, memory-mapped, 不复制; None: 读入内存
+        """
+        arrays, meta = load_arrays(path, mmap_mode=mmap_mode)
+        if meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError("Snapshot version mismatch: %s, expected: %s" %
+                             (meta.get("version"), SNAPSHOT_VERSION))
+        requested = [meta[name] if value is None else value
+                     for name, value in [("codes", codes), ("indexs", indexs),
+                                         ("start", start), ("end", end)]]
+        if snapshot_key(*requested) != meta["key"]:
+            raise ValueError(
+                "Snapshot %s does not match, requested codes: %s, "
+                "indexs: %s, [%s, %s]; snapshot codes: %s, indexs: %s, "
+                "[%s, %s]" % (path, *requested, meta["codes"],
+                              meta["indexs"], meta["start"], meta["end"]))
+        market = cls.__new__(cls)
+        for key in cls.shared_attrs:
+            setattr(market, key, meta[key])
+        market.date_index = {
+            date: i for i, date in enumerate(market.open_dates)}
+        market.code_index = {code: i for i, code in enumerate(market.codes)}
+        market.pending_codes = set()
+        market.lock = threading.RLock()
+        market.prefetch_thread = None
+        for name in cls.price_arrays:
+            setattr(market, name, arrays[name])
+        market.trading = arrays["trading"]
+        market.hlc = None
+        market.market_data = arrays["market_data"]
+        market.init_market_info_views()
+        market.codes_history = unpack_frames(
+            arrays["codes_values"], arrays["codes_dates"],
+            arrays["codes_offsets"], meta["codes_columns"], market.codes)
+        market.indexs_history = unpack_frames(
+            arrays["indexs_values"], arrays["indexs_dates"],
+            arrays["indexs_offsets"], meta["indexs_columns"],
+            meta["index_codes"])
+        market.init_size_info()
+        return market
+
+    def dump_shared(self, path):
+        """
+        将Market数据写入path目录, 其他进程通过 Market.attach(path) 共享
+        """
+        self.save_snapshot(path)
+
+    @classmethod
+    def attach(cls, path):
+        """
+        以只读, memory-mapped 的方式加载 dump_shared 写入的数据, 不下载, 不复制
+        """
+        return cls.load_snapshot(path, mmap_mode="r")
 
     def is_suspended(self, code='', datestr=''):
         # 是否停牌，是：返回 True, 否：返回 False
-        if code not in self.codes_history:
+        self.ensure_codes((code,))
+        code_id = self.code_index.get(code)
+        date_id = self.date_index.get(datestr)
+        if code_id is None or date_id is None:
             return True
-        if datestr not in self.codes_history[code].index:
-            return True
-        return False
+        return not self.trading[date_id, code_id]
 
     def buy_check(self, code='', datestr='', bid_price=None):
         # 返回：OK, 成交价
@@ -243,8 +474,10 @@ class Market:
         if self.is_suspended(code, datestr):
             return ok, 0
         # 获取当天标的信息
-        [open, high, low, pct_change] = self.codes_history[code].loc[
-            datestr, ["open", "high", "low", "pct_chg"]]
+        date_id, code_id = self.date_index[datestr], self.code_index[code]
+        high = float(self.highs[date_id, code_id])
+        low = float(self.lows[date_id, code_id])
+        pct_change = float(self.pct_chgs[date_id, code_id])
         # 涨停封板, 无法买入
         if low == high and pct_change > self.top_pct_change:
             logger.debug(u"sell_check %s %s 涨停法买进" % (code, datestr))
@@ -263,8 +496,10 @@ class Market:
         if self.is_suspended(code, datestr):
             return ok, 0
         # 获取当天标的信息
-        [open, high, low, pct_change] = self.codes_history[code].loc[
-            datestr, ["open", "high", "low", "pct_chg"]]
+        date_id, code_id = self.date_index[datestr], self.code_index[code]
+        high = float(self.highs[date_id, code_id])
+        low = float(self.lows[date_id, code_id])
+        pct_change = float(self.pct_chgs[date_id, code_id])
         # 跌停封板， 不能卖出
         if low == high and pct_change < -self.top_pct_change:
             logger.debug(u"sell_check %s %s 跌停无法卖出" % (code, datestr))
@@ -278,34 +513,110 @@ class Market:
             ok = True
             return ok, max(bid_price, low)
 
+    def buy_check_batch(self, datestr, bid_prices):
+        """
+        所有股票的买入检查, 规则与 buy_check 相同
+        bid_prices.shape: (..., n), 前 n 支股票的出价, 可以同时检查多组出价
+        返回: oks(是否可以成交), prices(成交价, 不能成交时为0), shape同bid_prices
+        """
+        bid_prices = np.asarray(bid_prices, dtype=float)
+        n = bid_prices.shape[-1]
+        self.ensure_codes(self.codes[:n])
+        date_id = self.date_index.get(datestr)
+        if date_id is None:
+            return np.zeros(bid_prices.shape, dtype=bool), \
+                np.zeros(bid_prices.shape)
+        highs, lows = self.highs[date_id, :n], self.lows[date_id, :n]
+        # 涨停封板, 无法买入
+        limit_up = (lows == highs) & (
+            self.pct_chgs[date_id, :n] > self.top_pct_change)
+        # 买入竞价不低于最低价, 可以成交
+        oks = self.trading[date_id, :n] & ~limit_up & (bid_prices >= lows)
+        prices = np.where(oks, np.minimum(bid_prices, highs), 0.0)
+        return oks, prices
+
+    def sell_check_batch(self, datestr, bid_prices):
+        """
+        所有股票的卖出检查, 规则与 sell_check 相同
+        bid_prices.shape: (..., n), 前 n 支股票的出价, 可以同时检查多组出价
+        返回: oks(是否可以成交), prices(成交价, 不能成交时为0), shape同bid_prices
+        """
+        bid_prices = np.asarray(bid_prices, dtype=float)
+        n = bid_prices.shape[-1]
+        self.ensure_codes(self.codes[:n])
+        date_id = self.date_index.get(datestr)
+        if date_id is None:
+            return np.zeros(bid_prices.shape, dtype=bool), \
+                np.zeros(bid_prices.shape)
+        highs, lows = self.highs[date_id, :n], self.lows[date_id, :n]
+        # 跌停封板， 不能卖出
+        limit_down = (lows == highs) & (
+            self.pct_chgs[date_id, :n] < -self.top_pct_change)
+        # 卖出竞价不高于最高价, 可以成交
+        oks = self.trading[date_id, :n] & ~limit_down & (bid_prices <= highs)
+        prices = np.where(oks, np.maximum(bid_prices, lows), 0.0)
+        return oks, prices
+
+    def get_hlc_prices(self, datestr, n=None):
+        """
+        datestr 当天前 n(默认全部) 支股票的 highs, lows, closes, shape (n,)
+        停牌时为0
+        NOTE(wen): 前 n 支股票所有日期的值只计算一次, 返回的是 view, 不要修改
+        """
+        if n is None:
+            n = len(self.codes)
+        if self.hlc is None or self.hlc.shape[2] < n:
+            self.ensure_codes(self.codes[:n])
+            self.hlc = np.where(
+                self.trading[:, :n],
+                np.stack([self.highs[:, :n], self.lows[:, :n],
+                          self.closes[:, :n]]),
+                0.0)
+        highs, lows, closes = self.hlc[:, self.date_index[datestr], :n]
+        return highs, lows, closes
+
+    def get_date_id(self, datestr, before=False):
+        """
+        返回 <= datestr(before=True时: < datestr)的最后一个开市日的行号
+        """
+        date_id = self.date_index.get(datestr)
+        if date_id is not None:
+            date_id = date_id if before else date_id + 1
+        elif before:
+            date_id = bisect.bisect_left(self.open_dates, datestr)
+        else:
+            date_id = bisect.bisect_right(self.open_dates, datestr)
+        if date_id == 0:
+            raise IndexError("no open date before %s" % datestr)
+        return date_id - 1
+
+    def get_code_id(self, code):
+        # lazy 模式下, 先加载该个股的数据
+        if code in self.pending_codes:
+            self.ensure_codes((code,))
+        return self.code_index[code]
+
     def get_pre_close_price(self, code, datestr):
-        if datestr in self.codes_history[code].index:
-            return self.codes_history[code].loc[datestr]["pre_close"]
         # 如果当天停牌, 返回前一开市日的pre_close
-        df = self.codes_history[code]
-        df_ = df[df.index < datestr]
-        return df_.iloc[-1]["pre_close"]
+        return self.pre_closes[self.get_date_id(datestr),
+                               self.get_code_id(code)]
 
     def get_close_price(self, code, datestr):
-        if datestr in self.codes_history[code].index:
-            return self.codes_history[code].loc[datestr]["close"]
         # 如果当天停牌, 返回前一开市日收盘价
-        df = self.codes_history[code]
-        df_ = df[df.index < datestr]
-        return df_.iloc[-1]["close"]
+        return self.closes[self.get_date_id(datestr), self.get_code_id(code)]
 
     def get_pre_adj_factor(self, code, datestr):
-        df = self.codes_history[code]
-        df_ = df[df.index < datestr]
-        return df_.iloc[-1]["adj_factor"]
+        return self.adj_factors[self.get_date_id(datestr, before=True),
+                                self.get_code_id(code)]
 
     def get_adj_factor(self, code, datestr):
-        if self.is_suspended(code=code, datestr=datestr):
-            return self.get_pre_adj_factor(code, datestr)
-        else:
-            return self.codes_history[code].loc[datestr]["adj_factor"]
+        # 如果当天停牌, 返回前一开市日的复权因子
+        return self.adj_factors[self.get_date_id(datestr),
+                                self.get_code_id(code)]
 
     def get_divide_rate(self, code, datestr):
-        pre_adj_factor = self.get_pre_adj_factor(code, datestr)
-        current_adj_factor = self.get_adj_factor(code, datestr)
-        return current_adj_factor / pre_adj_factor
+        code_id = self.get_code_id(code)
+        date_id = self.get_date_id(datestr)
+        pre_date_id = self.get_date_id(datestr, before=True)
+        return self.adj_factors[date_id, code_id] / \
+            self.adj_factors[pre_date_id, code_id]
@@ -2,8 +2,12 @@
 
 import logging
 import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
+
 from tenvs.market import Market
 
 logging.root.setLevel(logging.ERROR)
@@ -36,6 +40,124 @@ class TestMarket(unittest.TestCase):
         self.assertEqual(10, self.m.equity_hfq_info_size)
         self.assertEqual(18, self.m.indexs_info_size)
 
+    def test_init_market_info(self):
+        n_dates = len(self.m.open_dates)
+        self.assertEqual((n_dates, 1, 10),
+                         self.m.market_info["equities_hfq_info"].shape)
+        self.assertEqual((n_dates, 1, 10),
+                         self.m.market_info["equities_bfq_info"].shape)
+        self.assertEqual((n_dates, 2, 9),
+                         self.m.market_info["indexs_info"].shape)
+        date = "20191021"
+        i = self.m.date_index[date]
+        self.assertEqual(date, self.m.open_dates[i])
+        close = self.m.codes_history["000001.SZ"].loc[date, "close"]
+        self.assertEqual(close,
+                         self.m.market_info["equities_bfq_info"][i, 0, 3])
+        # 开盘标志
+        self.assertEqual(1, self.m.market_info["equities_hfq_info"][i, 0, -1])
+        obs = self.m.get_market_obs(["equities_hfq_info", "indexs_info"])
+        self.assertEqual((n_dates, 28), obs.shape)
+
+    def test_dump_shared_and_attach(self):
+        path = tempfile.mkdtemp()
+        self.m.dump_shared(path)
+        m = Market.attach(path)
+        self.assertIsInstance(m.market_data, np.memmap)
+        self.assertFalse(m.market_data.flags.writeable)
+        self.assertEqual(self.m.open_dates, m.open_dates)
+        self.assertEqual(self.m.codes, m.codes)
+        self.assertTrue(np.array_equal(self.m.market_data, m.market_data))
+        names = ["equities_hfq_info", "indexs_info"]
+        obs = m.get_market_obs(names)
+        self.assertTrue(np.shares_memory(obs, m.market_data))
+        self.assertEqual(self.m.equity_hfq_info_size, m.equity_hfq_info_size)
+        date = "20191021"
+        self.assertEqual(self.m.get_close_price("000001.SZ", date),
+                         m.get_close_price("000001.SZ", date))
+        self.assertEqual(self.m.buy_check("000001.SZ", date, 16.51),
+                         m.buy_check("000001.SZ", date, 16.51))
+        self.assertEqual(
+            self.m.indexs_history["000001.SH"].loc[date].tolist(),
+            m.indexs_history["000001.SH"].loc[date].tolist())
+        shutil.rmtree(path)
+
+    def test_snapshot(self):
+        path = tempfile.mkdtemp()
+        self.m.save_snapshot(path)
+        m = Market.load_snapshot(path, codes=self.codes, indexs=self.indexs,
+                                 start=self.start, end=self.end)
+        self.assertTrue(np.array_equal(self.m.market_data, m.market_data))
+        self.assertEqual(self.m.get_divide_rate("000001.SZ", "20191021"),
+                         m.get_divide_rate("000001.SZ", "20191021"))
+        # 读入内存
+        m = Market.load_snapshot(path, mmap_mode=None)
+        self.assertNotIsInstance(m.market_data, np.memmap)
+        # codes 或日期区间不一致
+        with self.assertRaises(ValueError):
+            Market.load_snapshot(path, codes=["000002.SZ"])
+        with self.assertRaises(ValueError):
+            Market.load_snapshot(path, end="20200201")
+        shutil.rmtree(path)
+
+    def test_lazy(self):
+        codes = ["000001.SZ", "000002.SZ"]
+        m = Market(start=self.start, end=self.end, codes=codes,
+                   indexs=self.indexs, data_dir=self.data_dir, lazy=True)
+        self.assertEqual(self.m.open_dates, m.open_dates)
+        self.assertEqual(set(codes), m.pending_codes)
+        # 按需加载单个股票
+        date = "20191021"
+        self.assertEqual(self.m.get_close_price("000001.SZ", date),
+                         m.get_close_price("000001.SZ", date))
+        self.assertEqual({"000002.SZ"}, m.pending_codes)
+        eager = Market(start=self.start, end=self.end, codes=codes,
+                       indexs=self.indexs, data_dir=self.data_dir)
+        self.assertTrue(eager.codes_history["000002.SZ"].equals(
+            m.codes_history["000002.SZ"]))
+        self.assertEqual(set(), m.pending_codes)
+        self.assertTrue(np.array_equal(eager.market_data,
+                                       m.materialize().market_data))
+
+    def test_prefetch(self):
+        codes = ["000001.SZ", "000002.SZ"]
+        m = Market(start=self.start, end=self.end, codes=codes,
+                   indexs=self.indexs, data_dir=self.data_dir,
+                   lazy=True, prefetch=True)
+        m.prefetch_thread.join()
+        self.assertEqual(set(), m.pending_codes)
+        self.assertEqual(list(m.codes_history.keys()), codes)
+
+    def test_get_price(self):
+        code = "000001.SZ"
+        df = self.m.codes_history[code]
+        date = "20191021"
+        self.assertEqual(df.loc[date, "close"],
+                         self.m.get_close_price(code, date))
+        self.assertEqual(df.loc[date, "pre_close"],
+                         self.m.get_pre_close_price(code, date))
+        self.assertEqual(df.loc[date, "adj_factor"],
+                         self.m.get_adj_factor(code, date))
+        # 星期六, 使用前一开市日的数据
+        self.assertEqual(df.loc["20191011", "close"],
+                         self.m.get_close_price(code, "20191012"))
+        self.assertEqual(df.loc["20191011", "adj_factor"],
+                         self.m.get_pre_adj_factor(code, "20191014"))
+        self.assertEqual(1.0, self.m.get_divide_rate(code, "20191014"))
+        with self.assertRaises(IndexError):
+            self.m.get_pre_adj_factor(code, self.m.open_dates[0])
+
+    def test_get_hlc_prices(self):
+        code = "000001.SZ"
+        df = self.m.codes_history[code]
+        for date in self.m.open_dates:
+            highs, lows, closes = self.m.get_hlc_prices(date)
+            expect = [0, 0, 0]
+            if date in df.index:
+                expect = df.loc[date, ["high", "low", "close"]].tolist()
+            self.assertEqual(expect, [highs[0], lows[0], closes[0]])
+        self.assertEqual(0, len(self.m.get_hlc_prices(date, 0)[0]))
+
     def test_is_suspended(self):
         self.assertTrue(self.m.is_suspended(code='000', datestr=''))
         self.assertTrue(self.m.is_suspended(code='000001.SZ', datestr=''))
@@ -118,6 +240,26 @@ class TestMarket(unittest.TestCase):
         self.assertTrue(ok)
         self.assertEqual(16.43, price)
 
+    def test_check_batch(self):
+        # 批量检查与逐个检查的结果一致
+        code = "000001.SZ"
+        for datestr in self.m.open_dates[1:]:
+            pre_close = self.m.get_pre_close_price(code, datestr)
+            bids = np.array([[pre_close * r] for r in
+                             [0.5, 0.95, 1.0, 1.05, 2.0]])
+            oks, prices = self.m.buy_check_batch(datestr, bids)
+            for bid, ok, price in zip(bids[:, 0], oks[:, 0], prices[:, 0]):
+                self.assertEqual((ok, price),
+                                 self.m.buy_check(code, datestr, bid))
+            oks, prices = self.m.sell_check_batch(datestr, bids)
+            for bid, ok, price in zip(bids[:, 0], oks[:, 0], prices[:, 0]):
+                self.assertEqual((ok, price),
+                                 self.m.sell_check(code, datestr, bid))
+        # 非开盘日, 均不能成交
+        oks, prices = self.m.buy_check_batch("20191012", [16.5])
+        self.assertFalse(oks[0])
+        self.assertEqual(0, prices[0])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,8 @@
 # -*- coding:utf-8 -*-
 
+import numpy as np
 from tenvs.common.logger import logger
+from tenvs.common.rounding import py_round
 
 
 class Portfolio:
@@ -239,3 +241,373 @@ class Portfolio:
             self.daily_return = 0
         else:
             self.daily_return = self.daily_pnl / pre_portfolio_value
+
+
+class PortfolioBook:
+    """
+    num_envs 个账户, 每个账户 n 支股票的持仓, 字段与 Portfolio 相同, 每个字段是
+    shape 为 (num_envs, n) 的数组, [i, j] 对应第 i 个账户第 j 支股票的 Portfolio
+    NOTE(wen): 逻辑与 Portfolio 一致. 交易费的舍入见 round_fee
+    """
+    # 持仓量相关字段为整数, 其他为浮点数
+    int_fields = ["volume", "pre_volume", "frozen_volume", "sellable"]
+    float_fields = ["market_value", "avg_price", "price", "daily_pnl", "pnl",
+                    "daily_return", "transaction_cost",
+                    "all_transaction_cost", "value_percent"]
+
+    def __init__(self, num_envs=1, n=1,
+                 buy_commission_rate=0.001, sell_commission_rate=0.0015,
+                 min_commission=5.0, round_lot=100,
+                 divide_rate_threshold=1.005):
+        self.num_envs = num_envs
+        self.n = n
+        for name in self.int_fields:
+            setattr(self, name, np.zeros((num_envs, n), dtype=np.int64))
+        for name in self.float_fields:
+            setattr(self, name, np.zeros((num_envs, n)))
+        self.buy_commission_rate = buy_commission_rate
+        self.sell_commission_rate = sell_commission_rate
+        self.min_commission = min_commission
+        self.round_lot = round_lot
+        self.divide_rate_threshold = divide_rate_threshold
+
+    def reset(self, rows=None):
+        # 清空 rows(默认全部) 账户的持仓
+        if rows is None:
+            rows = slice(None)
+        for name in self.int_fields + self.float_fields:
+            getattr(self, name)[rows] = 0
+
+    def round_fee(self, fee, py_rounding=None):
+        """
+        交易费保留两位小数, py_rounding 为 True 的按 python 的 round() 舍入,
+        其余(默认)按 np.round 舍入
+        NOTE(wen): 单个环境中出价是 numpy 浮点数, 按出价成交时 Portfolio 中的
+            round() 使用 np.round; 按最高/最低价成交时成交价是 python float.
+            两者在 x.xx5 附近可能相差 0.01, py_rounding 用于保持结果一致
+        """
+        result = np.round(fee, 2)
+        if py_rounding is not None and py_rounding.any():
+            result[py_rounding] = py_round(fee[py_rounding], 2)
+        return result
+
+    def buy_fee(self, amount, py_rounding=None):
+        return self.round_fee(np.maximum(self.min_commission,
+                                         amount * self.buy_commission_rate),
+                              py_rounding)
+
+    def sell_fee(self, amount, py_rounding=None):
+        return self.round_fee(amount * self.sell_commission_rate, py_rounding)
+
+    def buy_volume(self, adjust, price, cash, py_rounding=None):
+        """
+        与 Portfolio.order_value 相同: 花费 adjust(不超过 cash)可以买入的股数,
+        股数为一手的整数倍, 资金不足以支付交易费时, 每次减少一手
+        """
+        lot = self.round_lot
+        amount = np.minimum(adjust, cash)
+        volume = np.trunc(amount / (price * lot)).astype(np.int64) * lot
+        while True:
+            amount = volume * price
+            over = (volume > 0) & (
+                amount + self.buy_fee(amount, py_rounding) > cash)
+            if not over.any():
+                return volume
+            volume[over] -= lot
+
+    def update_before_trade(self, divide_rates):
+        """
+        divide_rates: 拆分比例, shape: (n,) 或 (num_envs, n)
+        """
+        divide_rates = np.broadcast_to(divide_rates, self.volume.shape)
+        np.copyto(self.volume,
+                  (divide_rates * self.volume).astype(np.int64),
+                  where=divide_rates > self.divide_rate_threshold)
+        self.sellable[...] = self.volume
+        self.frozen_volume[...] = 0
+        self.daily_pnl[...] = 0.0
+        self.daily_return[...] = 0.0
+        self.transaction_cost[...] = 0.0
+        self.pre_volume[...] = self.volume
+
+    def buy(self, j, rows, price, volume, py_rounding=None):
+        """
+        rows(账户下标)中的账户以 price 买入第j支股票 volume 股, 返回 cash_change
+        """
+        amount = volume * price
+        transaction_cost = self.buy_fee(amount, py_rounding)
+        self.transaction_cost[rows, j] += transaction_cost
+        pre_volume = self.volume[rows, j]
+        # 平均开仓价更新
+        self.avg_price[rows, j] = (
+            self.avg_price[rows, j] * pre_volume + amount +
+            transaction_cost) / (pre_volume + volume)
+        self.price[rows, j] = price
+        self.volume[rows, j] += volume
+        self.frozen_volume[rows, j] += volume
+        self.all_transaction_cost[rows, j] += transaction_cost
+        return -amount - transaction_cost
+
+    def sell(self, j, rows, price, volume, py_rounding=None):
+        """
+        rows(账户下标)中的账户以 price 卖出第j支股票 volume 股, 返回 cash_change
+        """
+        amount = volume * price
+        transaction_cost = self.sell_fee(amount, py_rounding)
+        pre_volume = self.volume[rows, j]
+        # 平均开仓价更新, 全部卖出时为0
+        left = pre_volume - volume
+        self.avg_price[rows, j] = np.where(
+            left == 0, 0.0,
+            (self.avg_price[rows, j] * pre_volume - amount +
+             transaction_cost) / np.where(left == 0, 1, left))
+        self.price[rows, j] = price
+        self.transaction_cost[rows, j] += transaction_cost
+        self.volume[rows, j] -= volume
+        self.sellable[rows, j] -= volume
+        self.all_transaction_cost[rows, j] += transaction_cost
+        return amount - transaction_cost
+
+    def order_target_percent(self, j, percent, price, pre_portfolio_value,
+                             current_cash, rows=None, py_rounding=None):
+        """
+        所有账户同时对第j支股票执行 Portfolio.order_target_percent
+        percent, price, pre_portfolio_value, current_cash: shape (num_envs,)
+        rows: bool, shape (num_envs,), 可以成交的账户, 默认全部
+        py_rounding: bool, shape (num_envs,), 见 round_fee
+        返回: cash_change, volume, shape (num_envs,), 没有成交的账户为0
+        """
+        shape = (self.num_envs,)
+        percent = np.broadcast_to(np.asarray(percent, dtype=float), shape)
+        price = np.broadcast_to(np.asarray(price, dtype=float), shape)
+        pre_portfolio_value = np.broadcast_to(pre_portfolio_value, shape)
+        current_cash = np.broadcast_to(current_cash, shape)
+        if rows is None:
+            rows = np.ones(shape, dtype=bool)
+        if py_rounding is None:
+            py_rounding = np.zeros(shape, dtype=bool)
+        if np.any(rows & ((percent < 0) | (percent > 1))):
+            raise Exception(u"percent should between 0 and 1")
+        cash_change = np.zeros(shape)
+        volume = np.zeros(shape, dtype=np.int64)
+        lot = self.round_lot
+
+        # portfolio_value 为上一交易日的值, 与 Portfolio 一致
+        adjust = pre_portfolio_value * percent - \
+            self.volume[:, j] * self.price[:, j]
+        # percent 为0时全部卖出, 否则按 adjust 的正负买入或卖出
+        sell_all = rows & (percent == 0)
+        to_sell = np.flatnonzero(sell_all | (rows & (adjust < 0)))
+        to_buy = np.flatnonzero(rows & ~sell_all & (adjust > 0))
+
+        if len(to_sell) > 0:
+            p = price[to_sell]
+            vol = np.abs(np.trunc(adjust[to_sell] / (p * lot))).astype(
+                np.int64) * lot
+            # 根据可卖出股数, 按最大可交易量，调整
+            sellable = self.sellable[to_sell, j]
+            vol = np.where(sell_all[to_sell], sellable,
+                           np.minimum(sellable, vol))
+            cash_change[to_sell] = self.sell(j, to_sell, p, vol,
+                                             py_rounding[to_sell])
+            volume[to_sell] = vol
+
+        if len(to_buy) > 0:
+            p = price[to_buy]
+            vol = self.buy_volume(adjust[to_buy], p, current_cash[to_buy],
+                                  py_rounding[to_buy])
+            ok = vol > 0
+            to_buy, p, vol = to_buy[ok], p[ok], vol[ok]
+            if len(to_buy) > 0:
+                cash_change[to_buy] = self.buy(j, to_buy, p, vol,
+                                               py_rounding[to_buy])
+                volume[to_buy] = vol
+        return cash_change, volume
+
+    def order_target_percents(self, row, percent, price, pre_portfolio_value,
+                              current_cash, oks=None, py_rounding=None):
+        """
+        第 row 个账户(row 为None时所有账户)按股票的顺序对每支股票执行
+        Portfolio.order_target_percent, 结果与逐个调用相同: 后面的股票受前面
+        成交后剩余资金的限制
+        percent, price, oks: shape (n,)(row 为None时 (num_envs, n)),
+            oks 为可以成交的股票, 默认全部
+        pre_portfolio_value, current_cash: 标量(row 为None时 shape (num_envs,))
+        py_rounding: bool, shape 与 price 相同, 见 round_fee
+        返回: cash_change, volume, shape 与 price 相同, 没有成交的股票为0
+        """
+        rows = np.arange(self.num_envs) if row is None else np.array([row])
+        shape = (len(rows), self.n)
+        percent = np.broadcast_to(np.asarray(percent, dtype=float), shape)
+        price = np.broadcast_to(np.asarray(price, dtype=float), shape)
+        oks = np.ones(shape, dtype=bool) if oks is None else \
+            np.broadcast_to(oks, shape)
+        py_rounding = np.zeros(shape, dtype=bool) if py_rounding is None \
+            else np.broadcast_to(py_rounding, shape)
+        pre_portfolio_value = np.asarray(pre_portfolio_value,
+                                         dtype=float).reshape(-1, 1)
+        current_cash = np.broadcast_to(
+            np.asarray(current_cash, dtype=float), (len(rows),))
+        if np.any(oks & ((percent < 0) | (percent > 1))):
+            raise Exception(u"percent should between 0 and 1")
+        cash_change = np.zeros(shape)
+        volume = np.zeros(shape, dtype=np.int64)
+        lot = self.round_lot
+
+        adjust = pre_portfolio_value * percent - \
+            self.volume[rows] * self.price[rows]
+        sell_all = oks & (percent == 0)
+        to_sell = sell_all | (oks & (adjust < 0))
+        to_buy = oks & ~sell_all & (adjust > 0)
+
+        # 卖出与资金无关, 一次完成
+        if to_sell.any():
+            r, j = np.nonzero(to_sell)
+            p = price[r, j]
+            vol = np.abs(np.trunc(adjust[r, j] / (p * lot))).astype(
+                np.int64) * lot
+            sellable = self.sellable[rows[r], j]
+            vol = np.where(sell_all[r, j], sellable,
+                           np.minimum(sellable, vol))
+            cash_change[r, j] = self.sell(j, rows[r], p, vol,
+                                          py_rounding[r, j])
+            volume[r, j] = vol
+
+        if to_buy.any():
+            volume[to_buy] = self._sequential_buy_volume(
+                to_buy, adjust, price, cash_change, current_cash,
+                py_rounding)[to_buy]
+            r, j = np.nonzero(to_buy & (volume > 0))
+            if len(r) > 0:
+                cash_change[r, j] = self.buy(j, rows[r], price[r, j],
+                                             volume[r, j], py_rounding[r, j])
+        if row is None:
+            return cash_change, volume
+        return cash_change[0], volume[0]
+
+    def _sequential_buy_volume(self, to_buy, adjust, price, sell_changes,
+                               cash, py_rounding):
+        """
+        每个账户按股票的顺序依次买入 to_buy 中的股票的成交量, shape 与 to_buy
+        相同(m, n), 买入第 j 支股票时的资金为 cash(shape (m,)) 加上该账户前 j 支
+        股票的 cash_change(包括 sell_changes 中的卖出)
+        NOTE(wen): 先假设资金充足一次算出所有买单, 第一笔资金不足的买单之前的结果
+            不变; 从这一笔开始按剩余资金计算, 直到下一笔成交, 然后继续假设资金充足.
+            所有账户同时计算, 资金不足的买单很少时, 只需要计算几次
+        """
+        m, n = to_buy.shape
+        cols = np.arange(n)
+        volume = np.zeros((m, n), dtype=np.int64)
+        volume[to_buy] = self.buy_volume(adjust[to_buy], price[to_buy],
+                                         np.inf, py_rounding[to_buy])
+        amount = volume * price
+        cost = np.where(volume > 0,
+                        amount + self.buy_fee(amount, py_rounding), 0.0)
+        changes = np.where(to_buy, -cost, sell_changes)
+        sold = sell_changes != 0
+        # first: 每个账户第一笔还未确定的买单所在的列
+        first = np.zeros((m, 1), dtype=np.int64)
+        while True:
+            # before[:, j]: 第 j 支股票之前的资金, 与逐个累加的结果相同
+            before = np.cumsum(np.concatenate((cash[:, None], changes),
+                                              axis=1), axis=1)[:, :-1]
+            short = to_buy & (volume > 0) & (cols >= first) & (
+                (adjust > before) | (cost > before))
+            rows = np.flatnonzero(short.any(axis=1))
+            if len(rows) == 0:
+                return volume
+            k = np.argmax(short[rows], axis=1)[:, None]
+            # 资金不变的范围: 到下一笔有成交的卖单为止
+            later = sold[rows] & (cols > k)
+            end = np.where(later.any(axis=1), np.argmax(later, axis=1),
+                           n)[:, None]
+            span = to_buy[rows] & (cols >= k) & (cols < end)
+            r, j = np.nonzero(span)
+            vol = np.zeros(span.shape, dtype=np.int64)
+            vol[r, j] = self.buy_volume(
+                adjust[rows[r], j], price[rows[r], j],
+                np.take_along_axis(before[rows], k, axis=1)[r, 0],
+                py_rounding[rows[r], j])
+            # 到第一笔成交为止, 没有成交时到 end 为止
+            filled = vol > 0
+            last = np.where(filled.any(axis=1), np.argmax(filled, axis=1),
+                            end[:, 0] - 1)[:, None]
+            update = span & (cols <= last)
+            amount = vol * price[rows]
+            fee = self.buy_fee(amount, py_rounding[rows])
+            vol_cost = np.where(filled, amount + fee, 0.0)
+            for values, new in ((volume, vol), (cost, vol_cost),
+                                (changes, -vol_cost)):
+                values[rows] = np.where(update, new, values[rows])
+            first[rows] = last + 1
+
+    def update_after_trade(self, close_prices, cash_change,
+                           pre_portfolio_value):
+        """
+        close_prices: shape (n,) 或 (num_envs, n)
+        cash_change, pre_portfolio_value: shape (num_envs,)
+        NOTE: 与 Portfolio 一致, 每支股票的 daily_pnl 都加上账户的 cash_change
+        """
+        pre_market_value = self.market_value.copy()
+        # 收盘后，根据收盘价更新
+        np.multiply(self.volume, close_prices, out=self.market_value)
+        cash_change = np.asarray(cash_change, dtype=float).reshape(-1, 1)
+        self.daily_pnl[...] = self.market_value - pre_market_value + \
+            cash_change
+        self.pnl += self.daily_pnl
+        pre = np.asarray(pre_portfolio_value, dtype=float).reshape(-1, 1)
+        self.daily_return[...] = np.where(
+            pre == 0, 0.0, self.daily_pnl / np.where(pre == 0, 1, pre))
+
+    def update_value_percent(self, total_value):
+        """
+        total_value: shape (num_envs,)
+        """
+        total = np.asarray(total_value, dtype=float).reshape(-1, 1)
+        self.value_percent[...] = np.where(
+            total == 0, 0.0,
+            self.market_value / np.where(total == 0, 1, total))
+
+
+def _book_field(name, cast):
+    # PortfolioView 的属性, 读写 book 中对应的元素
+    def fget(self):
+        return cast(getattr(self.book, name)[self.row, self.j])
+
+    def fset(self, value):
+        getattr(self.book, name)[self.row, self.j] = value
+    return property(fget, fset)
+
+
+class PortfolioView(Portfolio):
+    """
+    PortfolioBook 中第 row 个账户, 第 j 支股票的 Portfolio
+    与 Portfolio 的接口相同, 持仓数据直接读写 book 中的数组
+    """
+    market_value = _book_field("market_value", float)
+    volume = _book_field("volume", int)
+    pre_volume = _book_field("pre_volume", int)
+    frozen_volume = _book_field("frozen_volume", int)
+    sellable = _book_field("sellable", int)
+    avg_price = _book_field("avg_price", float)
+    _price = _book_field("price", float)
+    daily_pnl = _book_field("daily_pnl", float)
+    pnl = _book_field("pnl", float)
+    daily_return = _book_field("daily_return", float)
+    transaction_cost = _book_field("transaction_cost", float)
+    all_transaction_cost = _book_field("all_transaction_cost", float)
+    value_percent = _book_field("value_percent", float)
+
+    def __init__(self, book, j, row=0, code="000001.SZ", log_deals=False):
+        self.book = book
+        self.j = j
+        self.row = row
+        # 是否停牌, 停牌为1
+        self.is_suspended = 0.0
+        self.buy_commission_rate = book.buy_commission_rate
+        self.sell_commission_rate = book.sell_commission_rate
+        self.min_commission = book.min_commission
+        self.round_lot = book.round_lot
+        self.divide_rate_threshold = book.divide_rate_threshold
+        self.code = code
+        self.log_deals = log_deals
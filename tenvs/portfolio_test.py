@@ -1,9 +1,11 @@
 # -*- coding:utf-8 -*-
 
 import logging
+import random
 import unittest
 
-from tenvs.portfolio import Portfolio
+import numpy as np
+from tenvs.portfolio import Portfolio, PortfolioBook, PortfolioView
 
 logging.root.setLevel(logging.ERROR)
 
@@ -235,5 +237,173 @@ class TestPortfolio(unittest.TestCase):
         self.assertEqual(51, p.all_transaction_cost)
 
 
+class TestPortfolioBook(unittest.TestCase):
+
+    def test_fee(self):
+        book = PortfolioBook()
+        self.assertEqual([5.0, 5.0, 10.0],
+                         book.buy_fee(np.array([0, 1000, 10000])).tolist())
+        self.assertEqual([0, 1.5], book.sell_fee(np.array([0, 1000])).tolist())
+        # 6.175: np.round 为 6.18, round() 为 6.17
+        self.assertEqual([6.18, 6.17], book.buy_fee(
+            np.array([6175.0, 6175.0]), np.array([False, True])).tolist())
+
+    def test_update_before_trade(self):
+        book = PortfolioBook(2, 2)
+        book.volume[:] = 1000
+        book.update_before_trade(np.array([1.1, 1.005]))
+        self.assertEqual([[1100, 1000], [1100, 1000]], book.volume.tolist())
+        self.assertEqual(book.volume.tolist(), book.sellable.tolist())
+
+    def test_order_target_percent(self):
+        # 与 test_order_basic 中 Portfolio 的结果一致
+        book = PortfolioBook(2, 1)
+        rows = np.array([True, False])
+        cash_change, volume = book.order_target_percent(
+            0, percent=0.5, price=10.0, pre_portfolio_value=20020.0,
+            current_cash=30000.0, rows=rows)
+        self.assertEqual([-10010.0, 0], cash_change.tolist())
+        self.assertEqual([1000, 0], volume.tolist())
+        self.assertEqual([[10.01], [0]], book.avg_price.tolist())
+        book.update_after_trade(np.array([10.0]), cash_change,
+                                np.array([30000.0, 30000.0]))
+        self.assertEqual([[-10.0], [0]], book.daily_pnl.tolist())
+        book.update_before_trade(np.array([1.0]))
+        # 全部卖出
+        cash_change, volume = book.order_target_percent(
+            0, percent=0, price=11, pre_portfolio_value=29990.0,
+            current_cash=19990, rows=rows)
+        self.assertEqual([10983.5, 0], cash_change.tolist())
+        self.assertEqual([[0], [0]], book.volume.tolist())
+        self.assertEqual([[26.5], [0]], book.all_transaction_cost.tolist())
+        # 增仓
+        cash_change, volume = book.order_target_percent(
+            0, percent=0.5, price=10, pre_portfolio_value=29990.0,
+            current_cash=np.array([30973.5, 30973.5]))
+        self.assertEqual([-14014.0, -14014.0], cash_change.tolist())
+        self.assertEqual([1400, 1400], volume.tolist())
+        # 资金不足, 减少买入量
+        book.reset()
+        cash_change, volume = book.order_target_percent(
+            0, percent=1.0, price=10, pre_portfolio_value=20000.0,
+            current_cash=np.array([20000.0, 19990.0]))
+        self.assertEqual([1900, 1900], volume.tolist())
+        with self.assertRaises(Exception):
+            book.order_target_percent(0, percent=1.5, price=10,
+                                      pre_portfolio_value=20000.0,
+                                      current_cash=20000.0)
+
+    def test_order_target_percents(self):
+        book = PortfolioBook(1, 3)
+        # 第2支股票不能成交, 第3支股票资金不足, 只能买入剩余资金可以买的部分
+        cash_change, volume = book.order_target_percents(
+            0, percent=[0.5, 0.5, 0.5], price=[10.0, 10.0, 10.0],
+            pre_portfolio_value=20000.0, current_cash=15000.0,
+            oks=np.array([True, False, True]))
+        self.assertEqual([1000, 0, 400], volume.tolist())
+        self.assertEqual([-10010.0, 0, -4005.0], cash_change.tolist())
+        with self.assertRaises(Exception):
+            book.order_target_percents(0, percent=[1.5, 0, 0],
+                                       price=[10.0, 10.0, 10.0],
+                                       pre_portfolio_value=20000.0,
+                                       current_cash=20000.0)
+
+    def test_order_target_percents_sequential(self):
+        # 与按股票顺序逐个调用 Portfolio.order_target_percent 的结果一致
+        rnd = random.Random(0)
+        for _ in range(300):
+            n = rnd.randint(1, 8)
+            book = PortfolioBook(1, n)
+            portfolios = [Portfolio() for _ in range(n)]
+            for j, p in enumerate(portfolios):
+                p.volume = rnd.choice([0, 100, 1200])
+                p.sellable = rnd.choice([0, p.volume])
+                p._price = p.avg_price = round(rnd.uniform(2, 50), 2)
+                book.volume[0, j], book.sellable[0, j] = p.volume, p.sellable
+                book.price[0, j] = book.avg_price[0, j] = p._price
+            pre_portfolio_value = rnd.uniform(10000, 100000)
+            cash = start_cash = rnd.uniform(0, pre_portfolio_value)
+            percent = [rnd.choice([0, 0.5, 1.0 / n, rnd.random()])
+                       for _ in range(n)]
+            price = [round(rnd.uniform(2, 50), 2) for _ in range(n)]
+            oks = np.array([rnd.random() < 0.8 for _ in range(n)])
+            cash_change, volume = book.order_target_percents(
+                0, percent, price, pre_portfolio_value, cash, oks=oks,
+                py_rounding=np.ones(n, dtype=bool))
+            for j, p in enumerate(portfolios):
+                expect = (0, 0)
+                if oks[j]:
+                    change, _, vol = p.order_target_percent(
+                        percent[j], price[j], pre_portfolio_value, cash)
+                    cash += change
+                    expect = (change, vol)
+                self.assertEqual(expect, (cash_change[j], volume[j]))
+                self.assertEqual(p.avg_price, book.avg_price[0, j])
+                self.assertEqual(p._price, book.price[0, j])
+            # 逐个累加 cash_change 得到剩余资金
+            self.assertEqual(cash, sum(cash_change.tolist(), start_cash))
+
+    def test_order_target_percents_all_rows(self):
+        # row 为None时所有账户一次下单, 与逐个股票调用 order_target_percent
+        # 并累加资金的结果一致
+        rng = np.random.RandomState(0)
+        for _ in range(100):
+            m, n = rng.randint(1, 6), rng.randint(1, 8)
+            books = [PortfolioBook(m, n) for _ in range(2)]
+            volume = rng.choice([0, 100, 1200], (m, n))
+            sellable = np.where(rng.random_sample((m, n)) < 0.5, volume, 0)
+            price = np.round(rng.uniform(2, 50, (m, n)), 2)
+            for book in books:
+                book.volume[...], book.sellable[...] = volume, sellable
+                book.price[...] = book.avg_price[...] = price
+            pre_portfolio_value = rng.uniform(10000, 100000, m)
+            cash = rng.uniform(0, pre_portfolio_value)
+            percent = np.where(rng.random_sample((m, n)) < 0.3, 0.0,
+                               rng.uniform(0, 1, (m, n)))
+            bid_prices = np.round(rng.uniform(2, 50, (m, n)), 2)
+            oks = rng.random_sample((m, n)) < 0.8
+            py_rounding = rng.random_sample((m, n)) < 0.5
+            cash_change, volume = books[0].order_target_percents(
+                None, percent, bid_prices, pre_portfolio_value, cash,
+                oks=oks, py_rounding=py_rounding)
+            expect_cash = cash.copy()
+            for j in range(n):
+                change, vol = books[1].order_target_percent(
+                    j, percent[:, j], bid_prices[:, j], pre_portfolio_value,
+                    expect_cash, rows=oks[:, j],
+                    py_rounding=py_rounding[:, j])
+                expect_cash += change
+                self.assertEqual(change.tolist(), cash_change[:, j].tolist())
+                self.assertEqual(vol.tolist(), volume[:, j].tolist())
+            for name in PortfolioBook.int_fields + PortfolioBook.float_fields:
+                np.testing.assert_array_equal(getattr(books[1], name),
+                                              getattr(books[0], name))
+
+    def test_portfolio_view(self):
+        # PortfolioView 与 Portfolio 的结果一致, 数据保存在 book 中
+        book = PortfolioBook(1, 2)
+        view, p = PortfolioView(book, 1), Portfolio()
+        for portfolio in [view, p]:
+            portfolio.update_before_trade(divide_rate=1.0)
+            self.assertEqual((-10010.0, 10.0, 1000),
+                             portfolio.order_target_percent(
+                                 percent=0.5, price=10.0,
+                                 pre_portfolio_value=20020.0,
+                                 current_cash=30000.0))
+            portfolio.update_after_trade(close_price=10.0,
+                                         cash_change=-10010,
+                                         pre_portfolio_value=30000.0)
+            portfolio.update_before_trade(divide_rate=1.1)
+            portfolio.order_target_percent(percent=0, price=11,
+                                           pre_portfolio_value=29990.0,
+                                           current_cash=19990)
+        for name in ["volume", "sellable", "avg_price", "_price", "pnl",
+                     "daily_pnl", "market_value", "all_transaction_cost"]:
+            self.assertEqual(getattr(p, name), getattr(view, name))
+        self.assertEqual([[0, 0]], book.volume.tolist())
+        self.assertEqual(p.pnl, book.pnl[0, 1])
+        self.assertIsInstance(view.volume, int)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,8 @@
 from tenvs.envs.average import AverageEnv
 from tenvs.envs.multi_vol import MultiVolEnv
 from tenvs.envs.simple import SimpleEnv
+from tenvs.envs.vector import (AverageVectorEnv, MultiVolVectorEnv,
+                               SimpleVectorEnv)
 
 
 def make_env(scenario, market, investment, look_back_days,
@@ -17,3 +19,20 @@ def make_env(scenario, market, investment, look_back_days,
                            used_infos, reward_fn, log_deals)
     else:
         raise Exception(f'Not implement scenario {scenario}')
+
+
+def make_vector_env(scenario, market, num_envs, investment, look_back_days,
+                    used_infos, reward_fn, log_deals=False, auto_reset=False):
+    """
+    num_envs 个同步运行的 scenario 环境, 见 tenvs.envs.vector.VectorEnv
+    """
+    if scenario == 'simple':
+        env_class = SimpleVectorEnv
+    elif scenario == 'average':
+        env_class = AverageVectorEnv
+    elif scenario == 'multi_vol':
+        env_class = MultiVolVectorEnv
+    else:
+        raise Exception(f'Not implement scenario {scenario}')
+    return env_class(market, num_envs, investment, look_back_days,
+                     used_infos, reward_fn, log_deals, auto_reset)